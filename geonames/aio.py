@@ -0,0 +1,174 @@
+"""
+    geonames/aio
+    ~~~~~~~~~~~~
+
+    Contains an asyncio facade over :mod:`geonames.queries` for use in event loop based services.
+
+    Queries run on a bounded thread pool sized to the connection pool so the event
+    loop never blocks on sqlite. Identical requests that are in flight at the same
+    time share a single query, and id lookups that arrive within `batch_window`
+    seconds of each other are resolved by a single batched query.
+
+    Usage::
+
+        async with Gazetteer(ConnectionPool('geonames.sqlite', size=8)) as gazetteer:
+            place = await gazetteer.geoname(2643743)
+"""
+import asyncio
+import concurrent.futures
+import functools
+
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from . import pool, queries
+
+
+class Gazetteer:
+    """
+    Async lookups against a pool of read-only connections.
+
+    Coalesced requests share their result objects, so callers must not mutate them.
+    """
+    def __init__(self,
+                 connections: pool.ConnectionPool,
+                 batch_window: float = 0.002,
+                 max_batch: int = 500) -> None:
+        self.connections = connections
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=connections.size,
+                                                               thread_name_prefix='geonames')
+        self._inflight: Dict[Tuple[Any, ...], asyncio.Future] = {}
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._fetching: Dict[int, asyncio.Future] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        self.close()
+
+    def close(self) -> None:
+        """
+        Stop our worker threads; the connection pool is left open.
+        """
+        if self._flush_handle:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        self._executor.shutdown(wait=False)
+
+    async def run(self, func: Callable[..., Any], *args) -> Any:
+        """
+        Call `func(db, *args)` with a pooled connection on a worker thread.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._call, func, args)
+
+    async def coalesce(self, func: Callable[..., Any], *args) -> Any:
+        """
+        Call `func(db, *args)` like :meth:`run`, sharing the result with identical calls already in flight.
+        """
+        key = (func, *args)
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self.run(func, *args))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(future)
+
+    async def geoname(self, geoname_id: int) -> Optional[queries.Geoname]:
+        """
+        Return the geoname with the given id, or None, batched with other lookups in the same window.
+        """
+        geoname_id = int(geoname_id)
+        future = self._pending.get(geoname_id) or self._fetching.get(geoname_id)
+        if future is None:
+            future = self._pending[geoname_id] = asyncio.get_running_loop().create_future()
+            if len(self._pending) >= self.max_batch:
+                self._flush()
+            elif self._flush_handle is None:
+                self._flush_handle = asyncio.get_running_loop().call_later(self.batch_window, self._flush)
+        return await asyncio.shield(future)
+
+    async def geonames(self, geoname_ids: Iterable[int]) -> List[Optional[queries.Geoname]]:
+        """
+        Return the geoname for each of the given ids in order, or None for unknown ids.
+        """
+        return list(await asyncio.gather(*(self.geoname(geoname_id) for geoname_id in geoname_ids)))
+
+    async def autocomplete(self, text: str, limit: int = 10) -> List[queries.NameMatch]:
+        """
+        See :func:`geonames.queries.autocomplete`.
+        """
+        return await self.coalesce(queries.autocomplete, text, limit)
+
+    async def ancestors(self, geoname_id: int) -> List[queries.HierarchyMember]:
+        """
+        See :func:`geonames.queries.ancestors`.
+        """
+        return await self.coalesce(queries.ancestors, geoname_id)
+
+    async def descendants(self,
+                          geoname_id: int,
+                          max_depth: Optional[int] = None,
+                          feature_class: Optional[str] = None) -> List[queries.HierarchyMember]:
+        """
+        See :func:`geonames.queries.descendants`.
+        """
+        return await self.coalesce(queries.descendants, geoname_id, max_depth, feature_class)
+
+    async def is_descendant(self, geoname_id: int, ancestor_id: int) -> bool:
+        """
+        See :func:`geonames.queries.is_descendant`.
+        """
+        return await self.coalesce(queries.is_descendant, geoname_id, ancestor_id)
+
+    async def country_at(self, latitude: float, longitude: float) -> Optional[int]:
+        """
+        See :func:`geonames.queries.country_at`.
+        """
+        return await self.coalesce(queries.country_at, latitude, longitude)
+
+    def _call(self, func: Callable[..., Any], args: Tuple[Any, ...]) -> Any:
+        """
+        Worker thread body that calls a query function with a pooled connection.
+        """
+        with self.connections.connection() as db:
+            return func(db, *args)
+
+    def _flush(self) -> None:
+        """
+        Resolve all pending id lookups with a single query.
+        """
+        if self._flush_handle:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        pending, self._pending = self._pending, {}
+        if not pending:
+            return
+
+        self._fetching.update(pending)
+        task = asyncio.ensure_future(self.run(queries.geonames, list(pending)))
+        task.add_done_callback(functools.partial(self._resolve, pending))
+
+    def _resolve(self, pending: Dict[int, asyncio.Future], task: asyncio.Future) -> None:
+        """
+        Complete the futures of a batch once its query has finished.
+        """
+        for geoname_id in pending:
+            self._fetching.pop(geoname_id, None)
+
+        if task.cancelled():
+            for future in pending.values():
+                future.cancel()
+        elif task.exception():
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(task.exception())
+        else:
+            for future, result in zip(pending.values(), task.result()):
+                if not future.done():
+                    future.set_result(result)
@@ -5,12 +5,19 @@
     Contains abstract/base types.
 """
 import abc
+import contextlib
 import csv
 import io
+import itertools
+import operator
+import re
+import sqlite3
 
-from geonames import fileutils, validators
+import numpy as np
+
+from geonames import columns, fileutils, validators
 from pydantic import BaseModel, validator
-from typing import Any, Callable, Dict, Generic, Iterator, List, Optional, Type, TypeVar
+from typing import Any, Callable, Dict, Generic, Iterable, Iterator, List, Optional, Sequence, Tuple, Type, TypeVar, Union
 
 from . import options
 
@@ -24,6 +31,118 @@ class Record(BaseModel):
 
 RecordT = TypeVar('RecordT', bound=Record)
 
+#: Predicate over the raw field values of a data source row, evaluated before a record is built.
+RowFilter = Callable[[Sequence[Optional[str]]], bool]
+
+#: Function of the database, pipeline options and source fields that returns a row filter or None.
+RowFilterFactory = Callable[[Any, options.Pipeline, List[str]], Optional[RowFilter]]
+
+#: Mapping of table parameter names to record attribute names or functions of a record.
+Fields = Dict[str, Union[str, Callable[[Any], Any]]]
+
+
+def extractor(fields: Fields, parameters: List[str], exclude: Iterable[str] = ()) -> Callable[[Any], tuple]:
+    """
+    Compile a mapping of table parameters to a function that builds a tuple of positional params from a record.
+
+    Params are in the given parameter order and excluded parameters are None. When every parameter maps to
+    a record attribute the function is a single `operator.attrgetter`, so building params costs no intermediate dict.
+    """
+    getters = [None if name in exclude else fields[name] for name in parameters]
+
+    if getters and all(isinstance(getter, str) for getter in getters):
+        get = operator.attrgetter(*getters)
+        return get if len(getters) > 1 else lambda r: (get(r),)
+
+    getters = [_none if getter is None else operator.attrgetter(getter) if isinstance(getter, str) else getter
+               for getter in getters]
+    return lambda r: tuple([getter(r) for getter in getters])
+
+
+def _none(record: Any) -> None:
+    """
+    Getter of excluded parameters.
+    """
+    return None
+
+
+class Batch:
+    """
+    Column-oriented batch of raw (unvalidated) data source rows.
+
+    Columns are lists or NumPy arrays keyed by source field name. Converted columns can be
+    memoized with :meth:`column` and record instances are built on demand for per-record sinks.
+    """
+    def __init__(self,
+                 record_cls: Type[RecordT],
+                 columns: Dict[str, Sequence[Any]],
+                 row_nums: Sequence[int]) -> None:
+        self.record_cls = record_cls
+        self.columns = columns
+        self.row_nums = row_nums
+        self.converted: Dict[Any, Any] = {}
+        self._records: Optional[List[RecordT]] = None
+
+    def __len__(self) -> int:
+        return len(self.row_nums)
+
+    def __getitem__(self, name: str) -> Sequence[Any]:
+        return self.columns[name]
+
+    @property
+    def last_row_num(self) -> int:
+        return self.row_nums[-1] if len(self.row_nums) else 0
+
+    def column(self, name: str, convert: Callable[[Sequence[Any]], Any]) -> Any:
+        """
+        Return the named column converted by the given function, converting it once per batch.
+
+        Fields our source doesn't have are all None, as they would be for records.
+        """
+        key = (name, convert)
+        if key not in self.converted:
+            self.converted[key] = convert(self.columns.get(name, [None] * len(self)))
+        return self.converted[key]
+
+    def select(self, mask: Sequence[bool]) -> 'Batch':
+        """
+        Return a batch of the rows selected by the given boolean mask.
+        """
+        mask = np.asarray(mask, dtype=bool)
+        if mask.all():
+            return self
+        return self.take(np.flatnonzero(mask))
+
+    def take(self, indices: Sequence[int]) -> 'Batch':
+        """
+        Return a batch of the rows at the given indices, which may repeat rows.
+        """
+        indices = np.asarray(indices, dtype=np.intp)
+
+        def take(column):
+            return column[indices] if isinstance(column, np.ndarray) else [column[i] for i in indices.tolist()]
+
+        batch = Batch(self.record_cls, {k: take(v) for k, v in self.columns.items()}, take(self.row_nums))
+        batch.converted = {k: take(v) for k, v in self.converted.items()}
+        return batch
+
+    def record(self, i: int) -> RecordT:
+        """
+        Return a record instance of the i'th row.
+        """
+        return self.records()[i]
+
+    def records(self) -> List[RecordT]:
+        """
+        Return record instances of all rows, building them on first use.
+        """
+        if self._records is None:
+            names = list(self.columns)
+            values = [columns.to_list(self.columns[name]) for name in names]
+            self._records = [self.record_cls(row_num=row_num, **dict(zip(names, row)))
+                             for row_num, row in zip(columns.to_list(self.row_nums), zip(*values))]
+        return self._records
+
 
 class Source(metaclass=abc.ABCMeta):
     """
@@ -35,16 +154,38 @@ class Source(metaclass=abc.ABCMeta):
         self.name = name
         self.record_cls = record_cls
 
+    @property
+    def filtered(self) -> bool:
+        """
+        True if rows of this source can be filtered out by the build filter.
+        """
+        return False
+
+    def row_filter(self, db, opts: options.Pipeline) -> Optional[RowFilter]:
+        """
+        Return a predicate over raw rows for the build filter, or None to produce every row.
+        """
+        return None
+
     @abc.abstractmethod
     def produce(self, *args) -> Iterator[RecordT]:
         """
         Produce record instances from the source.
         """
 
+    @abc.abstractmethod
+    def produce_batches(self, opts: options.Source, size: int, keep: Optional[RowFilter] = None) -> Iterator[Batch]:
+        """
+        Produce batches of up to `size` raw rows from the source.
+        """
+
 
 class FileSource(Source):
     """
     Data source for line-based column delimited files.
+
+    A source with a `row_filter` factory (see :mod:`geonames.filters`) rejects rows that don't meet
+    the build filter from their raw field values, before any record is built or validated.
     """
     def __init__(self,
                  name: str,
@@ -53,17 +194,37 @@ class FileSource(Source):
                  delimiter: str = '\t',
                  skip_header: bool = False,
                  skip_comments: bool = False,
-                 field_size_limit: Optional[int] = None):
+                 field_size_limit: Optional[int] = None,
+                 row_filter: Optional[RowFilterFactory] = None):
         super().__init__(name, record_cls)
         self.fields = fields
         self.delimiter = delimiter
         self.skip_header = skip_header
         self.skip_comments = skip_comments
         self.field_size_limit = field_size_limit
+        self.row_filter_factory = row_filter
+
+    @property
+    def filtered(self) -> bool:
+        """
+        True if rows of this source can be filtered out by the build filter.
+        """
+        return self.row_filter_factory is not None
 
-    def produce(self, opts: options.Source) -> Iterator[RecordT]:
+    def row_filter(self, db, opts: options.Pipeline) -> Optional[RowFilter]:
         """
-        Read the given file and produce a record instance for each line.
+        Return a predicate over raw rows for the build filter, or None to produce every row.
+        """
+        if not self.row_filter_factory or not opts.filter.enabled:
+            return None
+        return self.row_filter_factory(db, opts, self.fields)
+
+    @contextlib.contextmanager
+    def reader(self, opts: options.Source) -> Iterator[Iterator[List[str]]]:
+        """
+        Open the given file and yield an iterator of the field values of each line.
+
+        Blank lines are skipped, as csv.DictReader does.
         """
         with io.open(opts.path, encoding='utf-8') as f:
             if self.skip_header:
@@ -73,13 +234,58 @@ class FileSource(Source):
             if self.field_size_limit:
                 prev_limit = csv.field_size_limit(self.field_size_limit)
 
-            reader = csv.DictReader(f, fieldnames=self.fields, delimiter=self.delimiter)
+            try:
+                yield filter(None, csv.reader(f, delimiter=self.delimiter))
+            finally:
+                if self.field_size_limit:
+                    csv.field_size_limit(prev_limit)
 
-            for i, row in enumerate(reader):
-                yield self.record_cls(row_num=i + 1, **row)
+    def produce(self, opts: options.Source, keep: Optional[RowFilter] = None) -> Iterator[RecordT]:
+        """
+        Read the given file and produce a record instance for each line meeting the given filter.
 
-            if self.field_size_limit:
-                csv.field_size_limit(prev_limit)
+        Short lines are padded with None and extra fields are dropped. Row numbers count every line,
+        including those rejected by the filter.
+        """
+        fields = self.fields
+        width = len(fields)
+        with self.reader(opts) as reader:
+            for row_num, row in enumerate(reader, 1):
+                if len(row) != width:
+                    row = (row + [None] * width)[:width]
+                if keep is not None and not keep(row):
+                    continue
+                yield self.record_cls(row_num=row_num, **dict(zip(fields, row)))
+
+    def produce_batches(self, opts: options.Source, size: int, keep: Optional[RowFilter] = None) -> Iterator[Batch]:
+        """
+        Read the given file and produce a batch of columns for every `size` lines, dropping the
+        lines that don't meet the given filter from each batch.
+
+        Short lines are padded with None and extra fields are dropped, as they are for records.
+        """
+        width = len(self.fields)
+        with self.reader(opts) as reader:
+            row_num = 0
+            while True:
+                rows = list(itertools.islice(reader, size))
+                if not rows:
+                    break
+                for i, row in enumerate(rows):
+                    if len(row) != width:
+                        rows[i] = (row + [None] * width)[:width]
+
+                row_nums = range(row_num + 1, row_num + len(rows) + 1)
+                row_num += len(rows)
+
+                if keep is not None:
+                    kept = [i for i, row in enumerate(rows) if keep(row)]
+                    if not kept:
+                        continue
+                    rows = [rows[i] for i in kept]
+                    row_nums = [row_nums[i] for i in kept]
+
+                yield Batch(self.record_cls, dict(zip(self.fields, map(list, zip(*rows)))), row_nums)
 
 
 class ListSource(Source):
@@ -100,6 +306,17 @@ class ListSource(Source):
         for i, row in enumerate(self.dataset):
             yield self.record_cls(row_num=i + 1, **row)
 
+    def produce_batches(self, opts: options.Source, size: int, keep: Optional[RowFilter] = None) -> Iterator[Batch]:
+        """
+        Produce a batch of columns for every `size` entries in the dataset.
+        """
+        fields = list(dict.fromkeys(k for row in self.dataset for k in row))
+        for start in range(0, len(self.dataset), size):
+            rows = self.dataset[start:start + size]
+            yield Batch(self.record_cls,
+                        {field: [row.get(field) for row in rows] for field in fields},
+                        range(start + 1, start + len(rows) + 1))
+
 
 SourceT = TypeVar('SourceT', bound=Source)
 
@@ -116,11 +333,26 @@ class Sink(Generic[T], metaclass=abc.ABCMeta):
                  name: str,
                  table: TableT,
                  predicate: Optional[Callable[[T], bool]] = None,
-                 exception_handler: Optional[Callable[[Any, Any, T, Exception], bool]] = None):
+                 exception_handler: Optional[Callable[[Any, Any, T, Exception], bool]] = None,
+                 variants: Optional[Dict[str, TableT]] = None):
         self.name = name
         self.table = table
         self.predicate = predicate
         self.exception_handler = exception_handler
+        self.variants = variants or {}
+
+    @property
+    def tables(self) -> List[TableT]:
+        """
+        Our default table followed by the tables of each schema variant.
+        """
+        return [self.table, *self.variants.values()]
+
+    def table_for(self, opts: options.Sink) -> TableT:
+        """
+        Return the table for the configured schema, falling back to our default table.
+        """
+        return self.variants.get(opts.schema, self.table)
 
     @abc.abstractmethod
     def consume_record(self, db, opts: options.Sink, record: T) -> None:
@@ -141,34 +373,121 @@ class Sink(Generic[T], metaclass=abc.ABCMeta):
         try:
             return self.consume_record(db, opts, record)
         except Exception as ex:
-            if not self.exception_handler:
-                raise ex
+            self.handle_exception(db, opts, record, ex)
+
+    def consume_batch(self, db, opts: options.Sink, batch: Batch) -> None:
+        """
+        Consume a batch of data source rows one record at a time.
+
+        This adapts record sinks to batch pipelines; :class:`BatchSink` consumes whole columns instead.
+        """
+        if not opts.enabled:
+            return
+        for record in batch.records():
+            self.consume(db, opts, record)
+
+    def handle_exception(self, db, opts: options.Sink, record: T, ex: Exception) -> None:
+        """
+        Re-raise an exception raised while consuming a record unless our exception handler handles it.
+        """
+        if not self.exception_handler:
+            raise ex
 
-            handled = self.exception_handler(db, options, record, ex)
-            if not handled:
-                raise ex
+        handled = self.exception_handler(db, opts, record, ex)
+        if not handled:
+            raise ex
+
+    def apply(self, db, opts: options.Sink, params: Dict[str, Any]) -> None:
+        """
+        Apply transformed record params to our table, nulling out any excluded columns.
+        """
+        for name in opts.exclude_columns:
+            if name in params:
+                params[name] = None
+        return self.table_for(opts).apply(db, params)
+
+    def apply_batch(self, db, opts: options.Sink, batch: Batch, params: Dict[str, Sequence[Any]]) -> None:
+        """
+        Apply columns of transformed batch params to our table, nulling out any excluded columns.
+
+        The i'th value of each column is applied for the i'th row of the given batch, as positional params.
+        """
+        for name in opts.exclude_columns:
+            if name in params:
+                params[name] = [None] * len(batch)
+
+        values = [columns.to_list(params[name]) for name in self.table_for(opts).parameters]
+        self.apply_rows(db, opts, batch, list(zip(*values)))
+
+    def apply_rows(self, db, opts: options.Sink, batch: Batch, rows: List[tuple], offset: int = 0) -> None:
+        """
+        Apply rows of params to our table with one `executemany`.
+
+        A failed batch is rolled back and bisected down to the failing rows, so our exception
+        handler sees the same errors (and records) it would in a record pipeline.
+        """
+        table = self.table_for(opts)
+        if len(rows) == 1:
+            try:
+                table.apply(db, rows[0])
+            except Exception as ex:
+                self.handle_exception(db, opts, batch.record(offset), ex)
+            return
+
+        if not db.in_transaction:
+            db.execute('BEGIN;')
+        db.execute('SAVEPOINT batch;')
+        try:
+            table.apply_many(db, rows)
+        except sqlite3.Error:
+            db.execute('ROLLBACK TO batch;')
+            db.execute('RELEASE batch;')
+            middle = len(rows) // 2
+            self.apply_rows(db, opts, batch, rows[:middle], offset)
+            self.apply_rows(db, opts, batch, rows[middle:], offset + middle)
+        else:
+            db.execute('RELEASE batch;')
 
     def pre_consume(self, db, opts: options.Sink) -> None:
         """
         Configure any necessary state prior to consuming data source records.
         """
         if opts.enabled:
-            self.table.create_table(db)
-            self.table.create_indices(db)
+            table = self.table_for(opts)
+            table.create_table(db)
+            table.create_indices(db, exclude=opts.exclude_indices)
 
     def post_consume(self, db, opts: options.Sink) -> None:
         """
         Teardown any necessary state after consuming all data source records.
         """
         if opts.enabled:
-            self.table.commit(db)
+            self.table_for(opts).commit(db)
 
     def checkpoint(self, db, opts: options.Sink) -> None:
         """
         Save partial process of data source records already consumed.
         """
         if opts.enabled:
-            self.table.commit(db)
+            self.table_for(opts).commit(db)
+
+    def copy(self, db, opts: options.Sink, database: str) -> None:
+        """
+        Populate our table from the same table of an attached database instead of consuming records.
+        """
+        if not opts.enabled:
+            return
+
+        table = self.table_for(opts)
+        if table.table:
+            table.create_table(db)
+            populated, = db.execute(f'SELECT EXISTS (SELECT 1 FROM main.{table.name});').fetchone()
+            if not populated:
+                # Columns are listed since finalize may have added some (e.g. `hilbert`) to the previous build.
+                columns = ', '.join(row[1] for row in db.execute(f'PRAGMA main.table_info({table.name});'))
+                db.execute(f'INSERT INTO main.{table.name} ({columns}) SELECT {columns} FROM {database}.{table.name};')
+        table.create_indices(db, exclude=opts.exclude_indices)
+        table.commit(db)
 
 
 SinkT = TypeVar('SinkT', bound=Sink)
@@ -183,16 +502,71 @@ class RecordSink(Sink[T]):
                  table: TableT,
                  predicate: Optional[Callable[[T], bool]] = None,
                  exception_handler: Optional[Callable[[Any, Any, T, Exception], bool]] = None,
-                 transform: Optional[Callable[[T], Dict[str, Any]]] = None):
-        super().__init__(name, table, predicate, exception_handler)
+                 transform: Optional[Union[Callable[[T], Dict[str, Any]], Fields]] = None,
+                 variants: Optional[Dict[str, TableT]] = None):
+        super().__init__(name, table, predicate, exception_handler, variants)
         self.transform = transform
+        self.extractors: Dict[Tuple[TableT, Tuple[str, ...]], Callable[[T], tuple]] = {}
 
-    def consume_record(self, db, options, record: T) -> None:
+    def extractor(self, opts: options.Sink) -> Optional[Callable[[T], tuple]]:
+        """
+        Return a function building positional params for our table from a record, compiling it on first use.
+
+        Only transforms given as :data:`Fields` are compiled; for functions returning a dict of params, return None.
+        """
+        if not isinstance(self.transform, dict):
+            return None
+
+        table = self.table_for(opts)
+        key = (table, tuple(opts.exclude_columns))
+        if key not in self.extractors:
+            self.extractors[key] = extractor(self.transform, table.parameters, opts.exclude_columns)
+        return self.extractors[key]
+
+    def consume_record(self, db, opts: options.Sink, record: T) -> None:
         """
         Consume a record generated by a source and conditionally apply it to our table.
         """
+        extract = self.extractor(opts)
+        if extract:
+            return self.table_for(opts).apply(db, extract(record))
+
         params = self.transform(record)
-        return self.table.apply(db, params)
+        return self.apply(db, opts, params)
+
+
+class BatchSink(RecordSink[T]):
+    """
+    Data sink for individual data source records that can also consume whole batches of rows.
+
+    In batch pipelines our batch predicate returns a boolean mask of the rows to keep and our
+    batch transform returns a column of params per table parameter, so no records are built.
+    """
+    def __init__(self,
+                 name: str,
+                 table: TableT,
+                 predicate: Optional[Callable[[T], bool]] = None,
+                 exception_handler: Optional[Callable[[Any, Any, T, Exception], bool]] = None,
+                 transform: Optional[Union[Callable[[T], Dict[str, Any]], Fields]] = None,
+                 batch_predicate: Optional[Callable[[Batch], Sequence[bool]]] = None,
+                 batch_transform: Optional[Callable[[Batch], Dict[str, Sequence[Any]]]] = None,
+                 variants: Optional[Dict[str, TableT]] = None):
+        super().__init__(name, table, predicate, exception_handler, transform, variants)
+        self.batch_predicate = batch_predicate
+        self.batch_transform = batch_transform
+
+    def consume_batch(self, db, opts: options.Sink, batch: Batch) -> None:
+        """
+        Consume a batch of data source rows and apply the rows meeting our batch predicate to our table.
+        """
+        if not opts.enabled:
+            return
+        if self.batch_predicate:
+            batch = batch.select(self.batch_predicate(batch))
+        if not len(batch):
+            return
+
+        return self.apply_batch(db, opts, batch, self.batch_transform(batch))
 
 
 class FlattenRecordFieldSink(Sink[T]):
@@ -207,8 +581,9 @@ class FlattenRecordFieldSink(Sink[T]):
                  field_predicate: Optional[Callable[[T, Any], bool]] = None,
                  predicate: Optional[Callable[[T], bool]] = None,
                  exception_handler: Optional[Callable[[Any, Any, T, Exception], bool]] = None,
-                 transform: Optional[Callable[[T, Any, int], Dict[str, Any]]] = None):
-        super().__init__(name, table, predicate, exception_handler)
+                 transform: Optional[Callable[[T, Any, int], Dict[str, Any]]] = None,
+                 variants: Optional[Dict[str, TableT]] = None):
+        super().__init__(name, table, predicate, exception_handler, variants)
         self.transform = transform
         self.field_name = field_name
         self.field_predicate = field_predicate
@@ -216,17 +591,69 @@ class FlattenRecordFieldSink(Sink[T]):
     def consume_record(self, db, opts: options.Sink, record: T) -> None:
         """
         Consume a record generated by a source and conditionally apply it to our table.
+
+        Exceptions are handled per value, so a value our exception handler ignores doesn't skip the rest.
         """
         for i, value in enumerate(getattr(record, self.field_name, [])):
             if self.field_predicate and not self.field_predicate(record, value):
                 continue
             params = self.transform(record, value, i)
-            return self.table.apply(db, params)
+            try:
+                self.apply(db, opts, params)
+            except Exception as ex:
+                self.handle_exception(db, opts, record, ex)
+
+
+class FlattenBatchSink(FlattenRecordFieldSink[T]):
+    """
+    Data sink for flattening data source record fields that can also consume whole batches of rows.
+
+    In batch pipelines our batch field returns the field values of each row (None values are
+    skipped but keep their position) and our batch transform is called with a batch that repeats
+    each row once per value, along with the values and their positions.
+    """
+    def __init__(self,
+                 name: str,
+                 table: TableT,
+                 field_name: str,
+                 field_predicate: Optional[Callable[[T, Any], bool]] = None,
+                 predicate: Optional[Callable[[T], bool]] = None,
+                 exception_handler: Optional[Callable[[Any, Any, T, Exception], bool]] = None,
+                 transform: Optional[Callable[[T, Any, int], Dict[str, Any]]] = None,
+                 batch_field: Optional[Callable[[Batch], Iterable[Sequence[Any]]]] = None,
+                 batch_transform: Optional[Callable[[Batch, List[Any], List[int]], Dict[str, Sequence[Any]]]] = None,
+                 variants: Optional[Dict[str, TableT]] = None):
+        super().__init__(name, table, field_name, field_predicate, predicate, exception_handler, transform, variants)
+        self.batch_field = batch_field
+        self.batch_transform = batch_transform
+
+    def consume_batch(self, db, opts: options.Sink, batch: Batch) -> None:
+        """
+        Consume a batch of data source rows and apply a row to our table for each field value.
+        """
+        if not opts.enabled:
+            return
+
+        indices, values, positions = [], [], []
+        for i, row in enumerate(self.batch_field(batch)):
+            for position, value in enumerate(row):
+                if value is not None:
+                    indices.append(i)
+                    values.append(value)
+                    positions.append(position)
+        if not indices:
+            return
+
+        batch = batch.take(indices)
+        return self.apply_batch(db, opts, batch, self.batch_transform(batch, values, positions))
 
 
 class Table:
     """
     Represents a sqlite database table.
+
+    The named `:name` parameters of our `modify` statement are compiled once to numbered `?N`
+    parameters, so changes can be applied with a dict of params or a tuple in :attr:`parameters` order.
     """
     def __init__(self,
                  name: str,
@@ -237,6 +664,39 @@ class Table:
         self.table = table
         self.indices = indices
         self.modify = modify
+        self.parameters, self.positional_modify = self.compile(modify)
+
+    @staticmethod
+    def compile(statement: str) -> Tuple[List[str], str]:
+        """
+        Return the distinct parameter names of a statement in binding order and the statement
+        with each named parameter replaced by its numbered parameter.
+        """
+        names: List[str] = []
+
+        def number(match):
+            name = match.group(1)
+            if name not in names:
+                names.append(name)
+            return f'?{names.index(name) + 1}'
+
+        return names, re.sub(r'(?<![:\w]):(\w+)', number, statement)
+
+    @property
+    def index_statements(self) -> Dict[str, str]:
+        """
+        Statements that create each of our sqlite indices, keyed by index name.
+        """
+        statements = [s.strip() for s in (self.indices or '').split(';') if s.strip()]
+        pattern = re.compile(r'CREATE\s+(?:UNIQUE\s+)?INDEX\s+IF\s+NOT\s+EXISTS\s+(\w+)')
+        return {pattern.match(statement).group(1): f'{statement};' for statement in statements}
+
+    @property
+    def index_names(self) -> List[str]:
+        """
+        Names of the sqlite indices we define.
+        """
+        return list(self.index_statements)
 
     def create_table(self, db):
         """
@@ -245,12 +705,13 @@ class Table:
         if self.table:
             return db.executescript(self.table)
 
-    def create_indices(self, db):
+    def create_indices(self, db, exclude: Iterable[str] = ()):
         """
-        Create one or more sqlite indices (if we have any defined).
+        Create one or more sqlite indices (if we have any defined), skipping excluded index names.
         """
-        if self.indices:
-            return db.executescript(self.indices)
+        for name, statement in self.index_statements.items():
+            if name not in exclude:
+                db.execute(statement)
 
     @staticmethod
     def commit(db):
@@ -261,9 +722,17 @@ class Table:
 
     def apply(self, db, params) -> None:
         """
-        Apply changes to a sqlite table (if we have any defined).
+        Apply changes to a sqlite table (if we have any defined) from a dict or tuple of params.
+        """
+        return db.execute(self.modify if isinstance(params, dict) else self.positional_modify, params)
+
+    def apply_many(self, db, params: Sequence) -> None:
+        """
+        Apply a batch of changes to a sqlite table with a single `executemany`, from dicts or tuples of params.
         """
-        return db.execute(self.modify, params)
+        if not params:
+            return
+        return db.executemany(self.modify if isinstance(params[0], dict) else self.positional_modify, params)
 
 
 class Pipeline:
@@ -281,37 +750,179 @@ class Pipeline:
     def __str__(self):
         return f'{self.source.name} -> {[s.name for s in self.sinks]}'
 
+    def enabled(self, opts: options.Pipeline) -> bool:
+        """
+        Return True if our source is enabled and feeds at least one enabled sink.
+        """
+        if not opts.sources[self.source.name].enabled:
+            return False
+        return any(opts.sink(sink.name).enabled for sink in self.sinks)
+
     def run(self, db, opts: options.Pipeline):
         """
-        Consume the source and feed records to all configured sinks.
+        Consume the source and feed records (or batches of rows when `build.batch_size` is set) to all configured sinks.
         """
         source_options = opts.sources[self.source.name]
-        sink_options = [opts.sinks[sink.name] for sink in self.sinks]
+        sink_options = [opts.sink(sink.name) for sink in self.sinks]
 
         for i, sink in enumerate(self.sinks):
             sink.pre_consume(db, sink_options[i])
 
-        for record in self.source.produce(source_options):
-            for i, sink in enumerate(self.sinks):
-                sink.consume(db, sink_options[i], record)
-
-                if record.row_num % self.checkpoint_threshold == 0:
-                    print(f'Checkpoint {sink.name} @ {record.row_num}')
-                    sink.checkpoint(db, sink_options[i])
+        # Row numbers skip the rows rejected by the build filter, so checkpoints are made
+        # whenever the row number crosses a multiple of the threshold.
+        keep = self.source.row_filter(db, opts)
+        threshold = self.checkpoint_threshold
+        previous_row_num = 0
+
+        if opts.build.batch_size:
+            for batch in self.source.produce_batches(source_options, opts.build.batch_size, keep):
+                row_num = batch.last_row_num
+                for i, sink in enumerate(self.sinks):
+                    sink.consume_batch(db, sink_options[i], batch)
+
+                    if row_num // threshold != previous_row_num // threshold:
+                        print(f'Checkpoint {sink.name} @ {row_num}')
+                        sink.checkpoint(db, sink_options[i])
+                previous_row_num = row_num
+        else:
+            for record in self.source.produce(source_options, keep):
+                row_num = record.row_num
+                for i, sink in enumerate(self.sinks):
+                    sink.consume(db, sink_options[i], record)
+
+                    if row_num // threshold != previous_row_num // threshold:
+                        print(f'Checkpoint {sink.name} @ {row_num}')
+                        sink.checkpoint(db, sink_options[i])
+                previous_row_num = row_num
 
         for i, sink in enumerate(self.sinks):
             sink.post_consume(db, sink_options[i])
 
+    def copy(self, db, opts: options.Pipeline, database: str) -> None:
+        """
+        Populate the tables of all configured sinks from an attached database instead of running.
+        """
+        for sink in self.sinks:
+            sink.copy(db, opts.sink(sink.name), database)
+
+
+class Stage(metaclass=abc.ABCMeta):
+    """
+    Abstract post-load stage that operates on the populated database.
+    """
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __str__(self):
+        return self.name
+
+    @abc.abstractmethod
+    def execute(self, db, opts: options.Stage) -> None:
+        """
+        Perform the stage against the populated database.
+        """
+
+    def run(self, db, opts: options.Stage) -> None:
+        """
+        Conditionally perform the stage and commit its changes.
+        """
+        if not opts.enabled:
+            return
+
+        self.execute(db, opts)
+        db.commit()
+
+
+StageT = TypeVar('StageT', bound=Stage)
+
+
+class ScriptStage(Stage):
+    """
+    Post-load stage that executes a sqlite script.
+    """
+    def __init__(self,
+                 name: str,
+                 script: str) -> None:
+        super().__init__(name)
+        self.script = script
+
+    def execute(self, db, opts: options.Stage) -> None:
+        """
+        Execute our script against the populated database.
+        """
+        db.executescript(self.script)
+
+
+class CallableStage(Stage):
+    """
+    Post-load stage that calls a function with the database and stage options.
+    """
+    def __init__(self,
+                 name: str,
+                 func: Callable[[Any, options.Stage], None]) -> None:
+        super().__init__(name)
+        self.func = func
+
+    def execute(self, db, opts: options.Stage) -> None:
+        """
+        Call our function against the populated database.
+        """
+        self.func(db, opts)
+
 
 class PipelineGraph:
     """
     Represents the order/dependency graph of pipelines.
     """
-    def __init__(self, pipelines):
+    def __init__(self,
+                 pipelines: List[Pipeline],
+                 stages: Optional[List[StageT]] = None):
         self.pipelines = pipelines
+        self.stages = stages or []
 
-    def run(self, db, opts: options.Pipeline):
+    def sources(self, opts: options.Pipeline) -> List[str]:
+        """
+        Names of the sources read by our enabled pipelines.
+        """
+        return list(dict.fromkeys(p.source.name for p in self.pipelines if p.enabled(opts)))
+
+    def run(self, db, opts: options.Pipeline, reused: Iterable[Pipeline] = (), database: str = 'previous'):
+        """
+        Run all enabled pipelines followed by all enabled stages.
+
+        Pipelines in `reused` copy their tables from the given attached database instead of running.
+        """
+        self.run_pipelines(db, opts, reused, database)
+        self.run_stages(db, opts)
+
+    def run_pipelines(self, db, opts: options.Pipeline, reused: Iterable[Pipeline] = (), database: str = 'previous'):
+        """
+        Run all enabled pipelines.
+
+        Pipelines in `reused` copy their tables from the given attached database instead of running.
+        """
+        reused = set(reused)
         for pipeline in self.pipelines:
+            if not pipeline.enabled(opts):
+                print(f'Skipping pipeline {pipeline}')
+                continue
+            if pipeline in reused:
+                print(f'Copying pipeline {pipeline}')
+                pipeline.copy(db, opts, database)
+                continue
             print(f'Starting pipeline {pipeline}')
             pipeline.run(db, opts)
             print(f'Finished pipeline {pipeline}')
+
+    def run_stages(self, db, opts: options.Pipeline):
+        """
+        Run all enabled stages.
+        """
+        for stage in self.stages:
+            stage_options = opts.stage(stage.name)
+            if not stage_options.enabled:
+                print(f'Skipping stage {stage}')
+                continue
+            print(f'Starting stage {stage}')
+            stage.run(db, stage_options)
+            print(f'Finished stage {stage}')
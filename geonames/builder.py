@@ -0,0 +1,101 @@
+"""
+    geonames/builder
+    ~~~~~~~~~~~~~~~~
+
+    Contains functionality for building a database file from pipeline options.
+
+    Databases are built in place by default. With a `staging` database set
+    (`:memory:` or a file on tmpfs) the build runs against the staging database
+    and the result is copied to the output path with the sqlite backup API,
+    which keeps disk I/O out of the load path.
+
+    Incremental builds write to `<path>.next` (or the staging database) with the
+    previous build attached and replace the previous build when done.
+"""
+import os
+import sqlite3
+import time
+
+from . import fetch, incremental, options, pipelines
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """
+    Open a database configured for bulk loading.
+    """
+    db = sqlite3.connect(path)
+    db.execute('PRAGMA foreign_keys = ON;')
+    db.execute('PRAGMA synchronous = OFF;')
+    db.execute('PRAGMA journal_mode = MEMORY;')
+    db.execute('PRAGMA page_size = 4096;')
+    return db
+
+
+def backup(db, path: str, pages: int = 4096) -> None:
+    """
+    Atomically copy the given database to the given path, `pages` pages at a time.
+    """
+    def progress(status, remaining, total):
+        print(f'Backup {total - remaining}/{total} pages')
+
+    tmp_path = f'{path}.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    target = sqlite3.connect(tmp_path)
+    try:
+        db.backup(target, pages=pages, progress=progress)
+    finally:
+        target.close()
+    os.replace(tmp_path, path)
+
+
+def build(path: str, opts: options.Pipeline) -> None:
+    """
+    Build a database at the given path using the given options, first downloading sources when enabled.
+
+    With `incremental` set and a previous build at the path, only pipelines whose inputs
+    changed are rerun and all other tables are copied from the previous build.
+    """
+    if opts.fetch.enabled:
+        fetch.fetch(opts, pipelines.Graph.sources(opts))
+
+    previous = path if opts.build.incremental and os.path.exists(path) else None
+    staging = opts.build.staging
+    target = staging or (f'{path}.next' if previous else path)
+    if previous and target != ':memory:' and os.path.exists(target):
+        os.remove(target)
+
+    db = connect(target)
+    try:
+        reused = []
+        if previous:
+            db.execute(f'ATTACH DATABASE ? AS {incremental.PREVIOUS};', (previous,))
+            sources, fingerprints = incremental.fingerprint(pipelines.Graph, opts, incremental.previous_sources(db))
+            reused = incremental.plan(pipelines.Graph, opts, fingerprints, incremental.previous_pipelines(db))
+        else:
+            # Hashing multi-GB source files is only worth it when builds are incremental.
+            sources, fingerprints = incremental.fingerprint(pipelines.Graph, opts, hash_contents=opts.build.incremental)
+
+        pipelines.Graph.run_pipelines(db, opts, reused, incremental.PREVIOUS)
+
+        # Stage scripts (e.g. `DROP TABLE IF EXISTS name_search`) would resolve unqualified
+        # names to the previous build while its tables are still missing from main.
+        if previous:
+            db.execute(f'DETACH DATABASE {incremental.PREVIOUS};')
+
+        # Fingerprints are recorded before finalize so they are vacuumed (or copied) with the database.
+        incremental.record(db, sources, fingerprints)
+        pipelines.Graph.run_stages(db, opts)
+
+        if staging:
+            start = time.perf_counter()
+            backup(db, path, opts.build.backup_pages)
+            print(f'Finished backup to {path} in {time.perf_counter() - start:.2f}s')
+    finally:
+        db.close()
+
+    if previous and not staging:
+        os.replace(target, path)
+    if staging and staging != ':memory:':
+        os.remove(staging)
@@ -0,0 +1,63 @@
+"""
+    geonames/columns
+    ~~~~~~~~~~~~~~~~
+
+    Contains vectorized validators for columns of source batches.
+
+    These are the column-at-a-time counterparts of :mod:`geonames.validators`
+    and produce the same values the record types would for each row.
+"""
+from typing import Any, List, Optional, Sequence
+
+import numpy as np
+
+
+def empty_str_to_none(column: Sequence[Optional[str]]) -> List[Optional[str]]:
+    return [v or None for v in column]
+
+
+def to_str(column: Sequence[Optional[str]]) -> np.ndarray:
+    return np.asarray([v or '' for v in column], dtype=str)
+
+
+def to_int(column: Sequence[str]) -> np.ndarray:
+    return np.asarray(column).astype(np.int64)
+
+
+def to_optional_int(column: Sequence[Optional[str]]) -> List[Optional[int]]:
+    return [int(v) if v else None for v in column]
+
+
+def to_float(column: Sequence[str]) -> np.ndarray:
+    return np.asarray(column).astype(np.float64)
+
+
+def sentinel_to_none(column: Sequence[Optional[str]], sentinel: str) -> List[Optional[int]]:
+    return [None if v == sentinel else int(v) for v in column]
+
+
+def optional_int_to_bool(column: Sequence[Optional[str]]) -> List[bool]:
+    return [bool(int(v)) if v else False for v in column]
+
+
+def in_range(column: np.ndarray, low: float, high: float) -> np.ndarray:
+    return (column >= low) & (column <= high)
+
+
+def valid_coordinates(latitude: np.ndarray, longitude: np.ndarray) -> np.ndarray:
+    return in_range(latitude, -90, 90) & in_range(longitude, -180, 180)
+
+
+def check(mask: np.ndarray, row_nums: Sequence[int], message: str) -> None:
+    """
+    Raise a ValueError naming the first row that fails the given mask.
+    """
+    if not mask.all():
+        raise ValueError(f'Row {row_nums[int(np.argmin(mask))]}: {message}')
+
+
+def to_list(column: Any) -> list:
+    """
+    Convert a column to a list of python values that sqlite can bind.
+    """
+    return column.tolist() if isinstance(column, np.ndarray) else list(column)
@@ -0,0 +1,318 @@
+"""
+    geonames/compact
+    ~~~~~~~~~~~~~~~~
+
+    Contains sqlite table definitions for the compact schema.
+
+    The compact schema stores small enumerations (feature class/code, continent)
+    as dense integer ids rather than text codes, stores join tables as
+    `WITHOUT ROWID` tables keyed by a covering primary key and drops indices
+    that are redundant or too unselective to be used.
+
+    Tables not defined here are shared with :mod:`geonames.tables`.
+"""
+from . import base, tables
+
+
+#: Names of the available schemas.
+DEFAULT = 'default'
+COMPACT = 'compact'
+
+
+#: SQL expressions that select the feature class/code text of a `geoname` row, keyed by schema.
+EXPRESSIONS = {
+    DEFAULT: dict(
+        feature_class='geoname.feature_class_id',
+        feature_code='geoname.feature_code_id'
+    ),
+    COMPACT: dict(
+        feature_class='(SELECT code FROM feature_class WHERE feature_class.id = geoname.feature_class_id)',
+        feature_code='(SELECT code FROM feature_code WHERE feature_code.id = geoname.feature_code_id)'
+    )
+}
+
+
+AdminCode = base.Table(
+    name='admin_code',
+    table="""
+CREATE TABLE IF NOT EXISTS admin_code (
+    geoname_id    INTEGER             NOT NULL,
+    level         INTEGER             NOT NULL      CHECK (level >= 1 AND level <= 4),
+    code          TEXT                NOT NULL      CHECK (code != ""),
+
+    PRIMARY KEY   (geoname_id, level),
+    FOREIGN KEY   (geoname_id)                      REFERENCES  geoname (id)
+) WITHOUT ROWID;
+""",
+    indices=None,
+    modify="""
+INSERT INTO admin_code (
+    geoname_id,
+    level,
+    code
+) VALUES (
+    :geoname_id,
+    :level,
+    :code
+);
+""")
+
+
+AlternateCountryCode = base.Table(
+    name='alternate_country_code',
+    table="""
+CREATE TABLE IF NOT EXISTS alternate_country_code (
+    geoname_id            INTEGER                 NOT NULL,
+    country_code_id       INTEGER                 NOT NULL,
+
+    PRIMARY KEY           (geoname_id, country_code_id),
+    FOREIGN KEY           (geoname_id)            REFERENCES  geoname (id),
+    FOREIGN KEY           (country_code_id)       REFERENCES  country_code (id)
+) WITHOUT ROWID;
+""",
+    indices="""
+CREATE INDEX IF NOT EXISTS alternate_country_code_country_code_id_idx ON alternate_country_code (country_code_id);
+""",
+    modify="""
+INSERT INTO alternate_country_code (
+    geoname_id,
+    country_code_id
+) VALUES (
+    :geoname_id,
+    (SELECT id FROM country_code WHERE alpha2=:country_code_alpha2)
+);
+""")
+
+
+Continent = base.Table(
+    name='continent',
+    table="""
+CREATE TABLE IF NOT EXISTS continent (
+    id            INTEGER PRIMARY KEY NOT NULL,
+    geoname_id    INTEGER             NOT NULL    UNIQUE,
+    code          TEXT                NOT NULL    UNIQUE  CHECK (code != "")
+);
+""",
+    indices=None,
+    modify="""
+INSERT INTO continent (
+    geoname_id,
+    code
+) VALUES (
+    :id,
+    :code
+);
+""")
+
+
+# Rows that would duplicate a primary key (e.g. `en` and `en-US` for one country) or
+# reference an unknown language are ignored.
+CountryLanguage = base.Table(
+    name='country_language',
+    table="""
+CREATE TABLE IF NOT EXISTS country_language (
+    country_id            INTEGER             NOT NULL,
+    language_code_id      INTEGER             NOT NULL,
+    country_code_id       INTEGER,
+
+    PRIMARY KEY           (country_id, language_code_id),
+    FOREIGN KEY           (language_code_id)                          REFERENCES language_code (id),
+    FOREIGN KEY           (country_code_id)                           REFERENCES country_code (id)
+) WITHOUT ROWID;
+""",
+    indices="""
+CREATE INDEX IF NOT EXISTS country_language_language_code_id_idx ON country_language (language_code_id);
+""",
+    modify="""
+INSERT OR IGNORE INTO country_language (
+    country_id,
+    language_code_id,
+    country_code_id
+) VALUES (
+    :country_id,
+    (SELECT id FROM language_code WHERE code3=:language_code OR code2=:language_code OR code1=:language_code),
+    (SELECT id FROM country_code WHERE alpha2=:country_code_alpha2)
+);
+""")
+
+
+# Rows that would duplicate a primary key or reference an unknown neighbor are ignored.
+CountryNeighbor = base.Table(
+    name='country_neighbor',
+    table="""
+CREATE TABLE IF NOT EXISTS country_neighbor (
+    country_id            INTEGER             NOT NULL,
+    neighbor_id           INTEGER             NOT NULL,
+
+    PRIMARY KEY           (country_id, neighbor_id),
+    FOREIGN KEY           (country_id)        REFERENCES geoname (id),
+    FOREIGN KEY           (neighbor_id)       REFERENCES geoname (id)
+) WITHOUT ROWID;
+""",
+    indices="""
+CREATE INDEX IF NOT EXISTS country_neighbor_neighbor_id_idx ON country_neighbor (neighbor_id);
+""",
+    modify="""
+INSERT OR IGNORE INTO country_neighbor (
+    country_id,
+    neighbor_id
+) VALUES (
+    :country_id,
+    (SELECT country.id
+     FROM country
+     INNER JOIN country_code ON country.country_code_id = country_code.id
+     WHERE country_code.alpha2=:neighbor_country_code_alpha2)
+);
+""")
+
+
+FeatureClass = base.Table(
+    name='feature_class',
+    table="""
+CREATE TABLE IF NOT EXISTS feature_class (
+    id            INTEGER PRIMARY KEY NOT NULL,
+    code          TEXT                NOT NULL    UNIQUE  CHECK (code != ""),
+    name          TEXT                NOT NULL    CHECK (name != ""),
+    description   TEXT
+);
+""",
+    indices=None,
+    modify="""
+INSERT INTO feature_class (
+    code,
+    name,
+    description
+) VALUES (
+    :id,
+    :name,
+    :description
+);
+""")
+
+
+FeatureCode = base.Table(
+    name='feature_code',
+    table="""
+CREATE TABLE IF NOT EXISTS feature_code (
+    id                INTEGER PRIMARY KEY NOT NULL,
+    code              TEXT                NOT NULL    UNIQUE  CHECK (code != ""),
+    class_id          INTEGER             NOT NULL,
+    name              TEXT                NOT NULL    CHECK (name != ""),
+    description       TEXT,
+
+    FOREIGN KEY       (class_id)          REFERENCES  feature_class (id)
+);
+""",
+    indices=None,
+    modify="""
+INSERT INTO feature_code (
+    code,
+    class_id,
+    name,
+    description
+) VALUES (
+    :id,
+    (SELECT id FROM feature_class WHERE code=:class),
+    :name,
+    :description
+);
+""")
+
+
+GEONAME_TABLE = """
+CREATE TABLE IF NOT EXISTS geoname (
+    id                    INTEGER PRIMARY KEY     NOT NULL,
+    name                  TEXT                                CHECK (name != ""),
+    ascii_name            TEXT                                CHECK (ascii_name != ""),
+    parent_id             INTEGER,
+    location_id           INTEGER                 NOT NULL,
+    feature_class_id      INTEGER,
+    feature_code_id       INTEGER,
+    country_code_id       INTEGER,
+    admin_division_id     INTEGER,
+
+    population            INTEGER,
+    elevation             INTEGER,
+
+    last_modified         TEXT                                CHECK (last_modified != ""),
+
+    FOREIGN KEY           (parent_id)                         REFERENCES geoname (id),
+    FOREIGN KEY           (location_id)                       REFERENCES location (id),
+    FOREIGN KEY           (feature_class_id)                  REFERENCES feature_class (id),
+    FOREIGN KEY           (feature_code_id)                   REFERENCES feature_code (id),
+    FOREIGN KEY           (country_code_id)                   REFERENCES country_code (id){admin_division_foreign_key}
+);
+"""
+
+
+GEONAME_MODIFY = """
+INSERT INTO geoname (
+    id,
+    name,
+    ascii_name,
+    parent_id,
+    location_id,
+    feature_class_id,
+    feature_code_id,
+    country_code_id,
+    admin_division_id,
+    population,
+    elevation,
+    last_modified
+) VALUES (
+    :id,
+    :name,
+    :ascii_name,
+    NULL,
+    (SELECT id FROM location WHERE latitude=:latitude AND longitude=:longitude),
+    (SELECT id FROM feature_class WHERE code=:feature_class),
+    (SELECT id FROM feature_code WHERE code=:feature_code),
+    (SELECT id FROM country_code WHERE alpha2=:country_code),
+    {admin_division_id},
+    :population,
+    :elevation,
+    :last_modified
+);
+"""
+
+
+Geoname = base.Table(
+    name='geoname',
+    table=GEONAME_TABLE.format(admin_division_foreign_key=tables.ADMIN_DIVISION_FOREIGN_KEY),
+    indices="""
+CREATE INDEX IF NOT EXISTS geoname_parent_id_idx            ON geoname (parent_id);
+CREATE INDEX IF NOT EXISTS geoname_location_id_idx          ON geoname (location_id);
+CREATE INDEX IF NOT EXISTS geoname_feature_code_id_idx      ON geoname (feature_code_id);
+CREATE INDEX IF NOT EXISTS geoname_country_code_id_idx      ON geoname (country_code_id);
+CREATE INDEX IF NOT EXISTS geoname_admin_division_id_idx    ON geoname (admin_division_id);
+CREATE INDEX IF NOT EXISTS geoname_last_modified_idx        ON geoname (last_modified);
+""",
+    modify=GEONAME_MODIFY.format(admin_division_id=tables.ADMIN_DIVISION_ID)
+)
+
+
+# See :data:`geonames.tables.GeonameWithoutAdminDivision`.
+GeonameWithoutAdminDivision = base.Table(
+    name='geoname',
+    table=GEONAME_TABLE.format(admin_division_foreign_key=''),
+    indices=Geoname.indices,
+    modify=GEONAME_MODIFY.format(admin_division_id='NULL')
+)
+
+
+def schema(db) -> str:
+    """
+    Return the name of the schema the given database was built with.
+    """
+    for _, name, column_type, *_ in db.execute('PRAGMA table_info(geoname);'):
+        if name == 'feature_code_id':
+            return COMPACT if column_type == 'INTEGER' else DEFAULT
+    return DEFAULT
+
+
+def render(db, sql: str, **values: str) -> str:
+    """
+    Fill the `{feature_class}`/`{feature_code}` placeholders of a query with expressions for the schema of the given database,
+    and any other placeholders with the given values.
+    """
+    return sql.format(**EXPRESSIONS[schema(db)], **values)
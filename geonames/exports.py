@@ -0,0 +1,290 @@
+"""
+    geonames/exports
+    ~~~~~~~~~~~~~~~~
+
+    Contains exports of a built database to formats for downstream analytics jobs.
+
+    The NumPy export writes one memory-mappable `.npy` file per core geoname
+    column plus a UTF-8 string pool of names with an offsets array, all in
+    geoname id order::
+
+        manifest.json     row count, column dtypes and the missing value of integer columns
+        <column>.npy      one array per entry of :data:`NUMPY_COLUMNS`
+        names.bin         concatenated UTF-8 names
+        name_offsets.npy  int64[rows + 1], name i is names.bin[offsets[i]:offsets[i + 1]]
+
+    The NDJSON/TSV exports stream one denormalized record per geoname (see
+    :data:`RECORD_FIELDS`). Fields backed by tables that were not built are null.
+
+    Usage::
+
+        $ python -m geonames.exports numpy geonames.sqlite geonames-npy/
+        $ python -m geonames.exports ndjson geonames.sqlite geonames.ndjson
+        $ python -m geonames.exports tsv geonames.sqlite - | gzip > geonames.tsv.gz
+"""
+import argparse
+import contextlib
+import json
+import os
+import sqlite3
+import sys
+
+import numpy as np
+
+from numpy.lib import format as npformat
+from typing import Any, Dict, Iterable, Iterator, List, TextIO, Tuple
+
+from . import compact
+
+
+#: Number of rows fetched from sqlite and written at a time.
+CHUNK_SIZE = 100000
+
+#: Value stored in integer columns for NULLs.
+MISSING = -1
+
+#: Core geoname columns and their dtypes, in :data:`NUMPY_GEONAMES` select order.
+NUMPY_COLUMNS: List[Tuple[str, str]] = [
+    ('id', '<i8'),
+    ('latitude', '<f8'),
+    ('longitude', '<f8'),
+    ('population', '<i8'),
+    ('elevation', '<i4'),
+    ('feature_class', 'S1'),
+    ('feature_code', 'S8'),
+    ('country_code', 'S2')
+]
+
+
+NUMPY_GEONAMES = """
+SELECT
+    geoname.id,
+    location.latitude,
+    location.longitude,
+    COALESCE(geoname.population, {missing}),
+    COALESCE(geoname.elevation, {missing}),
+    COALESCE({feature_class}, ''),
+    COALESCE({feature_code}, ''),
+    COALESCE(country_code.alpha2, ''),
+    COALESCE(geoname.name, '')
+FROM geoname
+LEFT JOIN location ON location.id = geoname.location_id
+LEFT JOIN country_code ON country_code.id = geoname.country_code_id
+ORDER BY geoname.id;
+"""
+
+
+#: Denormalized record fields as (name, SQL expression, tables the expression reads).
+RECORD_FIELDS: List[Tuple[str, str, Tuple[str, ...]]] = [
+    ('geoname_id', 'geoname.id', ()),
+    ('name', 'geoname.name', ()),
+    ('ascii_name', 'COALESCE(geoname.ascii_name, geoname.name)', ()),
+    # The unary + stops sqlite from scanning every English name via the language index.
+    ('english_name', """(SELECT alternate_name.name
+     FROM alternate_name
+     WHERE alternate_name.geoname_id = geoname.id
+       AND +alternate_name.language_code_id = (SELECT id FROM language_code WHERE code1 = 'en')
+     ORDER BY alternate_name.preferred DESC, alternate_name.historic, alternate_name.colloquial, alternate_name.id
+     LIMIT 1)""", ('alternate_name', 'language_code')),
+    ('latitude', 'location.latitude', ()),
+    ('longitude', 'location.longitude', ()),
+    ('feature_class', '{feature_class}', ('feature_class',)),
+    ('feature_class_name', '(SELECT name FROM feature_class WHERE feature_class.id = geoname.feature_class_id)',
+     ('feature_class',)),
+    ('feature_code', '{feature_code}', ('feature_code',)),
+    ('feature_code_name', '(SELECT name FROM feature_code WHERE feature_code.id = geoname.feature_code_id)',
+     ('feature_code',)),
+    ('country_code', '(SELECT alpha2 FROM country_code WHERE country_code.id = geoname.country_code_id)',
+     ('country_code',)),
+    ('country_name', '(SELECT name FROM country WHERE country.country_code_id = geoname.country_code_id)',
+     ('country',)),
+    *((f'admin{level}_code',
+       f'(SELECT code FROM admin_code WHERE admin_code.geoname_id = geoname.id AND admin_code.level = {level})',
+       ('admin_code',)) for level in range(1, 5)),
+    ('parent_id', 'geoname.parent_id', ()),
+    ('population', 'geoname.population', ()),
+    ('elevation', 'geoname.elevation', ()),
+    ('last_modified', 'geoname.last_modified', ())
+]
+
+
+RECORDS = """
+SELECT
+    {fields}
+FROM geoname
+LEFT JOIN location ON location.id = geoname.location_id
+ORDER BY geoname.id;
+"""
+
+
+def fetch_chunks(cursor, size: int = CHUNK_SIZE) -> Iterator[List[tuple]]:
+    """
+    Yield lists of up to `size` rows from the given cursor until it is exhausted.
+    """
+    cursor.arraysize = size
+    while True:
+        rows = cursor.fetchmany()
+        if not rows:
+            return
+        yield rows
+
+
+def export_numpy(db, path: str, chunk_size: int = CHUNK_SIZE) -> int:
+    """
+    Export the core geoname columns to `.npy` files in the given directory and return the row count.
+
+    Rows are streamed in chunks so memory use does not grow with the table size.
+    """
+    os.makedirs(path, exist_ok=True)
+    count, = db.execute('SELECT COUNT(*) FROM geoname;').fetchone()
+
+    arrays = {name: npformat.open_memmap(os.path.join(path, f'{name}.npy'), mode='w+', dtype=dtype, shape=(count,))
+              for name, dtype in NUMPY_COLUMNS}
+    offsets = npformat.open_memmap(os.path.join(path, 'name_offsets.npy'), mode='w+', dtype='<i8', shape=(count + 1,))
+    offsets[0] = 0
+
+    start = 0
+    with open(os.path.join(path, 'names.bin'), 'wb') as names:
+        cursor = db.execute(compact.render(db, NUMPY_GEONAMES, missing=str(MISSING)))
+        for rows in fetch_chunks(cursor, chunk_size):
+            end = start + len(rows)
+            columns = list(zip(*rows))
+            for (name, dtype), values in zip(NUMPY_COLUMNS, columns):
+                if dtype.startswith('S'):
+                    values = [v.encode('ascii') for v in values]
+                arrays[name][start:end] = np.array(values, dtype=dtype)
+
+            encoded = [name.encode('utf-8') for name in columns[-1]]
+            names.write(b''.join(encoded))
+            offsets[start + 1:end + 1] = offsets[start] + np.cumsum([len(name) for name in encoded], dtype='<i8')
+            start = end
+
+    for array in [*arrays.values(), offsets]:
+        array.flush()
+
+    manifest = dict(
+        rows=count,
+        columns={name: dtype for name, dtype in NUMPY_COLUMNS},
+        missing=MISSING,
+        names=dict(data='names.bin', offsets='name_offsets.npy')
+    )
+    with open(os.path.join(path, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return count
+
+
+def records(db, arraysize: int = CHUNK_SIZE) -> Iterator[Dict[str, Any]]:
+    """
+    Yield a denormalized record dict for every geoname in id order, fetching `arraysize` rows at a time.
+    """
+    tables = {name for name, in db.execute("SELECT name FROM sqlite_master WHERE type = 'table';")}
+    fields = ',\n    '.join(expression if all(t in tables for t in required) else 'NULL'
+                              for _, expression, required in RECORD_FIELDS)
+    sql = compact.render(db, RECORDS.replace('{fields}', fields))
+    names = [name for name, _, _ in RECORD_FIELDS]
+
+    for rows in fetch_chunks(db.execute(sql), arraysize):
+        for row in rows:
+            yield dict(zip(names, row))
+
+
+def write_ndjson(rows: Iterable[Dict[str, Any]], f: TextIO) -> int:
+    """
+    Write each record as a line of JSON and return the number written.
+    """
+    count = 0
+    for count, row in enumerate(rows, 1):
+        f.write(json.dumps(row, ensure_ascii=False, separators=(',', ':')))
+        f.write('\n')
+    return count
+
+
+def write_tsv(rows: Iterable[Dict[str, Any]], f: TextIO) -> int:
+    """
+    Write a header line followed by each record as tab separated values and return the number written.
+
+    NULLs are written as empty values and tabs/newlines within values are replaced with spaces.
+    """
+    f.write('\t'.join(name for name, _, _ in RECORD_FIELDS))
+    f.write('\n')
+
+    count = 0
+    for count, row in enumerate(rows, 1):
+        f.write('\t'.join('' if v is None else _tsv_value(v) for v in row.values()))
+        f.write('\n')
+    return count
+
+
+@contextlib.contextmanager
+def open_output(path: str) -> Iterator[TextIO]:
+    """
+    Open the given path for writing text, or use stdout for `-`.
+    """
+    if path == '-':
+        yield sys.stdout
+        return
+    with open(path, 'w', encoding='utf-8', newline='\n') as f:
+        yield f
+
+
+class Names:
+    """
+    Read-only view of an exported name string pool.
+    """
+    def __init__(self, path: str) -> None:
+        self.offsets = np.load(os.path.join(path, 'name_offsets.npy'), mmap_mode='r')
+        size = int(self.offsets[-1])
+        self.data = np.memmap(os.path.join(path, 'names.bin'), dtype=np.uint8, mode='r') if size else np.empty(0, np.uint8)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return self.data[self.offsets[i]:self.offsets[i + 1]].tobytes().decode('utf-8')
+
+
+def load_numpy(path: str) -> Tuple[Dict[str, np.ndarray], Names]:
+    """
+    Memory map a NumPy export, returning its column arrays and name pool.
+    """
+    columns = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r') for name, _ in NUMPY_COLUMNS}
+    return columns, Names(path)
+
+
+def _tsv_value(value: Any) -> str:
+    """
+    Format a value for a TSV field.
+    """
+    return str(value).replace('\t', ' ').replace('\r', ' ').replace('\n', ' ')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export a geonames sqlite database.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    numpy_parser = commands.add_parser('numpy', help='Export core geoname columns as .npy arrays')
+    numpy_parser.add_argument('database', help='Path to a built database')
+    numpy_parser.add_argument('path', help='Output directory')
+    numpy_parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Rows fetched at a time')
+
+    for name, description in (('ndjson', 'newline delimited JSON'), ('tsv', 'tab separated values')):
+        record_parser = commands.add_parser(name, help=f'Export denormalized geonames as {description}')
+        record_parser.add_argument('database', help='Path to a built database')
+        record_parser.add_argument('path', help='Output file, or - for stdout')
+        record_parser.add_argument('--arraysize', type=int, default=CHUNK_SIZE, help='Rows fetched at a time')
+
+    args = parser.parse_args()
+    db = sqlite3.connect(f'file:{args.database}?mode=ro', uri=True)
+
+    if args.command == 'numpy':
+        count = export_numpy(db, args.path, args.chunk_size)
+        print(f'Exported {count} geonames to {args.path}')
+    else:
+        write = write_ndjson if args.command == 'ndjson' else write_tsv
+        with open_output(args.path) as f:
+            count = write(records(db, args.arraysize), f)
+        print(f'Exported {count} geonames to {args.path}', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
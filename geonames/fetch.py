@@ -0,0 +1,208 @@
+"""
+    geonames/fetch
+    ~~~~~~~~~~~~~~
+
+    Contains a parallel, cached downloader for GeoNames dump files.
+
+    Files are downloaded into a cache directory alongside a `<file>.meta.json`
+    recording the ETag, Last-Modified time, size and SHA-256 of the cached copy.
+    Subsequent fetches are conditional requests that skip unchanged files
+    entirely, interrupted downloads are resumed with range requests and zip
+    archives are extracted only when they change.
+
+    Usage::
+
+        $ python -m geonames.fetch full
+"""
+import concurrent.futures
+import hashlib
+import json
+import os
+import shutil
+import sys
+import urllib.error
+import urllib.parse
+import urllib.request
+import zipfile
+
+from typing import Dict, Iterable, List, Optional
+
+from . import options, pipelines
+
+
+#: Number of bytes read from a response or file at a time.
+CHUNK_SIZE = 1024 * 1024
+
+#: Seconds to wait on a stalled connection.
+TIMEOUT = 60
+
+
+def sha256(path: str) -> str:
+    """
+    Return the hex SHA-256 digest of the given file.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_meta(path: str) -> Dict[str, str]:
+    """
+    Return the cache metadata of the given file, or an empty dict if there is none.
+    """
+    try:
+        with open(f'{path}.meta.json', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_meta(path: str, meta: Dict[str, str]) -> None:
+    """
+    Write the cache metadata of the given file.
+    """
+    with open(f'{path}.meta.json', 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+
+
+def download(url: str, path: str, checksum: Optional[str] = None) -> bool:
+    """
+    Download the given url to the given path unless the cached copy is unchanged.
+
+    Return True if the file was (re)downloaded or False if the cached copy is current.
+    """
+    meta = read_meta(path)
+    part_path = f'{path}.part'
+    headers = {}
+
+    if os.path.exists(path) and meta.get('url') == url and meta.get('size') == os.path.getsize(path):
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    if offset and meta.get('url') == url and (meta.get('etag') or meta.get('last_modified')):
+        headers['Range'] = f'bytes={offset}-'
+        headers['If-Range'] = meta.get('etag') or meta['last_modified']
+    else:
+        offset = 0
+
+    try:
+        response = urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=TIMEOUT)
+    except urllib.error.HTTPError as ex:
+        if ex.code == 304:
+            return False
+        if ex.code == 416:
+            os.remove(part_path)
+            return download(url, path, checksum)
+        raise
+
+    with response:
+        if response.status != 206:
+            offset = 0
+        meta = dict(
+            url=url,
+            etag=response.headers.get('ETag'),
+            last_modified=response.headers.get('Last-Modified')
+        )
+        write_meta(path, meta)
+
+        with open(part_path, 'ab' if offset else 'wb') as f:
+            shutil.copyfileobj(response, f, CHUNK_SIZE)
+
+    length = response.headers.get('Content-Length')
+    if length is not None and os.path.getsize(part_path) != offset + int(length):
+        raise IOError(f'Incomplete download of {url}; rerun to resume')
+
+    digest = sha256(part_path)
+    if checksum and digest != checksum.lower():
+        os.remove(part_path)
+        raise ValueError(f'Checksum mismatch for {url}: expected {checksum}, got {digest}')
+
+    os.replace(part_path, path)
+    write_meta(path, dict(meta, size=os.path.getsize(path), sha256=digest))
+    return True
+
+
+def extract(archive: str, member: str, path: str, force: bool = False) -> None:
+    """
+    Extract a member of a zip archive to the given path unless it was already extracted.
+    """
+    if os.path.exists(path) and not force:
+        return
+
+    tmp_path = f'{path}.tmp'
+    with zipfile.ZipFile(archive) as z, z.open(member) as src, open(tmp_path, 'wb') as dst:
+        shutil.copyfileobj(src, dst, CHUNK_SIZE)
+    os.replace(tmp_path, path)
+
+
+def cache_path(cache_dir: str, base_url: str, url: str) -> str:
+    """
+    Return the cache location of the given url.
+
+    Urls under the base url are cached by their relative path and all others by host and path,
+    so files with the same name in different directories (e.g. `allCountries.zip`) don't collide.
+    """
+    if url.startswith(base_url):
+        relative = url[len(base_url):]
+    else:
+        parsed = urllib.parse.urlparse(url)
+        relative = f'{parsed.netloc}{parsed.path}'
+    return os.path.join(cache_dir, *relative.split('/'))
+
+
+def fetch(opts: options.Pipeline, names: Iterable[str]) -> Dict[str, str]:
+    """
+    Download the named sources concurrently and point their options at the local files.
+
+    Sources sharing a url (e.g. several members of one archive) are downloaded once.
+    Return the local path of each fetched source.
+    """
+    fetch_options = opts.fetch
+    os.makedirs(fetch_options.cache_dir, exist_ok=True)
+
+    by_url: Dict[str, List[str]] = {}
+    for name in names:
+        source = opts.sources[name]
+        if source.enabled and source.url:
+            by_url.setdefault(urllib.parse.urljoin(fetch_options.base_url, source.url), []).append(name)
+
+    def fetch_url(url: str) -> List[str]:
+        path = cache_path(fetch_options.cache_dir, fetch_options.base_url, url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        checksum = next((opts.sources[n].sha256 for n in by_url[url] if opts.sources[n].sha256), None)
+        changed = download(url, path, checksum)
+        print(f'{"Downloaded" if changed else "Unchanged"} {url}')
+
+        paths = []
+        for name in by_url[url]:
+            source = opts.sources[name]
+            if zipfile.is_zipfile(path):
+                member = source.member or f'{os.path.splitext(os.path.basename(path))[0]}.txt'
+                member_path = os.path.join(os.path.dirname(path), member)
+                extract(path, member, member_path, force=changed)
+                paths.append(member_path)
+            else:
+                paths.append(path)
+        return paths
+
+    result = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=fetch_options.workers) as executor:
+        for url, paths in zip(by_url, executor.map(fetch_url, by_url)):
+            for name, path in zip(by_url[url], paths):
+                opts.sources[name].path = path
+                result[name] = path
+    return result
+
+
+def main():
+    opts = options.load_profile(sys.argv[1]) if len(sys.argv) > 1 else options.Graph
+    fetch(opts, pipelines.Graph.sources(opts))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+    geonames/filters
+    ~~~~~~~~~~~~~~~~
+
+    Contains row filter factories for subset builds.
+
+    With a profile `filter` set (see :class:`geonames.options.Filter`), geoname rows
+    are rejected by population, feature class and country from their raw field values,
+    and rows of dependent sources (alternate names, hierarchy, user tags, shapes) are
+    rejected unless every geoname they reference was loaded. Rejected rows are never
+    validated or inserted, so build time and size scale with the subset.
+"""
+from typing import List, Optional
+
+from . import base, options
+
+
+def geonames(db, opts: options.Pipeline, fields: List[str]) -> Optional[base.RowFilter]:
+    """
+    Return a filter of geoname rows meeting the minimum population, feature classes and country codes.
+    """
+    min_population = opts.filter.min_population
+    feature_classes = frozenset(opts.filter.feature_classes) or None
+    country_codes = frozenset(opts.filter.country_codes) or None
+
+    population = fields.index('population')
+    feature_class = fields.index('feature_class')
+    country_code = fields.index('country_code')
+
+    # Rows with a missing or malformed population are kept so that validation reports them.
+    def keep(row: List[Optional[str]]) -> bool:
+        value = row[population]
+        if min_population and value and value.isdigit() and int(value) < min_population:
+            return False
+        if feature_classes is not None and row[feature_class] not in feature_classes:
+            return False
+        if country_codes is not None and row[country_code] not in country_codes:
+            return False
+        return True
+
+    return keep
+
+
+def countries(field: str) -> base.RowFilterFactory:
+    """
+    Return a filter factory of rows whose given field starts with one of the filtered country codes,
+    e.g. `US` or `US.CA.037`.
+    """
+    def factory(db, opts: options.Pipeline, fields: List[str]) -> Optional[base.RowFilter]:
+        if not opts.filter.country_codes:
+            return None
+
+        i = fields.index(field)
+        country_codes = frozenset(opts.filter.country_codes)
+        return lambda row: (row[i] or '')[:2] in country_codes
+
+    return factory
+
+
+def geoname_references(*names: str) -> base.RowFilterFactory:
+    """
+    Return a filter factory of rows whose given geoname id fields all reference loaded geonames.
+
+    Filtering is skipped when the `geoname` table wasn't built.
+    """
+    def factory(db, opts: options.Pipeline, fields: List[str]) -> Optional[base.RowFilter]:
+        if not _has_table(db, 'geoname'):
+            return None
+
+        # Ids are compared as the raw strings read from the file.
+        ids = {str(geoname_id) for geoname_id, in db.execute('SELECT id FROM geoname;')}
+        indices = [fields.index(name) for name in names]
+        if len(indices) == 1:
+            i, = indices
+            return lambda row: row[i] in ids
+        return lambda row: all(row[i] in ids for i in indices)
+
+    return factory
+
+
+def _has_table(db, name: str) -> bool:
+    """
+    Return True if the database has a table with the given name.
+    """
+    cursor = db.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?;", (name,))
+    return cursor.fetchone() is not None
@@ -0,0 +1,99 @@
+"""
+    geonames/finalize
+    ~~~~~~~~~~~~~~~~~
+
+    Contains the post-build steps that prepare a database for read-only use.
+"""
+import os
+import sqlite3
+import time
+
+from typing import Callable, Dict, List, Optional, Tuple
+
+from . import hilbert, options
+
+
+def check(db) -> None:
+    """
+    Verify the integrity of the database and all foreign key references.
+    """
+    problems = [row[0] for row in db.execute('PRAGMA quick_check;')]
+    if problems != ['ok']:
+        raise sqlite3.IntegrityError(f'quick_check failed: {problems[:10]}')
+
+    violations: Dict[str, int] = {}
+    for table, _, parent, _ in db.execute('PRAGMA foreign_key_check;'):
+        key = f'{table} -> {parent}'
+        violations[key] = violations.get(key, 0) + 1
+    if violations:
+        raise sqlite3.IntegrityError(f'foreign_key_check failed: {violations}')
+
+
+def analyze(db) -> None:
+    """
+    Gather query planner statistics for all tables and indices.
+    """
+    db.execute('ANALYZE;')
+    db.execute('PRAGMA optimize;')
+    db.commit()
+
+
+def defaults(db) -> None:
+    """
+    Set persistent settings suited to read-only use: a rollback journal (so readers
+    don't need a writable -wal/-shm file) and no auto vacuum bookkeeping.
+    """
+    db.execute('PRAGMA journal_mode = DELETE;')
+    db.execute('PRAGMA auto_vacuum = NONE;')
+
+
+def vacuum(db, path: Optional[str] = None, page_size: Optional[int] = None) -> None:
+    """
+    Rebuild the database in place, or atomically into a fresh file at the given path,
+    optionally changing the page size.
+    """
+    db.commit()
+    if page_size:
+        db.execute(f'PRAGMA page_size = {int(page_size)};')
+
+    if not path:
+        db.execute('VACUUM;')
+        return
+
+    tmp_path = f'{path}.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    db.execute('VACUUM INTO ?;', (tmp_path,))
+    os.replace(tmp_path, path)
+
+
+def steps(opts: options.Finalize) -> List[Tuple[str, Callable[[sqlite3.Connection], None]]]:
+    """
+    Return the (name, function) of each enabled finalize step in execution order.
+    """
+    result = []
+    if opts.hilbert or opts.hilbert_geoname:
+        result.append(('hilbert', hilbert.order_locations))
+    if opts.hilbert_geoname:
+        result.append(('hilbert_geoname', hilbert.index_geonames))
+    if opts.check:
+        result.append(('check', check))
+    if opts.analyze:
+        result.append(('analyze', analyze))
+    result.append(('defaults', defaults))
+    if opts.vacuum:
+        result.append(('vacuum', lambda db: vacuum(db, opts.path, opts.page_size)))
+    return result
+
+
+def run(db, opts: options.Finalize) -> Dict[str, float]:
+    """
+    Run each enabled finalize step and return the seconds taken by each.
+    """
+    timings = {}
+    for name, func in steps(opts):
+        start = time.perf_counter()
+        func(db)
+        timings[name] = time.perf_counter() - start
+        print(f'Finished finalize step {name} in {timings[name]:.2f}s')
+    return timings
@@ -0,0 +1,301 @@
+"""
+    geonames/geocoder
+    ~~~~~~~~~~~~~~~~~
+
+    Contains an in-memory reverse geocoder backed by NumPy arrays.
+
+    Points are converted to unit-sphere coordinates and bucketed into a uniform
+    3D grid whose cells are stored sorted by key. Nearest neighbor queries probe
+    the cells surrounding each query point for a whole batch at once and widen
+    the search only for the queries that could not be resolved exactly.
+"""
+import json
+import struct
+
+import numpy as np
+
+from typing import Optional, Tuple
+
+
+#: Mean radius of the earth in kilometers.
+EARTH_RADIUS_KM = 6371.0088
+
+#: Magic bytes that identify a geocoder snapshot file.
+SNAPSHOT_MAGIC = b'GNGRID01'
+
+#: Byte alignment of each array within a snapshot file.
+SNAPSHOT_ALIGNMENT = 64
+
+#: Average number of points per occupied grid cell when sizing the grid.
+POINTS_PER_CELL = 8
+
+#: Largest search ring (in cells) before falling back to a brute force scan.
+MAX_RING = 4
+
+#: Number of query points processed together to bound temporary memory.
+QUERY_CHUNK_SIZE = 4096
+
+#: Number of rows fetched from sqlite at a time while loading.
+FETCH_SIZE = 100000
+
+
+def to_unit_sphere(latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    """
+    Convert latitude/longitude degrees to an (N, 3) array of unit-sphere coordinates.
+    """
+    lat = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lon = np.radians(np.asarray(longitudes, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+
+
+def chord_to_km(chord: np.ndarray) -> np.ndarray:
+    """
+    Convert unit-sphere chord lengths to great-circle distances in kilometers.
+    """
+    distances = 2.0 * np.arcsin(np.minimum(chord / 2.0, 1.0)) * EARTH_RADIUS_KM
+    return np.where(np.isfinite(chord), distances, np.inf)
+
+
+class ReverseGeocoder:
+    """
+    Nearest neighbor index over geoname coordinates.
+    """
+    def __init__(self,
+                 keys: np.ndarray,
+                 ids: np.ndarray,
+                 points: np.ndarray,
+                 cells: int) -> None:
+        self.keys = keys
+        self.ids = ids
+        self.points = points
+        self.cells = cells
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def build(cls,
+              ids: np.ndarray,
+              latitudes: np.ndarray,
+              longitudes: np.ndarray,
+              cells: Optional[int] = None) -> 'ReverseGeocoder':
+        """
+        Build an index for the given geoname ids and their coordinates.
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        points = to_unit_sphere(latitudes, longitudes)
+        if cells is None:
+            cells = max(1, int(np.sqrt(len(ids) / (POINTS_PER_CELL * np.pi))))
+
+        keys = cls._cell_keys(cls._cell_coords(points, cells), cells)
+        order = np.argsort(keys, kind='stable')
+
+        return cls(keys[order], ids[order], points[order].astype(np.float32), cells)
+
+    @classmethod
+    def from_db(cls,
+                db,
+                where: Optional[str] = None,
+                params: Tuple = (),
+                cells: Optional[int] = None) -> 'ReverseGeocoder':
+        """
+        Build an index from the location of every geoname in the given database.
+
+        An optional SQL `where` clause (with parameters) can restrict the geonames
+        that are loaded, e.g. `geoname.population > 0`.
+        """
+        sql = """
+SELECT
+    geoname.id,
+    location.latitude,
+    location.longitude
+FROM geoname
+INNER JOIN location ON location.id = geoname.location_id
+"""
+        if where:
+            sql += f'WHERE {where}'
+
+        cursor = db.execute(sql, params)
+        chunks = []
+        while True:
+            rows = cursor.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            chunks.append(np.array(rows, dtype=np.float64))
+
+        data = np.concatenate(chunks) if chunks else np.empty((0, 3), dtype=np.float64)
+        return cls.build(data[:, 0].astype(np.int64), data[:, 1], data[:, 2], cells)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> 'ReverseGeocoder':
+        """
+        Load an index snapshot, memory mapping its arrays by default.
+        """
+        with open(path, 'rb') as f:
+            magic, header_size = struct.unpack('<8sQ', f.read(16))
+            if magic != SNAPSHOT_MAGIC:
+                raise ValueError(f'{path} is not a geocoder snapshot')
+            header = json.loads(f.read(header_size).decode('utf-8'))
+
+        arrays = {}
+        for name, spec in header['arrays'].items():
+            shape = tuple(spec['shape'])
+            if mmap and all(shape):
+                arrays[name] = np.memmap(path, dtype=spec['dtype'], mode='r', offset=spec['offset'], shape=shape)
+            else:
+                count = int(np.prod(shape))
+                arrays[name] = np.fromfile(path, dtype=spec['dtype'], count=count, offset=spec['offset']).reshape(shape)
+
+        return cls(arrays['keys'], arrays['ids'], arrays['points'], header['cells'])
+
+    def save(self, path: str) -> None:
+        """
+        Write the index to a snapshot file that can be memory mapped by :meth:`load`.
+        """
+        arrays = dict(keys=self.keys, ids=self.ids, points=self.points)
+
+        specs = {}
+        offset = 0
+        for name, array in arrays.items():
+            specs[name] = dict(dtype=array.dtype.str, shape=list(array.shape), offset=offset)
+            offset = _align(offset + array.nbytes)
+
+        # The header stores absolute offsets, so grow the data offset until the header fits.
+        data_offset = 0
+        while True:
+            absolute = {name: dict(spec, offset=spec['offset'] + data_offset) for name, spec in specs.items()}
+            header = json.dumps(dict(cells=self.cells, arrays=absolute)).encode('utf-8')
+            if _align(16 + len(header)) <= data_offset:
+                break
+            data_offset = _align(16 + len(header))
+        specs = absolute
+
+        with open(path, 'wb') as f:
+            f.write(struct.pack('<8sQ', SNAPSHOT_MAGIC, len(header)))
+            f.write(header)
+            for name, array in arrays.items():
+                f.seek(specs[name]['offset'])
+                f.write(np.ascontiguousarray(array).tobytes())
+
+    def query(self,
+              latitudes: np.ndarray,
+              longitudes: np.ndarray,
+              k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the `k` nearest geonames for each query point.
+
+        Returns a tuple of (Q, k) arrays of distances in kilometers and geoname ids,
+        ordered nearest first. Missing neighbors have an infinite distance and an id of -1.
+        A `k` below 1 returns (Q, 0) arrays.
+        """
+        queries = to_unit_sphere(np.atleast_1d(latitudes), np.atleast_1d(longitudes))
+        if k < 1:
+            return np.zeros((len(queries), 0)), np.zeros((len(queries), 0), dtype=np.int64)
+
+        chords = np.full((len(queries), k), np.inf)
+        indices = np.full((len(queries), k), -1, dtype=np.int64)
+
+        for start in range(0, len(queries), QUERY_CHUNK_SIZE):
+            stop = start + QUERY_CHUNK_SIZE
+            self._query_chunk(queries[start:stop], k, chords[start:stop], indices[start:stop])
+
+        if not len(self.ids):
+            return chord_to_km(chords), indices
+
+        ids = np.where(indices >= 0, np.asarray(self.ids)[np.maximum(indices, 0)], -1)
+        return chord_to_km(chords), ids
+
+    def _query_chunk(self, queries: np.ndarray, k: int, chords: np.ndarray, indices: np.ndarray) -> None:
+        """
+        Resolve a chunk of queries in place, widening the search ring as needed.
+        """
+        pending = np.arange(len(queries))
+        cell_size = 2.0 / self.cells
+        ring = 1
+
+        while len(pending) and ring <= MAX_RING:
+            found_chords, found_indices = self._search_ring(queries[pending], k, ring)
+            chords[pending] = found_chords
+            indices[pending] = found_indices
+
+            # A result is exact when its k-th neighbor is closer than the searched extent.
+            resolved = found_chords[:, -1] <= ring * cell_size
+            if ring * cell_size >= 2.0:
+                resolved[:] = True
+            pending = pending[~resolved]
+            ring *= 2
+
+        for i in pending:
+            chords[i], indices[i] = self._search_all(queries[i], k)
+
+    def _search_ring(self, queries: np.ndarray, k: int, ring: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the `k` nearest points within all cells at most `ring` cells away from each query.
+        """
+        steps = np.arange(-ring, ring + 1)
+        offsets = np.stack(np.meshgrid(steps, steps, steps, indexing='ij'), axis=-1).reshape(-1, 3)
+
+        neighbors = self._cell_coords(queries, self.cells)[:, None, :] + offsets[None, :, :]
+        valid = np.all((neighbors >= 0) & (neighbors < self.cells), axis=2)
+        keys = np.where(valid, self._cell_keys(neighbors, self.cells), -1)
+
+        lo = np.searchsorted(self.keys, keys, side='left').ravel()
+        counts = np.searchsorted(self.keys, keys, side='right').ravel() - lo
+        total = counts.sum()
+
+        # Expand each (start, count) cell range into a flat array of candidate point indices.
+        starts = np.repeat(lo - (np.cumsum(counts) - counts), counts)
+        candidates = starts + np.arange(total)
+        owners = np.repeat(np.arange(len(queries)), counts.reshape(len(queries), -1).sum(axis=1))
+
+        deltas = np.asarray(self.points[candidates], dtype=np.float64) - queries[owners]
+        distances = np.sqrt(np.einsum('ij,ij->i', deltas, deltas))
+
+        order = np.lexsort((distances, owners))
+        owners = owners[order]
+        group_starts = np.searchsorted(owners, np.arange(len(queries)), side='left')
+        ranks = np.arange(total) - group_starts[owners]
+        keep = ranks < k
+
+        chords = np.full((len(queries), k), np.inf)
+        indices = np.full((len(queries), k), -1, dtype=np.int64)
+        chords[owners[keep], ranks[keep]] = distances[order][keep]
+        indices[owners[keep], ranks[keep]] = candidates[order][keep]
+        return chords, indices
+
+    def _search_all(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the `k` nearest points to a single query by scanning every point.
+        """
+        chords = np.full(k, np.inf)
+        indices = np.full(k, -1, dtype=np.int64)
+
+        deltas = np.asarray(self.points, dtype=np.float64) - query
+        distances = np.sqrt(np.einsum('ij,ij->i', deltas, deltas))
+        nearest = np.argsort(distances, kind='stable')[:k]
+
+        chords[:len(nearest)] = distances[nearest]
+        indices[:len(nearest)] = nearest
+        return chords, indices
+
+    @staticmethod
+    def _cell_coords(points: np.ndarray, cells: int) -> np.ndarray:
+        """
+        Compute integer grid cell coordinates for unit-sphere points.
+        """
+        return np.clip(np.floor((points + 1.0) * (cells / 2.0)), 0, cells - 1).astype(np.int64)
+
+    @staticmethod
+    def _cell_keys(coords: np.ndarray, cells: int) -> np.ndarray:
+        """
+        Compute the linear key for integer grid cell coordinates.
+        """
+        return (coords[..., 0] * cells + coords[..., 1]) * cells + coords[..., 2]
+
+
+def _align(offset: int) -> int:
+    """
+    Round the given offset up to the snapshot array alignment.
+    """
+    return -(-offset // SNAPSHOT_ALIGNMENT) * SNAPSHOT_ALIGNMENT
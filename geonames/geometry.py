@@ -0,0 +1,259 @@
+"""
+    geonames/geometry
+    ~~~~~~~~~~~~~~~~~
+
+    Contains geometry parsing, encoding and point-in-polygon functionality for boundaries.
+
+    Geometries are handled as lists of polygons, where each polygon is a list of
+    rings (the outer ring followed by any holes) and each ring is a list of
+    (longitude, latitude) tuples.
+
+    Encoded geometries start with a flags byte followed by a payload of
+    little-endian uint32 polygon, ring and point counts and then coordinates.
+    Coordinates are float32 pairs, or with `DELTA` set, int32 deltas between
+    successive coordinates quantized to `DELTA_SCALE`. With `ZLIB` set the
+    payload is zlib compressed.
+"""
+import itertools
+import json
+import struct
+import sys
+import zlib
+
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+
+Point = Tuple[float, float]
+
+Ring = List[Point]
+
+Polygon = List[Ring]
+
+BoundingBox = Tuple[float, float, float, float]
+
+
+#: Flag for coordinates stored as quantized int32 deltas.
+DELTA = 0x01
+
+#: Flag for a zlib compressed payload.
+ZLIB = 0x02
+
+#: Number of quantization steps per degree for delta encoded coordinates.
+DELTA_SCALE = 1e6
+
+
+BOUNDARY_INDEX = """
+DROP TABLE IF EXISTS boundary_bbox;
+DROP TABLE IF EXISTS boundary_polygon;
+
+CREATE TABLE boundary_polygon (
+    id            INTEGER PRIMARY KEY NOT NULL,
+    boundary_id   INTEGER             NOT NULL,
+    rings         BLOB                NOT NULL,
+
+    FOREIGN KEY   (boundary_id)                   REFERENCES boundary (id)
+);
+
+CREATE INDEX IF NOT EXISTS boundary_polygon_boundary_id_idx ON boundary_polygon (boundary_id);
+
+CREATE VIRTUAL TABLE boundary_bbox USING rtree(
+    id,
+    min_longitude,
+    max_longitude,
+    min_latitude,
+    max_latitude,
+    +boundary_id  INTEGER
+);
+"""
+
+
+def parse_geojson(text: str) -> List[Polygon]:
+    """
+    Parse a GeoJSON Polygon or MultiPolygon into a list of polygons.
+    """
+    geometry = json.loads(text)
+    geometry_type = geometry.get('type')
+    coordinates = geometry.get('coordinates') or []
+
+    if geometry_type == 'Polygon':
+        coordinates = [coordinates]
+    elif geometry_type != 'MultiPolygon':
+        raise ValueError(f'Unsupported geometry type {geometry_type}')
+
+    return [[[(float(p[0]), float(p[1])) for p in ring] for ring in polygon] for polygon in coordinates]
+
+
+def bounding_box(polygon: Polygon) -> BoundingBox:
+    """
+    Return the (min_longitude, max_longitude, min_latitude, max_latitude) of a polygon's outer ring.
+    """
+    xs = [x for x, _ in polygon[0]]
+    ys = [y for _, y in polygon[0]]
+    return min(xs), max(xs), min(ys), max(ys)
+
+
+def encode(polygons: List[Polygon], delta: bool = False, compress: bool = False) -> bytes:
+    """
+    Encode polygons as packed structure counts followed by float32 or delta encoded coordinates.
+    """
+    counts = [len(polygons)]
+    counts.extend(len(polygon) for polygon in polygons)
+    counts.extend(len(ring) for polygon in polygons for ring in polygon)
+    coordinates = [c for polygon in polygons for ring in polygon for point in ring for c in point]
+
+    if delta:
+        quantized = [round(c * DELTA_SCALE) for c in coordinates]
+        xs = quantized[0::2]
+        ys = quantized[1::2]
+        coordinates = [d for pair in zip(_deltas(xs), _deltas(ys)) for d in pair]
+        payload = struct.pack(f'<{len(counts)}I{len(coordinates)}i', *counts, *coordinates)
+    else:
+        payload = struct.pack(f'<{len(counts)}I{len(coordinates)}f', *counts, *coordinates)
+
+    flags = (DELTA if delta else 0) | (ZLIB if compress else 0)
+    if compress:
+        payload = zlib.compress(payload, 9)
+    return bytes([flags]) + payload
+
+
+def decode(data: bytes) -> List[Polygon]:
+    """
+    Decode polygons previously encoded with :func:`encode`.
+    """
+    flags = data[0]
+    payload = zlib.decompress(data[1:]) if flags & ZLIB else memoryview(data)[1:]
+
+    polygon_count, = struct.unpack_from('<I', payload, 0)
+    ring_counts = struct.unpack_from(f'<{polygon_count}I', payload, 4)
+    offset = 4 * (1 + polygon_count)
+
+    point_counts = struct.unpack_from(f'<{sum(ring_counts)}I', payload, offset)
+    offset += 4 * len(point_counts)
+
+    if flags & DELTA:
+        deltas = struct.unpack_from(f'<{2 * sum(point_counts)}i', payload, offset)
+        xs = [x / DELTA_SCALE for x in itertools.accumulate(deltas[0::2])]
+        ys = [y / DELTA_SCALE for y in itertools.accumulate(deltas[1::2])]
+    else:
+        coordinates = struct.unpack_from(f'<{2 * sum(point_counts)}f', payload, offset)
+        xs = coordinates[0::2]
+        ys = coordinates[1::2]
+
+    points = iter(zip(xs, ys))
+    rings = iter([[next(points) for _ in range(count)] for count in point_counts])
+    return [[next(rings) for _ in range(count)] for count in ring_counts]
+
+
+def to_geojson(polygons: List[Polygon]) -> str:
+    """
+    Serialize polygons as a GeoJSON MultiPolygon.
+    """
+    coordinates = [[[list(point) for point in ring] for ring in polygon] for polygon in polygons]
+    return json.dumps(dict(type='MultiPolygon', coordinates=coordinates), separators=(',', ':'))
+
+
+class EncodedGeometry:
+    """
+    Lazily decoded wrapper around an encoded geometry.
+    """
+    def __init__(self, data: bytes) -> None:
+        self.data = data
+        self._polygons: Optional[List[Polygon]] = None
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    @property
+    def polygons(self) -> List[Polygon]:
+        """
+        Polygons of the geometry, decoded on first access.
+        """
+        if self._polygons is None:
+            self._polygons = decode(self.data)
+        return self._polygons
+
+    def geojson(self) -> str:
+        """
+        Return the geometry as GeoJSON text.
+        """
+        return to_geojson(self.polygons)
+
+    def contains(self, x: float, y: float) -> bool:
+        """
+        Return True if the given point lies inside the geometry.
+        """
+        return contains(self.polygons, x, y)
+
+
+def register_functions(db) -> None:
+    """
+    Register sqlite functions for working with encoded geometries, e.g. `geojson(boundary.geometry)`.
+    """
+    # sqlite3 accepts `deterministic` from Python 3.8.
+    flags = dict(deterministic=True) if sys.version_info >= (3, 8) else {}
+    db.create_function('geojson', 1, _geojson, **flags)
+
+
+def ring_contains(ring: Ring, x: float, y: float) -> bool:
+    """
+    Return True if the given point lies inside the ring using the even-odd ray casting rule.
+    """
+    inside = False
+    x0, y0 = ring[-1]
+    for x1, y1 in ring:
+        if (y1 > y) != (y0 > y) and x < (x0 - x1) * (y - y1) / (y0 - y1) + x1:
+            inside = not inside
+        x0, y0 = x1, y1
+    return inside
+
+
+def polygon_contains(polygon: Polygon, x: float, y: float) -> bool:
+    """
+    Return True if the given point lies inside the outer ring and outside all holes of a polygon.
+    """
+    if not ring_contains(polygon[0], x, y):
+        return False
+    return not any(ring_contains(hole, x, y) for hole in polygon[1:])
+
+
+def contains(polygons: Iterable[Polygon], x: float, y: float) -> bool:
+    """
+    Return True if the given point lies inside any of the given polygons.
+    """
+    return any(polygon_contains(polygon, x, y) for polygon in polygons)
+
+
+def boundary_polygons(db) -> Iterator[Tuple[int, Polygon]]:
+    """
+    Yield (boundary id, polygon) for every polygon of every boundary, whether stored as GeoJSON or encoded.
+    """
+    for boundary_id, geojson, data in db.execute('SELECT id, geojson, geometry FROM boundary ORDER BY id;'):
+        for polygon in parse_geojson(geojson) if geojson else decode(data):
+            yield boundary_id, polygon
+
+
+def build_index(db) -> None:
+    """
+    Build the per-polygon ring and bounding box tables used for point lookups.
+    """
+    db.executescript(BOUNDARY_INDEX)
+
+    for i, (boundary_id, polygon) in enumerate(boundary_polygons(db)):
+        db.execute('INSERT INTO boundary_polygon (id, boundary_id, rings) VALUES (?, ?, ?);',
+                   (i + 1, boundary_id, encode([polygon])))
+        db.execute('INSERT INTO boundary_bbox VALUES (?, ?, ?, ?, ?, ?);',
+                   (i + 1, *bounding_box(polygon), boundary_id))
+
+
+def _deltas(values: List[int]) -> Iterator[int]:
+    """
+    Yield the difference between each value and its predecessor.
+    """
+    return (b - a for a, b in zip(itertools.chain([0], values), values))
+
+
+def _geojson(data: Optional[bytes]) -> Optional[str]:
+    """
+    Sqlite function that converts an encoded geometry to GeoJSON text.
+    """
+    return to_geojson(decode(data)) if data else None
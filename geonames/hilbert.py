@@ -0,0 +1,247 @@
+"""
+    geonames/hilbert
+    ~~~~~~~~~~~~~~~~
+
+    Contains Hilbert curve keys for the spatial ordering of locations.
+
+    Coordinates are quantized to a `2^ORDER` x `2^ORDER` grid over the whole globe
+    (longitude along x, latitude along y) and each cell is keyed by its distance
+    along the Hilbert curve. Nearby points mostly get nearby keys, so storing rows
+    in key order clusters them on disk, and a bounding box is covered by a handful
+    of key ranges, each an index range scan over adjacent pages.
+
+    The finalize step (see :mod:`geonames.finalize`) renumbers `location` rows in
+    key order, storing the key in an indexed `hilbert` column, and optionally
+    copies the key to a `hilbert` column of `geoname` with a covering index.
+"""
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+
+#: Number of bits per axis of the grid; cells are ~600m (longitude) by ~300m (latitude) at the equator.
+ORDER = 16
+
+#: Number of cells per axis of the grid.
+SIZE = 1 << ORDER
+
+#: Default maximum number of key ranges covering a bounding box.
+MAX_RANGES = 32
+
+#: Number of locations keyed per batch while ordering.
+BATCH_SIZE = 100000
+
+
+ORDER_LOCATIONS = """
+DROP TABLE IF EXISTS temp.location_order;
+
+-- Locations without coordinates sort last.
+CREATE TEMP TABLE location_order AS
+SELECT
+    row_number() OVER (ORDER BY hilbert_key.hilbert IS NULL, hilbert_key.hilbert, location.id) AS id,
+    location.id AS previous_id,
+    hilbert_key.hilbert AS hilbert,
+    {columns}
+FROM main.location
+LEFT JOIN temp.hilbert_key ON hilbert_key.id = location.id;
+
+CREATE INDEX temp.location_order_previous_id_idx ON location_order (previous_id);
+
+-- Rows are inserted in key order so rowid order (and page order) is key order.
+DELETE FROM main.location;
+
+INSERT INTO main.location (id, hilbert, {columns})
+SELECT id, hilbert, {columns}
+FROM temp.location_order
+ORDER BY id;
+"""
+
+
+INDEX_GEONAMES = """
+UPDATE geoname
+SET hilbert = (SELECT location.hilbert FROM location WHERE location.id = geoname.location_id);
+
+-- Covers bounding box candidate scans, so only locations are read to filter them.
+CREATE INDEX IF NOT EXISTS geoname_hilbert_idx ON geoname (hilbert, location_id);
+"""
+
+
+def encode(latitude: float, longitude: float) -> int:
+    """
+    Return the Hilbert key of the given point.
+    """
+    return _index(_cell(longitude, 180), _cell(latitude, 90))
+
+
+def encode_array(latitude: np.ndarray, longitude: np.ndarray) -> np.ndarray:
+    """
+    Return the Hilbert keys of the given arrays of points.
+    """
+    x = np.clip(((np.asarray(longitude, dtype=np.float64) + 180) / 360 * SIZE).astype(np.int64), 0, SIZE - 1)
+    y = np.clip(((np.asarray(latitude, dtype=np.float64) + 90) / 180 * SIZE).astype(np.int64), 0, SIZE - 1)
+    result = np.zeros(len(x), dtype=np.int64)
+
+    s = SIZE >> 1
+    while s:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        result += s * s * ((3 * rx.astype(np.int64)) ^ ry.astype(np.int64))
+
+        flip = rx & ~ry
+        x = np.where(flip, SIZE - 1 - x, x)
+        y = np.where(flip, SIZE - 1 - y, y)
+        x, y = np.where(ry, x, y), np.where(ry, y, x)
+        s >>= 1
+    return result
+
+
+def ranges(min_latitude: float,
+           min_longitude: float,
+           max_latitude: float,
+           max_longitude: float,
+           max_ranges: int = MAX_RANGES) -> List[Tuple[int, int]]:
+    """
+    Return sorted, inclusive (first, last) key ranges covering all points in the given bounding box.
+
+    Aligned quadrants of the grid each cover a contiguous range of keys. Quadrants overlapping the
+    edge of the box are split until splitting further would exceed `max_ranges`, so ranges may
+    include keys of points just outside the box (callers filter by coordinates).
+    The box must not cross the antimeridian.
+    """
+    x0, y0 = _cell(min_longitude, 180), _cell(min_latitude, 90)
+    x1, y1 = _cell(max_longitude, 180), _cell(max_latitude, 90)
+
+    covered: List[Tuple[int, int, int]] = []
+    partial = [(0, 0, SIZE)]
+    while partial:
+        side = partial[0][2] // 2
+        inside, overlapping = [], []
+        for x, y, _ in partial:
+            for qx, qy in ((x, y), (x + side, y), (x, y + side), (x + side, y + side)):
+                if qx > x1 or qy > y1 or qx + side - 1 < x0 or qy + side - 1 < y0:
+                    continue
+                if qx >= x0 and qy >= y0 and qx + side - 1 <= x1 and qy + side - 1 <= y1:
+                    inside.append((qx, qy, side))
+                else:
+                    overlapping.append((qx, qy, side))
+        if len(covered) + len(inside) + len(overlapping) > max_ranges:
+            break
+        covered.extend(inside)
+        partial = overlapping
+    covered.extend(partial)
+
+    result: List[Tuple[int, int]] = []
+    for first, last in sorted(_key_range(x, y, side) for x, y, side in covered):
+        if result and result[-1][1] + 1 == first:
+            result[-1] = (result[-1][0], last)
+        else:
+            result.append((first, last))
+    return result
+
+
+def order_locations(db) -> None:
+    """
+    Renumber `location` rows in Hilbert key order of their coordinates and store each key in an
+    indexed `hilbert` column. Foreign keys referencing location ids (e.g. `geoname.location_id`)
+    are updated to match.
+    """
+    db.commit()
+    db.execute('PRAGMA foreign_keys = OFF;')
+    try:
+        columns = [row[1] for row in db.execute('PRAGMA main.table_info(location);')]
+        if 'hilbert' not in columns:
+            db.execute('ALTER TABLE location ADD COLUMN hilbert INTEGER;')
+        columns = [column for column in columns if column not in ('id', 'hilbert')]
+
+        db.executescript("""
+DROP TABLE IF EXISTS temp.hilbert_key;
+CREATE TEMP TABLE hilbert_key (id INTEGER PRIMARY KEY NOT NULL, hilbert INTEGER NOT NULL);
+""")
+        cursor = db.execute('SELECT id, latitude, longitude FROM location '
+                            'WHERE latitude IS NOT NULL AND longitude IS NOT NULL;')
+        while True:
+            rows = cursor.fetchmany(BATCH_SIZE)
+            if not rows:
+                break
+            ids, latitudes, longitudes = zip(*rows)
+            db.executemany('INSERT INTO temp.hilbert_key VALUES (?, ?);',
+                           zip(ids, encode_array(latitudes, longitudes).tolist()))
+
+        db.executescript(ORDER_LOCATIONS.format(columns=', '.join(columns)))
+        for table, column in _references(db, 'location'):
+            db.execute(f'UPDATE {table} SET {column} = '
+                       f'(SELECT id FROM temp.location_order WHERE previous_id = {table}.{column}) '
+                       f'WHERE {column} IS NOT NULL;')
+        db.execute('CREATE INDEX IF NOT EXISTS location_hilbert_idx ON location (hilbert);')
+        db.commit()
+        db.executescript("""
+DROP TABLE temp.location_order;
+DROP TABLE temp.hilbert_key;
+""")
+    finally:
+        db.execute('PRAGMA foreign_keys = ON;')
+
+
+def index_geonames(db) -> None:
+    """
+    Copy the Hilbert key of each geoname's location to an indexed `hilbert` column of `geoname`.
+
+    Requires locations ordered by :func:`order_locations`.
+    """
+    columns = [row[1] for row in db.execute('PRAGMA main.table_info(geoname);')]
+    if 'hilbert' not in columns:
+        db.execute('ALTER TABLE geoname ADD COLUMN hilbert INTEGER;')
+    db.executescript(INDEX_GEONAMES)
+
+
+def indexed_table(db) -> Optional[str]:
+    """
+    Return the name of the table whose `hilbert` column best indexes geonames by location
+    (`geoname`, then `location`), or None if the database wasn't ordered.
+    """
+    for table in ('geoname', 'location'):
+        if any(row[1] == 'hilbert' for row in db.execute(f'PRAGMA main.table_info({table});')):
+            return table
+    return None
+
+
+def _cell(value: float, half: float) -> int:
+    """
+    Return the grid cell along one axis of a coordinate in [-half, half].
+    """
+    return min(max(int((value + half) / (2 * half) * SIZE), 0), SIZE - 1)
+
+
+def _index(x: int, y: int) -> int:
+    """
+    Return the distance along the Hilbert curve of the given grid cell.
+    """
+    result = 0
+    s = SIZE >> 1
+    while s:
+        rx = 1 if x & s else 0
+        ry = 1 if y & s else 0
+        result += s * s * ((3 * rx) ^ ry)
+        if not ry:
+            if rx:
+                x, y = SIZE - 1 - x, SIZE - 1 - y
+            x, y = y, x
+        s >>= 1
+    return result
+
+
+def _key_range(x: int, y: int, side: int) -> Tuple[int, int]:
+    """
+    Return the inclusive key range of the aligned quadrant with the given corner cell and side.
+    """
+    first = _index(x, y) & ~(side * side - 1)
+    return first, first + side * side - 1
+
+
+def _references(db, target: str) -> List[Tuple[str, str]]:
+    """
+    Return the (table, column) of every foreign key referencing the given table.
+    """
+    tables = [name for name, in db.execute("SELECT name FROM sqlite_master WHERE type = 'table';")]
+    return [(table, row[3]) for table in tables
+            for row in db.execute(f'PRAGMA main.foreign_key_list({table});') if row[2] == target]
@@ -0,0 +1,239 @@
+"""
+    geonames/incremental
+    ~~~~~~~~~~~~~~~~~~~~
+
+    Contains source fingerprinting for incremental rebuilds.
+
+    Every build records a fingerprint of each source (size, mtime and, for
+    incremental builds, content hash) and of each pipeline (its source
+    fingerprint, options and table SQL) in the `build_source` and
+    `build_pipeline` tables. Sources are only hashed when they changed since the
+    previous build, so a touched but unchanged file doesn't rerun its pipelines;
+    sources recorded without a hash are identified by size and mtime alone.
+    An incremental rebuild
+    reruns the pipelines whose fingerprint changed, along with every pipeline
+    that reads a table they write or writes the same tables, and copies the
+    tables of all other pipelines from the previous database.
+
+    Table dependencies are derived from the SQL of each sink table, so the
+    graph does not need to declare them.
+"""
+import dataclasses
+import hashlib
+import json
+import os
+import re
+
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from . import base, options
+
+
+#: Number of bytes read at a time while hashing a source file.
+HASH_CHUNK_SIZE = 4 * 1024 * 1024
+
+#: Name the previous database is attached as during an incremental rebuild.
+PREVIOUS = 'previous'
+
+
+BUILD_METADATA = """
+DROP TABLE IF EXISTS build_source;
+DROP TABLE IF EXISTS build_pipeline;
+
+CREATE TABLE build_source (
+    name          TEXT    PRIMARY KEY NOT NULL    CHECK (name != ""),
+    path          TEXT,
+    size          INTEGER,
+    mtime_ns      INTEGER,
+    hash          TEXT                            CHECK (hash != "")
+) WITHOUT ROWID;
+
+CREATE TABLE build_pipeline (
+    name          TEXT    PRIMARY KEY NOT NULL    CHECK (name != ""),
+    fingerprint   TEXT                NOT NULL    CHECK (fingerprint != "")
+) WITHOUT ROWID;
+"""
+
+
+WRITES = re.compile(r'\b(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|UPDATE)\s+(\w+)', re.IGNORECASE)
+
+READS = re.compile(r'\b(?:FROM|JOIN|UPDATE|REFERENCES)\s+(\w+)', re.IGNORECASE)
+
+
+@dataclasses.dataclass
+class SourceFingerprint:
+    name: str
+    path: Optional[str]
+    size: Optional[int]
+    mtime_ns: Optional[int]
+    hash: Optional[str]
+
+    @property
+    def key(self) -> str:
+        """
+        Identity of the source content: its hash, or its size and mtime when it wasn't hashed.
+        """
+        return self.hash or f'{self.size}:{self.mtime_ns}'
+
+
+def hash_file(path: str) -> str:
+    """
+    Return the BLAKE2 digest of the given file.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_json(value: Any) -> str:
+    """
+    Return the BLAKE2 digest of a JSON serializable value.
+    """
+    data = json.dumps(value, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def fingerprint_source(source: base.Source,
+                       opts: options.Source,
+                       previous: Optional[SourceFingerprint] = None,
+                       hash_contents: bool = True) -> SourceFingerprint:
+    """
+    Fingerprint a source, reusing the previous hash (if any) of files whose size and mtime are unchanged.
+
+    Other files are hashed only with `hash_contents` set.
+    """
+    if not isinstance(source, base.FileSource):
+        return SourceFingerprint(source.name, None, None, None, hash_json(getattr(source, 'dataset', source.name)))
+
+    stat = os.stat(opts.path)
+    if previous and previous.size == stat.st_size and previous.mtime_ns == stat.st_mtime_ns:
+        digest = previous.hash
+    elif hash_contents:
+        digest = hash_file(opts.path)
+    else:
+        digest = None
+    return SourceFingerprint(source.name, opts.path, stat.st_size, stat.st_mtime_ns, digest)
+
+
+def fingerprint_pipeline(pipeline: base.Pipeline, opts: options.Pipeline, source: SourceFingerprint) -> str:
+    """
+    Fingerprint a pipeline from its source content, options, the SQL of its sink tables and,
+    for subset builds of filtered sources, the build filter.
+    """
+    source_options = dataclasses.asdict(opts.sources[pipeline.source.name])
+    for name in ('path', 'url', 'sha256'):
+        source_options.pop(name, None)
+
+    sinks = []
+    for sink in pipeline.sinks:
+        sink_options = opts.sink(sink.name)
+        table = sink.table_for(sink_options)
+        sinks.append([sink.name, dataclasses.asdict(sink_options), table.table, table.indices, table.modify])
+
+    values = dict(source=source.key, options=source_options, sinks=sinks)
+    if pipeline.source.filtered and opts.filter.enabled:
+        values['filter'] = dataclasses.asdict(opts.filter)
+    return hash_json(values)
+
+
+def tables(pipeline: base.Pipeline, opts: options.Pipeline) -> Tuple[Set[str], Set[str]]:
+    """
+    Return the names of the tables read and written by the enabled sinks of a pipeline.
+    """
+    reads, writes = set(), set()
+    for sink in pipeline.sinks:
+        sink_options = opts.sink(sink.name)
+        if not sink_options.enabled:
+            continue
+        table = sink.table_for(sink_options)
+        sql = f'{table.table or ""}\n{table.modify}'
+        reads.update(READS.findall(sql))
+        writes.update(WRITES.findall(sql))
+    return reads, writes
+
+
+def previous_sources(db, database: str = PREVIOUS) -> Dict[str, SourceFingerprint]:
+    """
+    Return the source fingerprints recorded in the given database, if any.
+    """
+    if not _has_table(db, database, 'build_source'):
+        return {}
+    rows = db.execute(f'SELECT name, path, size, mtime_ns, hash FROM {database}.build_source;')
+    return {row[0]: SourceFingerprint(*row) for row in rows}
+
+
+def previous_pipelines(db, database: str = PREVIOUS) -> Dict[str, str]:
+    """
+    Return the pipeline fingerprints recorded in the given database, if any.
+    """
+    if not _has_table(db, database, 'build_pipeline'):
+        return {}
+    return dict(db.execute(f'SELECT name, fingerprint FROM {database}.build_pipeline;'))
+
+
+def fingerprint(graph: base.PipelineGraph,
+                opts: options.Pipeline,
+                previous: Optional[Dict[str, SourceFingerprint]] = None,
+                hash_contents: bool = True) -> Tuple[List[SourceFingerprint], Dict[str, str]]:
+    """
+    Fingerprint the sources and pipelines of all enabled pipelines, hashing changed source files with `hash_contents` set.
+    """
+    previous = previous or {}
+    sources: Dict[str, SourceFingerprint] = {}
+    pipelines: Dict[str, str] = {}
+
+    for pipeline in graph.pipelines:
+        if not pipeline.enabled(opts):
+            continue
+        name = pipeline.source.name
+        if name not in sources:
+            sources[name] = fingerprint_source(pipeline.source, opts.sources[name], previous.get(name), hash_contents)
+        pipelines[str(pipeline)] = fingerprint_pipeline(pipeline, opts, sources[name])
+
+    return list(sources.values()), pipelines
+
+
+def plan(graph: base.PipelineGraph,
+         opts: options.Pipeline,
+         fingerprints: Dict[str, str],
+         previous: Dict[str, str]) -> List[base.Pipeline]:
+    """
+    Return the enabled pipelines whose tables can be copied from the previous build.
+
+    A pipeline is rerun when its fingerprint changed, when it reads a table written by a
+    rerun pipeline, or when it writes a table that a rerun pipeline also writes (as rerun
+    tables are rebuilt from scratch).
+    """
+    enabled = [p for p in graph.pipelines if p.enabled(opts)]
+    access = {p: tables(p, opts) for p in enabled}
+    rerun = {p for p in enabled if previous.get(str(p)) != fingerprints[str(p)]}
+
+    while True:
+        dirty = {name for p in rerun for name in access[p][1]}
+        dependents = {p for p in enabled if p not in rerun and (access[p][0] | access[p][1]) & dirty}
+        if not dependents:
+            break
+        rerun |= dependents
+
+    return [p for p in enabled if p not in rerun]
+
+
+def record(db, sources: List[SourceFingerprint], pipelines: Dict[str, str]) -> None:
+    """
+    Record the fingerprints of a build in the given database.
+    """
+    db.executescript(BUILD_METADATA)
+    db.executemany('INSERT INTO build_source (name, path, size, mtime_ns, hash) VALUES (?, ?, ?, ?, ?);',
+                   [dataclasses.astuple(source) for source in sources])
+    db.executemany('INSERT INTO build_pipeline (name, fingerprint) VALUES (?, ?);', pipelines.items())
+    db.commit()
+
+
+def _has_table(db, database: str, name: str) -> bool:
+    """
+    Return True if the given attached database has a table with the given name.
+    """
+    cursor = db.execute(f"SELECT 1 FROM {database}.sqlite_master WHERE type = 'table' AND name = ?;", (name,))
+    return cursor.fetchone() is not None
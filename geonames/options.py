@@ -5,88 +5,255 @@
     Contains configuration functionality.
 """
 import dataclasses
+import json
+import os
 
-from typing import Dict, Optional
+from typing import Any, Dict, List, Optional, Type
 
 
 @dataclasses.dataclass
 class Source:
     path: Optional[str] = None
     enabled: bool = True
+    url: Optional[str] = None
+    member: Optional[str] = None
+    sha256: Optional[str] = None
 
 
 @dataclasses.dataclass
 class Sink:
     enabled: bool = True
+    schema: str = 'default'
+    exclude_columns: List[str] = dataclasses.field(default_factory=list)
+    exclude_indices: List[str] = dataclasses.field(default_factory=list)
+
+
+@dataclasses.dataclass
+class Geoname(Sink):
+    admin_division: bool = True
+
+
+@dataclasses.dataclass
+class Boundary(Sink):
+    binary: bool = False
+    compress: bool = True
+
+
+@dataclasses.dataclass
+class Stage:
+    enabled: bool = True
+
+
+@dataclasses.dataclass
+class Trie(Stage):
+    path: Optional[str] = None
+    top_n: int = 10
+    max_depth: int = 24
+    min_population: int = 0
+
+
+@dataclasses.dataclass
+class Finalize(Stage):
+    check: bool = True
+    analyze: bool = True
+    vacuum: bool = True
+    path: Optional[str] = None
+    page_size: Optional[int] = None
+    hilbert: bool = False
+    hilbert_geoname: bool = False
+
+
+@dataclasses.dataclass
+class Build:
+    staging: Optional[str] = None
+    incremental: bool = False
+    backup_pages: int = 4096
+    batch_size: Optional[int] = None
+
+
+@dataclasses.dataclass
+class Filter:
+    min_population: int = 0
+    feature_classes: List[str] = dataclasses.field(default_factory=list)
+    country_codes: List[str] = dataclasses.field(default_factory=list)
+
+    @property
+    def enabled(self) -> bool:
+        """
+        True if any geonames are filtered out.
+        """
+        return bool(self.min_population or self.feature_classes or self.country_codes)
+
+
+@dataclasses.dataclass
+class Fetch:
+    enabled: bool = False
+    base_url: str = 'https://download.geonames.org/export/dump/'
+    cache_dir: str = 'data/cache'
+    workers: int = 4
 
 
 @dataclasses.dataclass
 class Pipeline:
     sinks: Dict[str, Sink]
     sources: Dict[str, Source]
+    stages: Dict[str, Stage] = dataclasses.field(default_factory=dict)
+    schema: str = 'default'
+    build: Build = dataclasses.field(default_factory=Build)
+    fetch: Fetch = dataclasses.field(default_factory=Fetch)
+    filter: Filter = dataclasses.field(default_factory=Filter)
 
+    def sink(self, name: str) -> Sink:
+        """
+        Return options for the named sink; sinks missing from the profile are disabled.
+        """
+        return self.sinks.get(name) or Sink(enabled=False)
 
-Graph = Pipeline(
-    sinks=dict(
-        abbreviation=Sink(),
-        admin_code=Sink(),
-        airport_code=Sink(),
-        alternate_country_code=Sink(),
-        alternate_name=Sink(),
-        boundary=Sink(),
-        continent=Sink(),
-        country=Sink(),
-        country_code=Sink(),
-        country_language=Sink(),
-        country_neighbor=Sink(),
-        currency=Sink(),
-        feature_class=Sink(),
-        feature_code=Sink(),
-        geoname=Sink(),
-        hierarchy=Sink(),
-        location=Sink(),
-        language_code=Sink(),
-        postal_code=Sink(),
-        time_zone=Sink(),
-        user_link=Sink(),
-        user_tag=Sink(),
-        wikidata=Sink(),
+    def stage(self, name: str) -> Stage:
+        """
+        Return options for the named stage; stages missing from the profile are disabled.
+        """
+        return self.stages.get(name) or Stage(enabled=False)
 
+
+#: Option types for sinks/stages that accept more than the common options.
+SINK_TYPES: Dict[str, Type[Sink]] = dict(
+    boundary=Boundary,
+    geoname=Geoname
+)
+
+STAGE_TYPES: Dict[str, Type[Stage]] = dict(
+    finalize=Finalize,
+    prefix_trie=Trie
+)
+
+
+#: Default source file locations and download urls (relative to `Fetch.base_url`); profiles may override them.
+SOURCES = dict(
+    admin1_code=Source(
+        path='data/admin1CodesASCII.txt',
+        url='admin1CodesASCII.txt'
+    ),
+    admin2_code=Source(
+        path='data/admin2Codes.txt',
+        url='admin2Codes.txt'
+    ),
+    alternate_name=Source(
+        path='data/alt-names/alternateNamesV2.txt',
+        url='alternateNamesV2.zip'
+    ),
+    continent=Source(),
+    country_info=Source(
+        path='data/countryInfoClean.txt',
+        url='countryInfo.txt'
+    ),
+    feature_class=Source(),
+    feature_code=Source(
+        path='data/featureCodes_en.txt',
+        url='featureCodes_en.txt'
+    ),
+    geoname_all_countries=Source(
+        path='data/allCountries.txt',
+        url='allCountries.zip'
+    ),
+    geoname_no_country=Source(
+        path='data/no-country.txt',
+        url='no-country.zip'
     ),
-    sources=dict(
-        alternate_name=Source(
-            path='data/alt-names/alternateNamesV2.txt'
-        ),
-        continent=Source(
-
-        ),
-        country_info=Source(
-            path='data/countryInfoClean.txt'
-        ),
-        feature_class=Source(),
-        feature_code=Source(
-            path='data/featureCodes_en.txt'
-        ),
-        geoname_all_countries=Source(
-            path='data/allCountries.txt'
-        ),
-        geoname_no_country=Source(
-            path='data/no-country.txt'
-        ),
-        hierarchy=Source(
-            path='data/hierarchy.txt'
-        ),
-        iso_language=Source(
-            path='data/iso-languagecodes.txt'
-        ),
-        shape=Source(
-            path='data/shapes_all_low.txt'
-        ),
-        time_zone=Source(
-            path='data/timeZones.txt'
-        ),
-        user_tag=Source(
-            path='data/userTags.txt'
-        ),
+    hierarchy=Source(
+        path='data/hierarchy.txt',
+        url='hierarchy.zip'
+    ),
+    iso_language=Source(
+        path='data/iso-languagecodes.txt',
+        url='iso-languagecodes.txt'
+    ),
+    postal_code_place=Source(
+        path='data/postal-codes/allCountries.txt',
+        url='../zip/allCountries.zip'
+    ),
+    shape=Source(
+        path='data/shapes_all_low.txt',
+        url='shapes_all_low.zip'
+    ),
+    time_zone=Source(
+        path='data/timeZones.txt',
+        url='timeZones.txt'
+    ),
+    user_tag=Source(
+        path='data/userTags.txt',
+        url='userTags.zip'
     )
 )
+
+
+#: Directory containing the bundled build profiles.
+PROFILES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles')
+
+
+def from_dict(data: Dict[str, Any]) -> Pipeline:
+    """
+    Create pipeline options from a profile dict.
+
+    Only the sinks and stages listed in the profile are enabled (unless they set `enabled` to false),
+    and sources default to :data:`SOURCES` with any listed fields overridden. The profile `schema`
+    (`default` or `compact`) applies to every sink that doesn't set its own. The profile `build`
+    sets :class:`Build` options, e.g. `{"staging": ":memory:"}` to build in memory or `{"batch_size": 10000}`
+    to feed sinks column batches instead of records, and the profile `fetch` sets :class:`Fetch` options, e.g. `{"enabled": true}` to download sources before building.
+    The profile `filter` sets :class:`Filter` options to build a subset, e.g. `{"min_population": 15000, "feature_classes": ["P"]}`.
+    Geonames are linked to their admin division when the `admin_division` sink is enabled.
+    """
+    schema = data.get('schema', 'default')
+    sink_values = data.get('sinks', {})
+    admin_division = sink_values.get('admin_division', {'enabled': False}).get('enabled', True)
+    defaults = dict(geoname=dict(admin_division=admin_division))
+
+    sources = {name: dataclasses.replace(source) for name, source in SOURCES.items()}
+    for name, values in data.get('sources', {}).items():
+        sources[name] = dataclasses.replace(sources.get(name, Source()), **values)
+
+    return Pipeline(
+        sinks={name: SINK_TYPES.get(name, Sink)(**{'schema': schema, **defaults.get(name, {}), **values})
+               for name, values in sink_values.items()},
+        sources=sources,
+        stages={name: STAGE_TYPES.get(name, Stage)(**values) for name, values in data.get('stages', {}).items()},
+        schema=schema,
+        build=Build(**data.get('build', {})),
+        fetch=Fetch(**data.get('fetch', {})),
+        filter=Filter(**data.get('filter', {}))
+    )
+
+
+def to_dict(opts: Pipeline) -> Dict[str, Any]:
+    """
+    Convert pipeline options to a profile dict.
+    """
+    return dataclasses.asdict(opts)
+
+
+def load(path: str) -> Pipeline:
+    """
+    Load pipeline options from a JSON profile file.
+    """
+    with open(path, encoding='utf-8') as f:
+        return from_dict(json.load(f))
+
+
+def dump(opts: Pipeline, path: str) -> None:
+    """
+    Write pipeline options to a JSON profile file.
+    """
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(to_dict(opts), f, indent=2)
+        f.write('\n')
+
+
+def load_profile(name: str) -> Pipeline:
+    """
+    Load a bundled profile by name (e.g. `full`) or a profile file by path.
+    """
+    path = name if name.endswith('.json') else os.path.join(PROFILES_DIR, f'{name}.json')
+    return load(path)
+
+
+Graph = load_profile('full')
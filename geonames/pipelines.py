@@ -4,7 +4,7 @@
 
     Contains pipeline graph definition for ingesting source files into sqlite.
 """
-from . import base, sinks, sources
+from . import base, sinks, sources, stages
 
 
 Graph = base.PipelineGraph(
@@ -40,6 +40,18 @@ Graph = base.PipelineGraph(
                 sinks.LanguageCode
             ]
         ),
+        base.Pipeline(
+            source=sources.Admin1Code,
+            sinks=[
+                sinks.AdminDivision
+            ]
+        ),
+        base.Pipeline(
+            source=sources.Admin2Code,
+            sinks=[
+                sinks.AdminDivision
+            ]
+        ),
         base.Pipeline(
             source=sources.GeonameNoCountry,
             sinks=[
@@ -104,6 +116,20 @@ Graph = base.PipelineGraph(
                 sinks.UserLink,
                 sinks.Wikidata
             ]
+        ),
+        base.Pipeline(
+            source=sources.PostalCodePlace,
+            sinks=[
+                sinks.PostalCodePlace
+            ]
         )
+    ],
+    stages=[
+        stages.BoundaryIndex,
+        stages.PostalCodeIndex,
+        stages.HierarchyClosure,
+        stages.NameSearch,
+        stages.PrefixTrie,
+        stages.Finalize
     ]
 )
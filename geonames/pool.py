@@ -0,0 +1,173 @@
+"""
+    geonames/pool
+    ~~~~~~~~~~~~~
+
+    Contains a pool of read-only connections for serving concurrent lookups from a built database.
+
+    Usage::
+
+        pool = ConnectionPool('geonames.sqlite', size=8)
+        with pool.connection() as db:
+            queries.autocomplete(db, 'lond')
+"""
+import contextlib
+import sqlite3
+import threading
+import time
+import urllib.parse
+
+from typing import Iterator, List, NamedTuple, Optional
+
+from . import geometry
+
+
+class PoolStats(NamedTuple):
+    """
+    Represents a snapshot of connection pool usage.
+    """
+    size: int
+    open: int
+    idle: int
+    in_use: int
+    acquired: int
+    waits: int
+    wait_seconds: float
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of read-only connections to a single database file.
+
+    Connections are opened lazily up to `size`, handed to one thread at a time and
+    reused most recently released first so the hottest page caches stay in use.
+    """
+    def __init__(self,
+                 path: str,
+                 size: int = 4,
+                 immutable: bool = True,
+                 mmap_size: int = 256 * 1024 * 1024,
+                 cache_size: int = -16 * 1024,
+                 timeout: Optional[float] = None) -> None:
+        self.path = path
+        self.size = size
+        self.immutable = immutable
+        self.mmap_size = mmap_size
+        self.cache_size = cache_size
+        self.timeout = timeout
+
+        self._condition = threading.Condition()
+        self._idle: List[sqlite3.Connection] = []
+        self._open = 0
+        self._acquired = 0
+        self._waits = 0
+        self._wait_seconds = 0.0
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def uri(self) -> str:
+        """
+        URI that opens our database read-only (and immutable, when the file will not change while open).
+        """
+        uri = f'file:{urllib.parse.quote(self.path)}?mode=ro'
+        return f'{uri}&immutable=1' if self.immutable else uri
+
+    def connect(self) -> sqlite3.Connection:
+        """
+        Open a new read-only connection configured for lookups.
+        """
+        db = sqlite3.connect(self.uri, uri=True, check_same_thread=False)
+        db.execute(f'PRAGMA mmap_size = {int(self.mmap_size)};')
+        db.execute(f'PRAGMA cache_size = {int(self.cache_size)};')
+        db.execute('PRAGMA query_only = ON;')
+        geometry.register_functions(db)
+        return db
+
+    def acquire(self, timeout: Optional[float] = None) -> sqlite3.Connection:
+        """
+        Take a connection from the pool, waiting up to `timeout` seconds for one to be released.
+        """
+        timeout = self.timeout if timeout is None else timeout
+
+        with self._condition:
+            if self._closed:
+                raise RuntimeError('Connection pool is closed')
+
+            if not self._idle and self._open >= self.size:
+                start = time.perf_counter()
+                self._waits += 1
+                available = self._condition.wait_for(lambda: self._idle or self._open < self.size or self._closed,
+                                                     timeout)
+                self._wait_seconds += time.perf_counter() - start
+                if self._closed:
+                    raise RuntimeError('Connection pool is closed')
+                if not available:
+                    raise TimeoutError(f'No connection available after {timeout}s')
+
+            self._acquired += 1
+            if self._idle:
+                return self._idle.pop()
+            self._open += 1
+
+        try:
+            return self.connect()
+        except Exception:
+            with self._condition:
+                self._open -= 1
+                self._condition.notify()
+            raise
+
+    def release(self, db: sqlite3.Connection) -> None:
+        """
+        Return a connection previously taken with :meth:`acquire` to the pool.
+        """
+        with self._condition:
+            if self._closed:
+                self._open -= 1
+                db.close()
+                return
+            self._idle.append(db)
+            self._condition.notify()
+
+    @contextlib.contextmanager
+    def connection(self, timeout: Optional[float] = None) -> Iterator[sqlite3.Connection]:
+        """
+        Context manager that acquires a connection and releases it on exit.
+        """
+        db = self.acquire(timeout)
+        try:
+            yield db
+        finally:
+            self.release(db)
+
+    def stats(self) -> PoolStats:
+        """
+        Return a snapshot of pool usage.
+        """
+        with self._condition:
+            return PoolStats(
+                size=self.size,
+                open=self._open,
+                idle=len(self._idle),
+                in_use=self._open - len(self._idle),
+                acquired=self._acquired,
+                waits=self._waits,
+                wait_seconds=self._wait_seconds
+            )
+
+    def close(self) -> None:
+        """
+        Close all idle connections; connections still in use are closed when released.
+        """
+        with self._condition:
+            self._closed = True
+            for db in self._idle:
+                db.close()
+            self._open -= len(self._idle)
+            self._idle.clear()
+            self._condition.notify_all()
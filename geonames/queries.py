@@ -0,0 +1,716 @@
+"""
+    geonames/queries
+    ~~~~~~~~~~~~~~~~
+
+    Contains read-side queries against a built database.
+
+    Queries with `{feature_class}`/`{feature_code}` placeholders are rendered for
+    the schema of the database with :func:`geonames.compact.render`.
+"""
+import json
+import math
+import re
+import sys
+
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from . import compact, geocoder, geometry, hilbert
+
+
+#: Initial search radius in degrees of nearest postal code queries, doubled until the nearest are found.
+NEAREST_RADIUS = 0.1
+
+
+class NameMatch(NamedTuple):
+    """
+    Represents a geoname matched by a name search.
+    """
+    geoname_id: int
+    name: str
+    country_code: Optional[str]
+    feature_class: Optional[str]
+    feature_code: Optional[str]
+    population: Optional[int]
+
+
+class Geoname(NamedTuple):
+    """
+    Represents a geoname resolved by id.
+    """
+    geoname_id: int
+    name: Optional[str]
+    country_code: Optional[str]
+    feature_class: Optional[str]
+    feature_code: Optional[str]
+    population: Optional[int]
+    latitude: Optional[float]
+    longitude: Optional[float]
+
+
+class Address(NamedTuple):
+    """
+    Represents the admin divisions and country a geoname is located in.
+    """
+    geoname_id: int
+    name: Optional[str]
+    admin2: Optional[str]
+    admin1: Optional[str]
+    country_code: Optional[str]
+
+    @property
+    def label(self) -> str:
+        """
+        Comma separated name, admin divisions and country code, skipping missing parts.
+        """
+        parts = [self.name, self.admin2, self.admin1, self.country_code]
+        return ', '.join(dict.fromkeys(part for part in parts if part))
+
+
+class HierarchyMember(NamedTuple):
+    """
+    Represents a geoname related to another through the administrative hierarchy.
+    """
+    geoname_id: int
+    name: str
+    feature_class: Optional[str]
+    feature_code: Optional[str]
+    population: Optional[int]
+    depth: int
+
+
+class PostalCodePlace(NamedTuple):
+    """
+    Represents a place from the postal codes dataset.
+    """
+    code: str
+    country_code: Optional[str]
+    place_name: Optional[str]
+    admin1_name: Optional[str]
+    admin2_name: Optional[str]
+    admin3_name: Optional[str]
+    latitude: float
+    longitude: float
+    accuracy: Optional[int]
+
+
+class PostalCodeCentroid(NamedTuple):
+    """
+    Represents the mean location of all places sharing a postal code within a country.
+    """
+    code: str
+    country_code: Optional[str]
+    latitude: float
+    longitude: float
+    places: int
+
+
+GEONAMES = """
+SELECT
+    geoname.id,
+    geoname.name,
+    country_code.alpha2,
+    {feature_class},
+    {feature_code},
+    geoname.population,
+    location.latitude,
+    location.longitude
+FROM geoname
+LEFT JOIN country_code ON country_code.id = geoname.country_code_id
+LEFT JOIN location ON location.id = geoname.location_id
+WHERE geoname.id IN (SELECT value FROM json_each(:ids));
+"""
+
+
+GEONAMES_BY_CODE = """
+SELECT
+    keys.key,
+    geoname.id,
+    geoname.name,
+    country_code.alpha2,
+    {feature_class},
+    {feature_code},
+    geoname.population,
+    location.latitude,
+    location.longitude
+FROM json_each(:keys) AS keys
+INNER JOIN {table} ON {table}.{column} = keys.value
+INNER JOIN geoname ON geoname.id = {table}.geoname_id
+LEFT JOIN country_code ON country_code.id = geoname.country_code_id
+LEFT JOIN location ON location.id = geoname.location_id
+ORDER BY keys.key, geoname.population DESC, geoname.id;
+"""
+
+
+GEONAMES_BY_COUNTRY_CODE = """
+SELECT
+    keys.key,
+    geoname.id,
+    geoname.name,
+    country_code.alpha2,
+    {feature_class},
+    {feature_code},
+    geoname.population,
+    location.latitude,
+    location.longitude
+FROM json_each(:keys) AS keys
+INNER JOIN country_code ON country_code.id = COALESCE(
+    (SELECT id FROM country_code WHERE alpha2 = upper(keys.value)),
+    (SELECT id FROM country_code WHERE alpha3 = upper(keys.value))
+)
+INNER JOIN country ON country.country_code_id = country_code.id
+INNER JOIN geoname ON geoname.id = country.id
+LEFT JOIN location ON location.id = geoname.location_id
+ORDER BY keys.key;
+"""
+
+
+ADDRESSES = """
+SELECT
+    geoname.id,
+    geoname.name,
+    CASE WHEN division.parent_id IS NOT NULL THEN division.name END,
+    COALESCE(parent.name, division.name),
+    country_code.alpha2
+FROM geoname
+LEFT JOIN admin_division AS division ON division.id = geoname.admin_division_id
+LEFT JOIN admin_division AS parent ON parent.id = division.parent_id
+LEFT JOIN country_code ON country_code.id = geoname.country_code_id
+WHERE geoname.id IN (SELECT value FROM json_each(:ids));
+"""
+
+
+POSTAL_CODE_CENTROIDS = """
+SELECT
+    keys.key,
+    min(postal_code_place.code),
+    country_code.alpha2,
+    avg(postal_code_place.latitude),
+    avg(postal_code_place.longitude),
+    count(*)
+FROM json_each(:keys) AS keys
+INNER JOIN postal_code_place ON postal_code_place.code_key = keys.value
+LEFT JOIN country_code ON country_code.id = postal_code_place.country_code_id
+{where}
+GROUP BY keys.key, postal_code_place.country_code_id
+ORDER BY keys.key, count(*) DESC, country_code.alpha2;
+"""
+
+
+# char(1114111) is the largest code point, so the range covers every key starting with the prefix.
+POSTAL_CODES_BY_PREFIX = """
+SELECT
+    postal_code_place.id,
+    postal_code_place.code,
+    country_code.alpha2,
+    postal_code_place.place_name,
+    postal_code_place.admin1_name,
+    postal_code_place.admin2_name,
+    postal_code_place.admin3_name,
+    postal_code_place.latitude,
+    postal_code_place.longitude,
+    postal_code_place.accuracy
+FROM postal_code_place
+LEFT JOIN country_code ON country_code.id = postal_code_place.country_code_id
+WHERE postal_code_place.code_key >= :key
+  AND postal_code_place.code_key < :key || char(1114111)
+  {country}
+ORDER BY postal_code_place.code_key, postal_code_place.id
+LIMIT :limit;
+"""
+
+
+POSTAL_CODES_WITHIN = """
+SELECT
+    postal_code_place.id,
+    postal_code_place.code,
+    country_code.alpha2,
+    postal_code_place.place_name,
+    postal_code_place.admin1_name,
+    postal_code_place.admin2_name,
+    postal_code_place.admin3_name,
+    postal_code_place.latitude,
+    postal_code_place.longitude,
+    postal_code_place.accuracy
+FROM postal_code_place_rtree
+INNER JOIN postal_code_place ON postal_code_place.id = postal_code_place_rtree.id
+LEFT JOIN country_code ON country_code.id = postal_code_place.country_code_id
+WHERE postal_code_place_rtree.min_longitude <= :max_longitude
+  AND postal_code_place_rtree.max_longitude >= :min_longitude
+  AND postal_code_place_rtree.min_latitude <= :max_latitude
+  AND postal_code_place_rtree.max_latitude >= :min_latitude;
+"""
+
+
+GEONAMES_WITHIN = """
+SELECT
+    geoname.id,
+    geoname.name,
+    country_code.alpha2,
+    {feature_class},
+    {feature_code},
+    geoname.population,
+    location.latitude,
+    location.longitude
+FROM {candidates}
+LEFT JOIN country_code ON country_code.id = geoname.country_code_id
+WHERE location.latitude BETWEEN :min_latitude AND :max_latitude
+  AND location.longitude BETWEEN :min_longitude AND :max_longitude
+ORDER BY geoname.population DESC, geoname.id
+LIMIT :limit;
+"""
+
+
+#: Joins of the candidate geonames of a bounding box, by the table with Hilbert keys (see :func:`geonames.hilbert.indexed_table`).
+WITHIN_CANDIDATES = {
+    'geoname': """json_each(:ranges) AS ranges
+CROSS JOIN geoname INDEXED BY geoname_hilbert_idx ON geoname.hilbert BETWEEN json_extract(ranges.value, '$[0]') AND json_extract(ranges.value, '$[1]')
+CROSS JOIN location ON location.id = geoname.location_id""",
+    'location': """json_each(:ranges) AS ranges
+CROSS JOIN location INDEXED BY location_hilbert_idx ON location.hilbert BETWEEN json_extract(ranges.value, '$[0]') AND json_extract(ranges.value, '$[1]')
+INNER JOIN geoname ON geoname.location_id = location.id""",
+    None: """location
+INNER JOIN geoname ON geoname.location_id = location.id"""
+}
+
+
+AUTOCOMPLETE = """
+SELECT
+    geoname.id,
+    geoname.name,
+    country_code.alpha2,
+    {feature_class},
+    {feature_code},
+    geoname.population
+FROM (
+    SELECT rowid, geoname_id
+    FROM name_search
+    WHERE name_search MATCH :expression
+    ORDER BY rowid
+    LIMIT :limit
+) AS matches
+INNER JOIN geoname ON geoname.id = matches.geoname_id
+LEFT JOIN country_code ON country_code.id = geoname.country_code_id
+ORDER BY matches.rowid;
+"""
+
+
+ANCESTORS = """
+SELECT
+    geoname.id,
+    geoname.name,
+    {feature_class},
+    {feature_code},
+    geoname.population,
+    hierarchy_closure.depth
+FROM hierarchy_closure
+INNER JOIN geoname ON geoname.id = hierarchy_closure.ancestor_id
+WHERE hierarchy_closure.descendant_id = :geoname_id
+ORDER BY hierarchy_closure.depth;
+"""
+
+
+DESCENDANTS = """
+SELECT
+    geoname.id,
+    geoname.name,
+    {feature_class},
+    {feature_code},
+    geoname.population,
+    hierarchy_closure.depth
+FROM hierarchy_closure
+INNER JOIN geoname ON geoname.id = hierarchy_closure.descendant_id
+WHERE hierarchy_closure.ancestor_id = :geoname_id
+  AND hierarchy_closure.depth <= :max_depth
+  AND (:feature_class IS NULL OR {feature_class} = :feature_class)
+ORDER BY hierarchy_closure.depth, geoname.id;
+"""
+
+
+IS_DESCENDANT = """
+SELECT 1
+FROM hierarchy_closure
+WHERE ancestor_id = :ancestor_id AND descendant_id = :geoname_id;
+"""
+
+
+BOUNDARY_CANDIDATES = """
+SELECT
+    points.key,
+    boundary_bbox.id,
+    boundary_bbox.boundary_id
+FROM json_each(:points) AS points
+INNER JOIN boundary_bbox
+    ON boundary_bbox.min_longitude <= json_extract(points.value, '$[1]')
+   AND boundary_bbox.max_longitude >= json_extract(points.value, '$[1]')
+   AND boundary_bbox.min_latitude <= json_extract(points.value, '$[0]')
+   AND boundary_bbox.max_latitude >= json_extract(points.value, '$[0]')
+ORDER BY points.key, boundary_bbox.id;
+"""
+
+
+BOUNDARY_POLYGONS = """
+SELECT boundary_polygon.id, boundary_polygon.rings
+FROM boundary_polygon
+WHERE boundary_polygon.id IN (SELECT value FROM json_each(:ids));
+"""
+
+
+def prefix_expression(text: str) -> Optional[str]:
+    """
+    Build an FTS5 match expression that requires every word of the given text,
+    treating the last word as a prefix unless the text ends with whitespace.
+    """
+    words = re.findall(r'\w+', text)
+    if not words:
+        return None
+
+    terms = [f'"{word}"' for word in words]
+    if not text[-1].isspace():
+        terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def geonames(db, geoname_ids: Iterable[int]) -> List[Optional[Geoname]]:
+    """
+    Return the geoname for each of the given ids in order, or None for unknown ids.
+    """
+    geoname_ids = [int(geoname_id) for geoname_id in geoname_ids]
+    cursor = db.execute(compact.render(db, GEONAMES), dict(ids=json.dumps(geoname_ids)))
+    found = {row[0]: Geoname(*row) for row in cursor}
+    return [found.get(geoname_id) for geoname_id in geoname_ids]
+
+
+def geoname(db, geoname_id: int) -> Optional[Geoname]:
+    """
+    Return the geoname with the given id, or None.
+    """
+    return geonames(db, [geoname_id])[0]
+
+
+def addresses(db, geoname_ids: Iterable[int]) -> List[Optional[Address]]:
+    """
+    Return the address of each of the given geoname ids in order, or None for unknown ids.
+
+    Requires the `admin_division` sink.
+    """
+    geoname_ids = [int(geoname_id) for geoname_id in geoname_ids]
+    cursor = db.execute(ADDRESSES, dict(ids=json.dumps(geoname_ids)))
+    found = {row[0]: Address(*row) for row in cursor}
+    return [found.get(geoname_id) for geoname_id in geoname_ids]
+
+
+def address(db, geoname_id: int) -> Optional[Address]:
+    """
+    Return the address of the geoname with the given id, or None.
+    """
+    return addresses(db, [geoname_id])[0]
+
+
+def geonames_by_country_code(db, codes: Iterable[str]) -> List[Optional[Geoname]]:
+    """
+    Return the country geoname for each of the given ISO alpha2/alpha3 country codes in order,
+    or None for unknown codes.
+    """
+    return [matches[0] if matches else None for matches in _geonames_by_key(db, GEONAMES_BY_COUNTRY_CODE, codes)]
+
+
+def geonames_by_airport_code(db, codes: Iterable[str]) -> List[List[Geoname]]:
+    """
+    Return the geonames (most populous first) for each of the given IATA/ICAO/FAA codes in order.
+    """
+    return _geonames_by_key(db, GEONAMES_BY_CODE, codes, table='airport_code', column='code')
+
+
+def geonames_by_wikidata_id(db, wikidata_ids: Iterable[str]) -> List[List[Geoname]]:
+    """
+    Return the geonames (most populous first) for each of the given Wikidata ids (e.g. `Q84`) in order.
+    """
+    return _geonames_by_key(db, GEONAMES_BY_CODE, wikidata_ids, table='wikidata', column='wikidata_id')
+
+
+def geonames_by_postal_code(db, codes: Iterable[str]) -> List[List[Geoname]]:
+    """
+    Return the geonames (most populous first) for each of the given postal codes in order.
+    """
+    return _geonames_by_key(db, GEONAMES_BY_CODE, codes, table='postal_code', column='code')
+
+
+def postal_code_key(code: str) -> str:
+    """
+    Normalize a postal code (or prefix) to the key it is indexed by, e.g. `sw1a-0aa` to `SW1A0AA`.
+    """
+    return code.replace(' ', '').replace('-', '').upper()
+
+
+def postal_code_centroids(db,
+                          codes: Iterable[str],
+                          country_code: Optional[str] = None) -> List[List[PostalCodeCentroid]]:
+    """
+    Return the centroid of each of the given postal codes in order, one per country using the code
+    (most places first), optionally limited to a single ISO alpha2 country code.
+
+    Requires the `postal_code_place` sink.
+    """
+    keys = [postal_code_key(str(code)) for code in codes]
+    result: List[List[PostalCodeCentroid]] = [[] for _ in keys]
+
+    where = 'WHERE country_code.alpha2 = :country_code' if country_code else ''
+    params = dict(keys=json.dumps(keys), country_code=country_code and country_code.upper())
+    for i, *row in db.execute(POSTAL_CODE_CENTROIDS.format(where=where), params):
+        result[i].append(PostalCodeCentroid(*row))
+    return result
+
+
+def postal_code_centroid(db, code: str, country_code: Optional[str] = None) -> Optional[PostalCodeCentroid]:
+    """
+    Return the centroid of the given postal code in the country with the most places using it, or None.
+
+    Requires the `postal_code_place` sink.
+    """
+    centroids = postal_code_centroids(db, [code], country_code)[0]
+    return centroids[0] if centroids else None
+
+
+def postal_codes_by_prefix(db,
+                           prefix: str,
+                           country_code: Optional[str] = None,
+                           limit: int = 10) -> List[PostalCodePlace]:
+    """
+    Return places whose postal code starts with the given prefix in code order, ignoring case, spaces
+    and dashes, optionally limited to a single ISO alpha2 country code.
+
+    Requires the `postal_code_place` sink.
+    """
+    key = postal_code_key(prefix)
+    if not key:
+        return []
+
+    # Filtering on the country in SQL (rather than binding NULL) lets sqlite range scan the country/code index.
+    country = ('AND postal_code_place.country_code_id = (SELECT id FROM country_code WHERE alpha2 = :country_code)'
+               if country_code else '')
+    params = dict(key=key, country_code=country_code and country_code.upper(), limit=limit)
+    cursor = db.execute(POSTAL_CODES_BY_PREFIX.format(country=country), params)
+    return [PostalCodePlace(*row) for _, *row in cursor]
+
+
+def nearest_postal_codes(db,
+                         latitude: float,
+                         longitude: float,
+                         k: int = 1,
+                         max_distance_km: Optional[float] = None) -> List[Tuple[float, PostalCodePlace]]:
+    """
+    Return (distance in km, place) of the `k` postal code places nearest the given point, nearest first,
+    optionally limited to places within the given distance.
+
+    The R*Tree is searched within a radius that doubles (starting from :data:`NEAREST_RADIUS`
+    degrees) until it contains `k` places no farther away than the radius itself.
+
+    Requires the `postal_code_index` stage.
+    """
+    if k < 1:
+        return []
+
+    radius = NEAREST_RADIUS
+    while True:
+        places: Dict[int, PostalCodePlace] = {}
+        for min_longitude, max_longitude, min_latitude, max_latitude in _bounding_boxes(latitude, longitude, radius):
+            params = dict(min_longitude=min_longitude, max_longitude=max_longitude,
+                          min_latitude=min_latitude, max_latitude=max_latitude)
+            for place_id, *row in db.execute(POSTAL_CODES_WITHIN, params):
+                places[place_id] = PostalCodePlace(*row)
+
+        nearest = sorted(((_distance_km(latitude, longitude, p.latitude, p.longitude), place_id)
+                          for place_id, p in places.items()))
+        radius_km = math.radians(radius) * geocoder.EARTH_RADIUS_KM
+        if max_distance_km is not None:
+            nearest = [(distance, place_id) for distance, place_id in nearest if distance <= max_distance_km]
+
+        exhausted = radius >= 180 or (max_distance_km is not None and radius_km >= max_distance_km)
+        if exhausted or (len(nearest) >= k and nearest[k - 1][0] <= radius_km):
+            return [(distance, places[place_id]) for distance, place_id in nearest[:k]]
+        radius *= 2
+
+
+def geonames_within(db,
+                    min_latitude: float,
+                    min_longitude: float,
+                    max_latitude: float,
+                    max_longitude: float,
+                    limit: Optional[int] = None) -> List[Geoname]:
+    """
+    Return the geonames within the given bounding box, most populous first.
+
+    Boxes with `min_longitude` greater than `max_longitude` cross the antimeridian. Databases
+    finalized with the `hilbert` option are searched by Hilbert key ranges.
+    """
+    if min_longitude <= max_longitude:
+        boxes = [(min_longitude, max_longitude, min_latitude, max_latitude)]
+    else:
+        boxes = [(min_longitude, 180, min_latitude, max_latitude), (-180, max_longitude, min_latitude, max_latitude)]
+
+    found = [geoname for box in boxes for geoname in _geonames_within(db, *box, limit=limit)]
+    found.sort(key=lambda g: (g.population is None, -(g.population or 0), g.geoname_id))
+    return found[:limit]
+
+
+def geonames_near(db,
+                  latitude: float,
+                  longitude: float,
+                  distance_km: float,
+                  limit: Optional[int] = None) -> List[Tuple[float, Geoname]]:
+    """
+    Return (distance in km, geoname) of the geonames within the given distance of the given point, nearest first.
+    """
+    radius = math.degrees(distance_km / geocoder.EARTH_RADIUS_KM)
+    found: Dict[int, Geoname] = {}
+    for box in _bounding_boxes(latitude, longitude, radius):
+        found.update((g.geoname_id, g) for g in _geonames_within(db, *box))
+
+    nearest = sorted((_distance_km(latitude, longitude, g.latitude, g.longitude), geoname_id)
+                     for geoname_id, g in found.items())
+    return [(distance, found[geoname_id]) for distance, geoname_id in nearest if distance <= distance_km][:limit]
+
+
+def autocomplete(db, text: str, limit: int = 10) -> List[NameMatch]:
+    """
+    Return geonames whose names start with the given text, ranked by population and feature class.
+
+    Requires the `name_search` stage.
+    """
+    expression = prefix_expression(text)
+    if not expression:
+        return []
+
+    cursor = db.execute(compact.render(db, AUTOCOMPLETE), dict(expression=expression, limit=limit))
+    return [NameMatch(*row) for row in cursor]
+
+
+def ancestors(db, geoname_id: int) -> List[HierarchyMember]:
+    """
+    Return the administrative chain of the given geoname, nearest parent first.
+
+    Requires the `hierarchy_closure` stage.
+    """
+    cursor = db.execute(compact.render(db, ANCESTORS), dict(geoname_id=geoname_id))
+    return [HierarchyMember(*row) for row in cursor]
+
+
+def descendants(db,
+                geoname_id: int,
+                max_depth: Optional[int] = None,
+                feature_class: Optional[str] = None) -> List[HierarchyMember]:
+    """
+    Return all geonames within the given geoname, optionally limited by depth and feature class.
+
+    Requires the `hierarchy_closure` stage.
+    """
+    params = dict(geoname_id=geoname_id, max_depth=sys.maxsize if max_depth is None else max_depth, feature_class=feature_class)
+    cursor = db.execute(compact.render(db, DESCENDANTS), params)
+    return [HierarchyMember(*row) for row in cursor]
+
+
+def is_descendant(db, geoname_id: int, ancestor_id: int) -> bool:
+    """
+    Return True if the given geoname lies within the given ancestor, False otherwise.
+
+    Requires the `hierarchy_closure` stage.
+    """
+    cursor = db.execute(IS_DESCENDANT, dict(geoname_id=geoname_id, ancestor_id=ancestor_id))
+    return cursor.fetchone() is not None
+
+
+def countries_at(db, points: Iterable[Tuple[float, float]]) -> List[Optional[int]]:
+    """
+    Return the geoname id of the country boundary containing each (latitude, longitude) point,
+    or None for points outside every boundary.
+
+    Requires the `boundary_index` stage.
+    """
+    points = [(float(lat), float(lon)) for lat, lon in points]
+    candidates = db.execute(BOUNDARY_CANDIDATES, dict(points=json.dumps(points))).fetchall()
+
+    polygon_ids = sorted({polygon_id for _, polygon_id, _ in candidates})
+    cursor = db.execute(BOUNDARY_POLYGONS, dict(ids=json.dumps(polygon_ids)))
+    polygons: Dict[int, geometry.Polygon] = {polygon_id: geometry.decode(rings)[0] for polygon_id, rings in cursor}
+
+    result: List[Optional[int]] = [None] * len(points)
+    for i, polygon_id, boundary_id in candidates:
+        if result[i] is not None:
+            continue
+        lat, lon = points[i]
+        if geometry.polygon_contains(polygons[polygon_id], lon, lat):
+            result[i] = boundary_id
+    return result
+
+
+def country_at(db, latitude: float, longitude: float) -> Optional[int]:
+    """
+    Return the geoname id of the country boundary containing the given point, or None.
+
+    Requires the `boundary_index` stage.
+    """
+    return countries_at(db, [(latitude, longitude)])[0]
+
+
+def _bounding_boxes(latitude: float, longitude: float, radius: float) -> List[geometry.BoundingBox]:
+    """
+    Return the bounding boxes covering all points within `radius` degrees (of arc) of the given point,
+    split in two where they cross the antimeridian.
+    """
+    min_latitude, max_latitude = latitude - radius, latitude + radius
+    if min_latitude <= -90 or max_latitude >= 90:
+        return [(-180, 180, max(min_latitude, -90), min(max_latitude, 90))]
+
+    ratio = math.sin(math.radians(radius)) / math.cos(math.radians(latitude))
+    if ratio >= 1:
+        return [(-180, 180, min_latitude, max_latitude)]
+
+    delta = math.degrees(math.asin(ratio))
+    min_longitude, max_longitude = longitude - delta, longitude + delta
+    if min_longitude < -180:
+        return [(min_longitude + 360, 180, min_latitude, max_latitude), (-180, max_longitude, min_latitude, max_latitude)]
+    if max_longitude > 180:
+        return [(min_longitude, 180, min_latitude, max_latitude), (-180, max_longitude - 360, min_latitude, max_latitude)]
+    return [(min_longitude, max_longitude, min_latitude, max_latitude)]
+
+
+def _geonames_within(db,
+                     min_longitude: float,
+                     max_longitude: float,
+                     min_latitude: float,
+                     max_latitude: float,
+                     limit: Optional[int] = None) -> List[Geoname]:
+    """
+    Return the geonames within a bounding box that doesn't cross the antimeridian, most populous first.
+    """
+    table = hilbert.indexed_table(db)
+    params = dict(min_longitude=min_longitude, max_longitude=max_longitude,
+                  min_latitude=min_latitude, max_latitude=max_latitude,
+                  limit=-1 if limit is None else limit)
+    if table:
+        params['ranges'] = json.dumps(hilbert.ranges(min_latitude, min_longitude, max_latitude, max_longitude))
+    cursor = db.execute(compact.render(db, GEONAMES_WITHIN, candidates=WITHIN_CANDIDATES[table]), params)
+    return [Geoname(*row) for row in cursor]
+
+
+def _distance_km(latitude1: float, longitude1: float, latitude2: float, longitude2: float) -> float:
+    """
+    Return the great-circle (haversine) distance between two points in kilometers.
+    """
+    lat1, lat2 = math.radians(latitude1), math.radians(latitude2)
+    dlat, dlon = lat2 - lat1, math.radians(longitude2 - longitude1)
+    h = math.sin(dlat / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2) ** 2
+    return 2 * math.asin(min(1.0, math.sqrt(h))) * geocoder.EARTH_RADIUS_KM
+
+
+def _geonames_by_key(db, sql: str, keys: Iterable[Any], **values: str) -> List[List[Geoname]]:
+    """
+    Resolve all keys with a single query that joins them (via `json_each`) against a code table,
+    returning the matching geonames of each key in input order.
+    """
+    keys = [str(key) for key in keys]
+    result: List[List[Geoname]] = [[] for _ in keys]
+    cursor = db.execute(compact.render(db, sql, **values), dict(keys=json.dumps(keys)))
+    for i, *row in cursor:
+        result[i].append(Geoname(*row))
+    return result
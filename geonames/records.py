@@ -14,6 +14,30 @@ from . import base, validators
 AIRPORT_CODES = ('iata', 'icao', 'faac', 'tcid', 'unlc')
 
 
+class AdminDivision(base.Record):
+    """
+    Represents a record from an individual line of an admin1/admin2 codes data source.
+    """
+    row_num: int
+    code: str
+    name: str
+    ascii_name: Optional[str]
+    geoname_id: int
+
+    @property
+    def country_code(self) -> str:
+        return self.code.split('.')[0]
+
+    @property
+    def admin1_code(self) -> str:
+        return self.code.split('.')[1]
+
+    @property
+    def admin2_code(self) -> str:
+        codes = self.code.split('.')
+        return codes[2] if len(codes) > 2 else ''
+
+
 class AlternateName(base.Record):
     """
     Represents a record from an individual line of an alternate names data source.
@@ -195,6 +219,25 @@ class ISOLanguage(base.Record):
         return value.split('/')[-1].strip(' *') if '/' in value else value
 
 
+class PostalCodePlace(base.Record):
+    """
+    Represents a record from an individual line of a postal codes data source.
+    """
+    row_num: int
+    country_code: str
+    code: str
+    place_name: Optional[str]
+    admin1_name: Optional[str]
+    admin1_code: Optional[str]
+    admin2_name: Optional[str]
+    admin2_code: Optional[str]
+    admin3_name: Optional[str]
+    admin3_code: Optional[str]
+    latitude: confloat(ge=-90, le=90)
+    longitude: confloat(ge=-180, le=180)
+    accuracy: Optional[int]
+
+
 class Shape(base.Record):
     row_num: int
     geoname_id: int
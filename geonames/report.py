@@ -0,0 +1,214 @@
+"""
+    geonames/report
+    ~~~~~~~~~~~~~~~
+
+    Contains a table/index size breakdown for a built database.
+
+    Usage::
+
+        $ python -m geonames.report geonames.sqlite
+"""
+import argparse
+import json
+import sqlite3
+
+from typing import Dict, List, NamedTuple, Optional
+
+from . import base, sinks
+
+
+class ObjectSize(NamedTuple):
+    """
+    Represents the storage used by a single sqlite b-tree (table or index).
+    """
+    name: str
+    table: str
+    type: str
+    pages: int
+    bytes: int
+    payload: int
+
+
+class TableSize(NamedTuple):
+    """
+    Represents the storage used by a table and all of its indices.
+    """
+    name: str
+    rows: Optional[int]
+    bytes: int
+    index_bytes: int
+
+    @property
+    def total_bytes(self) -> int:
+        return self.bytes + self.index_bytes
+
+    @property
+    def average_row_bytes(self) -> Optional[float]:
+        return self.bytes / self.rows if self.rows else None
+
+
+class SinkSavings(NamedTuple):
+    """
+    Represents the estimated savings from disabling a sink.
+    """
+    name: str
+    table: Optional[str]
+    bytes: int
+
+
+OBJECT_SIZES = """
+SELECT
+    dbstat.name,
+    COALESCE(sqlite_master.tbl_name, dbstat.name),
+    COALESCE(sqlite_master.type, 'table'),
+    dbstat.pageno,
+    dbstat.pgsize,
+    dbstat.payload
+FROM dbstat
+LEFT JOIN sqlite_master ON sqlite_master.name = dbstat.name
+WHERE dbstat.aggregate = TRUE
+ORDER BY dbstat.pgsize DESC;
+"""
+
+
+VIRTUAL_TABLES = """
+SELECT name
+FROM sqlite_master
+WHERE type = 'table' AND sql LIKE 'CREATE VIRTUAL TABLE%';
+"""
+
+
+def object_sizes(db) -> List[ObjectSize]:
+    """
+    Return the size of every table and index b-tree, largest first.
+
+    Shadow tables of virtual tables (FTS5, R*Tree) are attributed to their virtual table.
+    """
+    virtual_tables = [name for name, in db.execute(VIRTUAL_TABLES)]
+
+    result = []
+    for row in db.execute(OBJECT_SIZES):
+        size = ObjectSize(*row)
+        owner = next((v for v in virtual_tables if size.table.startswith(f'{v}_')), None)
+        if owner:
+            size = size._replace(table=owner)
+        result.append(size)
+    return result
+
+
+def table_sizes(db, objects: List[ObjectSize]) -> List[TableSize]:
+    """
+    Roll up object sizes into per-table totals with row counts, largest first.
+    """
+    totals: Dict[str, List[int]] = {}
+    for obj in objects:
+        sizes = totals.setdefault(obj.table, [0, 0])
+        sizes[obj.type == 'index'] += obj.bytes
+
+    result = []
+    for name, (table_bytes, index_bytes) in totals.items():
+        try:
+            rows, = db.execute(f'SELECT COUNT(*) FROM "{name}";').fetchone()
+        except sqlite3.DatabaseError:
+            rows = None
+        result.append(TableSize(name, rows, table_bytes, index_bytes))
+    return sorted(result, key=lambda t: t.total_bytes, reverse=True)
+
+
+def sink_savings(objects: List[ObjectSize]) -> List[SinkSavings]:
+    """
+    Estimate the bytes saved by disabling each sink defined in :mod:`geonames.sinks`, largest first.
+    """
+    by_name = {obj.name: obj.bytes for obj in objects}
+
+    result = []
+    for sink in vars(sinks).values():
+        if not isinstance(sink, base.Sink):
+            continue
+        table = sink.table
+        names = ([table.name] if table.table else []) + [name for t in sink.tables for name in t.index_names]
+        result.append(SinkSavings(sink.name, table.name if table.table else None,
+                                  sum(by_name.get(name, 0) for name in set(names))))
+    return sorted(result, key=lambda s: s.bytes, reverse=True)
+
+
+def index_sizes(objects: List[ObjectSize]) -> List[ObjectSize]:
+    """
+    Return the size of every index defined in :mod:`geonames.tables` or :mod:`geonames.compact`, largest first.
+
+    These are the savings from dropping that index alone.
+    """
+    defined = {name for sink in vars(sinks).values() if isinstance(sink, base.Sink)
+               for table in sink.tables for name in table.index_names}
+    return [obj for obj in objects if obj.type == 'index' and obj.name in defined]
+
+
+def report(db) -> dict:
+    """
+    Build a size report for the given database.
+    """
+    objects = object_sizes(db)
+    page_size, = db.execute('PRAGMA page_size;').fetchone()
+    page_count, = db.execute('PRAGMA page_count;').fetchone()
+    freelist_count, = db.execute('PRAGMA freelist_count;').fetchone()
+
+    return dict(
+        file_bytes=page_size * page_count,
+        free_bytes=page_size * freelist_count,
+        tables=[dict(t._asdict(), average_row_bytes=t.average_row_bytes) for t in table_sizes(db, objects)],
+        sinks=[s._asdict() for s in sink_savings(objects)],
+        indices=[dict(name=i.name, table=i.table, bytes=i.bytes) for i in index_sizes(objects)]
+    )
+
+
+def format_bytes(size: float) -> str:
+    """
+    Format a byte count for humans.
+    """
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if abs(size) < 1024 or unit == 'GiB':
+            return f'{size:.1f} {unit}' if unit != 'B' else f'{int(size)} B'
+        size /= 1024
+
+
+def format_report(data: dict) -> str:
+    """
+    Format a report from :func:`report` as plain text.
+    """
+    total = data['file_bytes'] or 1
+    lines = [
+        f'File size: {format_bytes(data["file_bytes"])} ({format_bytes(data["free_bytes"])} free)',
+        '',
+        f'{"Table":<32}{"Rows":>12}{"Data":>14}{"Indices":>14}{"Avg row":>10}{"Share":>8}'
+    ]
+    for t in data['tables']:
+        rows = '' if t['rows'] is None else f'{t["rows"]:,}'
+        average = '' if t['average_row_bytes'] is None else f'{t["average_row_bytes"]:.1f}'
+        share = (t['bytes'] + t['index_bytes']) / total
+        lines.append(f'{t["name"]:<32}{rows:>12}{format_bytes(t["bytes"]):>14}'
+                     f'{format_bytes(t["index_bytes"]):>14}{average:>10}{share:>8.1%}')
+
+    lines.extend(['', f'{"Sink (savings if disabled)":<32}{"Table":<28}{"Bytes":>14}{"Share":>8}'])
+    for s in data['sinks']:
+        lines.append(f'{s["name"]:<32}{s["table"] or "-":<28}{format_bytes(s["bytes"]):>14}{s["bytes"] / total:>8.1%}')
+
+    lines.extend(['', f'{"Index (savings if dropped)":<60}{"Bytes":>14}{"Share":>8}'])
+    for i in data['indices']:
+        lines.append(f'{i["name"]:<60}{format_bytes(i["bytes"]):>14}{i["bytes"] / total:>8.1%}')
+
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Report table/index sizes of a geonames sqlite database.')
+    parser.add_argument('path', help='Path to a built database')
+    parser.add_argument('--json', action='store_true', help='Output the report as JSON')
+    args = parser.parse_args()
+
+    db = sqlite3.connect(f'file:{args.path}?mode=ro', uri=True)
+    data = report(db)
+    print(json.dumps(data, indent=2) if args.json else format_report(data))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,294 @@
+"""
+    geonames/shards
+    ~~~~~~~~~~~~~~~
+
+    Contains per-country shard builds and the merge of shards into a single database.
+
+    Each shard is a regular build of :data:`geonames.pipelines.Graph` restricted to a
+    group of countries by the build filter (see :mod:`geonames.filters`). Single country
+    shards read the per-country dump file (e.g. `US.txt`) instead of `allCountries.txt`.
+    Geonames without a country are left out of every shard. Shards are built in
+    parallel worker processes.
+
+    Merging copies the first shard and appends the rows of the sharded tables (those
+    written by pipelines with filtered sources) of every other shard, offsetting
+    surrogate ids, and the foreign keys that reference them, past the ids already
+    merged. Tables of unfiltered sources are the same in every shard and are kept
+    from the first shard, except for those that reference sharded tables (e.g.
+    neighbors of countries in different shards), whose sinks are run again against
+    the merged database. The enabled stages then run against the merged database.
+
+    Usage::
+
+        $ python -m geonames.shards build full data/shards US DE FR,BE,LU --workers 4
+        $ python -m geonames.shards merge full geonames.sqlite data/shards/*.sqlite
+"""
+import argparse
+import concurrent.futures
+import copy
+import os
+import shutil
+
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from . import base, builder, fetch, options, pipelines
+
+
+#: Name of the source read from a per-country dump file by single country shards.
+COUNTRY_SOURCE = 'geoname_all_countries'
+
+#: Name of the source that is left out of every shard.
+NO_COUNTRY_SOURCE = 'geoname_no_country'
+
+#: Name of the stage whose Hilbert ordering is left to the merged database.
+FINALIZE = 'finalize'
+
+#: Name a shard is attached as while it is merged.
+SHARD = 'shard'
+
+
+DROP_BUILD_METADATA = """
+DROP TABLE IF EXISTS build_source;
+DROP TABLE IF EXISTS build_pipeline;
+"""
+
+
+def shard_name(countries: Iterable[str]) -> str:
+    """
+    Return the name of the shard of the given country codes, e.g. `BE-FR-LU`.
+    """
+    return '-'.join(sorted(c.upper() for c in countries))
+
+
+def shard_path(directory: str, name: str) -> str:
+    """
+    Return the path of the named shard in the given directory.
+    """
+    return os.path.join(directory, f'geonames-{name}.sqlite')
+
+
+def shard_options(opts: options.Pipeline, countries: List[str]) -> options.Pipeline:
+    """
+    Return a copy of the given options that builds the shard of the given country codes.
+
+    Files written by the build (staging database, prefix trie, vacuumed copy) are suffixed
+    with the shard name so parallel shard builds don't overwrite each other.
+    """
+    countries = sorted(c.upper() for c in countries)
+    name = shard_name(countries)
+
+    result = copy.deepcopy(opts)
+    result.filter.country_codes = countries
+    result.sources[NO_COUNTRY_SOURCE].enabled = False
+
+    if len(countries) == 1:
+        source = result.sources[COUNTRY_SOURCE]
+        source.path = os.path.join(os.path.dirname(source.path or ''), f'{countries[0]}.txt')
+        source.url = f'{countries[0]}.zip'
+        source.member = None
+        source.sha256 = None
+
+    if result.build.staging and result.build.staging != ':memory:':
+        result.build.staging = _suffixed(result.build.staging, name)
+    for stage in result.stages.values():
+        if getattr(stage, 'path', None):
+            stage.path = _suffixed(stage.path, name)
+
+    # Location ids are only renumbered in Hilbert order once shards are merged.
+    finalize = result.stages.get(FINALIZE)
+    if isinstance(finalize, options.Finalize):
+        finalize.hilbert = finalize.hilbert_geoname = False
+
+    return result
+
+
+def build(directory: str,
+          opts: options.Pipeline,
+          groups: Iterable[Iterable[str]],
+          workers: Optional[int] = None) -> Dict[str, str]:
+    """
+    Build a shard of each group of country codes in parallel worker processes and return their paths by name.
+
+    Sources are downloaded (when enabled) before the workers start, so they don't race on the shared cache.
+    """
+    os.makedirs(directory, exist_ok=True)
+
+    shards = {}
+    for countries in groups:
+        shard_opts = shard_options(opts, list(countries))
+        shards[shard_name(shard_opts.filter.country_codes)] = shard_opts
+
+    if opts.fetch.enabled:
+        for shard_opts in shards.values():
+            fetch.fetch(shard_opts, pipelines.Graph.sources(shard_opts))
+            shard_opts.fetch.enabled = False
+
+    paths = {name: shard_path(directory, name) for name in shards}
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(builder.build, paths[name], shard_opts): name for name, shard_opts in shards.items()}
+        for future in concurrent.futures.as_completed(futures):
+            future.result()
+            print(f'Finished shard {futures[future]}')
+    return paths
+
+
+def merge_tables(graph: base.PipelineGraph, opts: options.Pipeline) -> Tuple[List[base.Table], Set[str]]:
+    """
+    Return the tables of all enabled sinks in pipeline order and the names of those written by filtered sources.
+    """
+    tables: Dict[str, base.Table] = {}
+    sharded: Set[str] = set()
+    for pipeline in graph.pipelines:
+        if not pipeline.enabled(opts):
+            continue
+        for sink in pipeline.sinks:
+            sink_options = opts.sink(sink.name)
+            if not sink_options.enabled:
+                continue
+            table = sink.table_for(sink_options)
+            tables.setdefault(table.name, table)
+            if pipeline.source.filtered:
+                sharded.add(table.name)
+    return list(tables.values()), sharded
+
+
+def surrogate_tables(db, tables: Iterable[base.Table]) -> Set[str]:
+    """
+    Return the names of the tables whose integer `id` primary key is assigned by sqlite rather than a source.
+    """
+    result = set()
+    for table in tables:
+        if 'id' in table.parameters:
+            continue
+        columns = {row[1]: row for row in db.execute(f'PRAGMA main.table_info({table.name});')}
+        if 'id' in columns and columns['id'][2].upper() == 'INTEGER' and columns['id'][5]:
+            result.add(table.name)
+    return result
+
+
+def dependent_pipelines(db, graph: base.PipelineGraph, opts: options.Pipeline, sharded: Set[str]) -> List[base.Pipeline]:
+    """
+    Return pipelines of the enabled sinks of unfiltered sources whose tables reference sharded tables.
+    """
+    result = []
+    for pipeline in graph.pipelines:
+        if not pipeline.enabled(opts) or pipeline.source.filtered:
+            continue
+        sinks = [sink for sink in pipeline.sinks
+                 if opts.sink(sink.name).enabled and sharded.intersection(
+                     _references(db, sink.table_for(opts.sink(sink.name)).name).values())]
+        if sinks:
+            result.append(base.Pipeline(pipeline.source, sinks, pipeline.checkpoint_threshold))
+    return result
+
+
+def merge_shard(db, tables: List[base.Table], sharded: Set[str], surrogates: Set[str], database: str = SHARD) -> None:
+    """
+    Append the rows of the sharded tables of an attached shard to the main database.
+    """
+    # Shared tables are kept from the first shard, so only ids of sharded tables move.
+    offsets = {name: db.execute(f'SELECT COALESCE(MAX(id), 0) FROM main.{name};').fetchone()[0]
+               for name in surrogates & sharded}
+
+    for table in tables:
+        if table.name not in sharded:
+            continue
+        columns = [row[1] for row in db.execute(f'PRAGMA main.table_info({table.name});')]
+        if not columns:
+            # Sinks that only update other tables (e.g. hierarchy) have no table of their own.
+            continue
+        references = _references(db, table.name)
+        values = [_offset(column, table.name if column == 'id' else references.get(column), offsets)
+                  for column in columns]
+        db.execute(f'INSERT INTO main.{table.name} ({", ".join(columns)}) '
+                   f'SELECT {", ".join(values)} FROM {database}.{table.name};')
+
+
+def merge(paths: List[str], path: str, opts: options.Pipeline) -> None:
+    """
+    Merge the shards at the given paths (built with the given options) into a database at the given path
+    and run the enabled stages against it.
+    """
+    tmp_path = f'{path}.tmp'
+    shutil.copyfile(paths[0], tmp_path)
+
+    db = builder.connect(tmp_path)
+    try:
+        # Tables are appended in pipeline order rather than dependency order; the finalize stage checks references.
+        db.execute('PRAGMA foreign_keys = OFF;')
+        tables, sharded = merge_tables(pipelines.Graph, opts)
+        surrogates = surrogate_tables(db, tables)
+
+        for shard in paths[1:]:
+            print(f'Merging shard {shard}')
+            db.execute(f'ATTACH DATABASE ? AS {SHARD};', (shard,))
+            merge_shard(db, tables, sharded, surrogates)
+            db.commit()
+            db.execute(f'DETACH DATABASE {SHARD};')
+
+        db.execute('PRAGMA foreign_keys = ON;')
+        for pipeline in dependent_pipelines(db, pipelines.Graph, opts, sharded):
+            print(f'Rebuilding pipeline {pipeline}')
+            for sink in pipeline.sinks:
+                db.execute(f'DELETE FROM {sink.table_for(opts.sink(sink.name)).name};')
+            pipeline.run(db, opts)
+
+        # Source fingerprints of a shard don't describe the merged database.
+        db.executescript(DROP_BUILD_METADATA)
+        pipelines.Graph.run_stages(db, opts)
+    finally:
+        db.close()
+
+    os.replace(tmp_path, path)
+
+
+def _offset(column: str, target: Optional[str], offsets: Dict[str, int]) -> str:
+    """
+    Return a select expression for a column, offset when it holds (or references) a surrogate id.
+    """
+    return f'{column} + {offsets[target]}' if offsets.get(target) else column
+
+
+def _references(db, name: str) -> Dict[str, str]:
+    """
+    Return the tables referenced by the id foreign keys of a table of the main database, by column.
+    """
+    return {row[3]: row[2] for row in db.execute(f'PRAGMA main.foreign_key_list({name});') if row[4] in (None, 'id')}
+
+
+def _suffixed(path: str, name: str) -> str:
+    """
+    Insert a shard name before the extension of a path, e.g. `geonames-trie.US.bin`.
+    """
+    root, ext = os.path.splitext(path)
+    return f'{root}.{name}{ext}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build and merge per-country geonames shards.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = commands.add_parser('build', help='Build a shard per group of countries in parallel')
+    build_parser.add_argument('profile', help='Build profile name or path')
+    build_parser.add_argument('directory', help='Output directory')
+    build_parser.add_argument('groups', nargs='+', help='Country code groups, e.g. US or FR,BE,LU')
+    build_parser.add_argument('--workers', type=int, default=None, help='Number of worker processes')
+
+    merge_parser = commands.add_parser('merge', help='Merge shards into a single database')
+    merge_parser.add_argument('profile', help='Build profile name or path the shards were built with')
+    merge_parser.add_argument('path', help='Output database')
+    merge_parser.add_argument('shards', nargs='+', help='Paths of the shards to merge')
+
+    args = parser.parse_args()
+    opts = options.load_profile(args.profile)
+
+    if args.command == 'build':
+        paths = build(args.directory, opts, [group.split(',') for group in args.groups], args.workers)
+        print(f'Built {len(paths)} shards in {args.directory}')
+    else:
+        merge(args.shards, args.path, opts)
+        print(f'Merged {len(args.shards)} shards into {args.path}')
+
+
+if __name__ == '__main__':
+    main()
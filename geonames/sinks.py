@@ -4,86 +4,252 @@
 
     Contains sinks for all sqlite tables.
 """
-from . import base, exceptions, records, tables
+import functools
+
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from . import base, columns, compact, exceptions, geometry, options, records, tables
+
+
+class GeometrySink(base.RecordSink[records.Shape]):
+    """
+    Data sink for shapes that can store geometry in compact binary form instead of GeoJSON.
+    """
+    def consume_record(self, db, opts: options.Boundary, record: records.Shape) -> None:
+        """
+        Consume a record generated by a source, encoding its geometry when configured to.
+        """
+        params = self.transform(record)
+        if getattr(opts, 'binary', False):
+            polygons = geometry.parse_geojson(params['geojson'])
+            params.update(geojson=None, geometry=geometry.encode(polygons, delta=True, compress=opts.compress))
+        return self.apply(db, opts, params)
+
+
+class GeonameSink(base.BatchSink[records.Geoname]):
+    """
+    Data sink for geonames that only links them to admin divisions when the admin_division sink is enabled.
+    """
+    def __init__(self,
+                 name: str,
+                 table: base.Table,
+                 unlinked_variants: Dict[str, base.Table],
+                 exception_handler: Optional[Callable[[Any, Any, records.Geoname, Exception], bool]] = None,
+                 transform: Optional[base.Fields] = None,
+                 batch_transform: Optional[Callable[[base.Batch], Dict[str, Sequence[Any]]]] = None,
+                 variants: Optional[Dict[str, base.Table]] = None) -> None:
+        super().__init__(name, table, exception_handler=exception_handler, transform=transform,
+                         batch_transform=batch_transform, variants=variants)
+        self.unlinked_variants = unlinked_variants
+
+    @property
+    def tables(self) -> List[base.Table]:
+        """
+        Tables of every schema, with and without admin division links.
+        """
+        return [*super().tables, *self.unlinked_variants.values()]
+
+    def table_for(self, opts: options.Geoname) -> base.Table:
+        """
+        Return the table for the configured schema, without admin division links unless configured to.
+        """
+        if getattr(opts, 'admin_division', True):
+            return super().table_for(opts)
+        return self.unlinked_variants[opts.schema]
+
+
+elevation_sentinel_to_none = functools.partial(columns.sentinel_to_none, sentinel='-9999')
+
+
+def iso_language_in(*codes: str) -> Callable[[base.Batch], np.ndarray]:
+    """
+    Return a batch predicate for alternate names with one of the given `iso_language` codes.
+    """
+    return lambda b: np.isin(b.column('iso_language', columns.to_str), codes)
+
+
+def alternate_name_columns(field: str) -> Callable[[base.Batch], Dict[str, Sequence[Any]]]:
+    """
+    Return a batch transform of alternate names to their id, geoname id and the name as the given field.
+    """
+    return lambda b: {
+        'id': b.column('alternate_name_id', columns.to_int),
+        'geoname_id': b.column('geoname_id', columns.to_int),
+        field: b.column('alternate_name', columns.empty_str_to_none)
+    }
+
+
+def alternate_country_codes(batch: base.Batch) -> List[List[str]]:
+    """
+    Batch field of the alternate country codes of each geoname, excluding its own country code.
+    """
+    country_code2 = batch.column('country_code2', columns.empty_str_to_none)
+    country_code = batch.column('country_code', columns.empty_str_to_none)
+    return [[c for c in dict.fromkeys(codes.split(',')) if c and c != cc] if codes else []
+            for codes, cc in zip(country_code2, country_code)]
+
+
+def coordinate_columns(batch: base.Batch) -> Dict[str, Sequence[Any]]:
+    """
+    Batch transform of geoname coordinates, checking they are in range.
+    """
+    latitude = batch.column('latitude', columns.to_float)
+    longitude = batch.column('longitude', columns.to_float)
+    columns.check(columns.valid_coordinates(latitude, longitude), batch.row_nums, 'coordinates out of range')
+    return {
+        'latitude': latitude,
+        'longitude': longitude
+    }
+
+
+def geoname_columns(batch: base.Batch) -> Dict[str, Sequence[Any]]:
+    """
+    Batch transform of geonames.
+    """
+    name = batch.column('name', columns.empty_str_to_none)
+    ascii_name = batch.column('ascii_name', columns.empty_str_to_none)
+    return {
+        'id': batch.column('geoname_id', columns.to_int),
+        'name': name,
+        'ascii_name': [a if a != n else None for a, n in zip(ascii_name, name)],
+        **coordinate_columns(batch),
+        'feature_class': batch.column('feature_class', columns.empty_str_to_none),
+        'feature_code': batch.column('feature_code', columns.empty_str_to_none),
+        'country_code': batch.column('country_code', columns.empty_str_to_none),
+        'admin1_code': batch.column('admin1_code', columns.empty_str_to_none),
+        'admin2_code': batch.column('admin2_code', columns.empty_str_to_none),
+        'population': batch.column('population', columns.to_int),
+        'elevation': batch.column('elevation', elevation_sentinel_to_none),
+        'last_modified': batch.column('last_modified', columns.empty_str_to_none)
+    }
 
 
-Abbreviation = base.RecordSink[records.AlternateName](
+Abbreviation = base.BatchSink[records.AlternateName](
     name='abbreviation',
     table=tables.Abbreviation,
     predicate=lambda r: r.is_abbreviation,
-    transform=lambda r: {
-        'id': r.alternate_name_id,
-        'geoname_id': r.geoname_id,
-        'name': r.alternate_name
+    transform={
+        'id': 'alternate_name_id',
+        'geoname_id': 'geoname_id',
+        'name': 'alternate_name'
     },
+    batch_predicate=iso_language_in('abbr'),
+    batch_transform=alternate_name_columns('name'),
     exception_handler=exceptions.ignore_foreign_key_constraint
 )
 
 
-AdminCode = base.FlattenRecordFieldSink[records.Geoname](
+AdminCode = base.FlattenBatchSink[records.Geoname](
     name='admin_code',
     table=tables.AdminCode,
+    variants={compact.COMPACT: compact.AdminCode},
     field_name='admin_codes',
     field_predicate=lambda r, f: bool(f),
     transform=lambda r, f, i: {
         'geoname_id': r.geoname_id,
         'code': f,
         'level': i + 1
+    },
+    batch_field=lambda b: zip(*(b.column(f'admin{level}_code', columns.empty_str_to_none) for level in range(1, 5))),
+    batch_transform=lambda b, values, positions: {
+        'geoname_id': b.column('geoname_id', columns.to_int),
+        'code': values,
+        'level': [i + 1 for i in positions]
     }
 )
 
 
-AirportCode = base.RecordSink[records.AlternateName](
+AdminDivision = base.RecordSink[records.AdminDivision](
+    name='admin_division',
+    table=tables.AdminDivision,
+    transform={
+        'country_code': 'country_code',
+        'admin1_code': 'admin1_code',
+        'admin2_code': 'admin2_code',
+        'geoname_id': 'geoname_id',
+        'name': 'name',
+        'ascii_name': 'ascii_name'
+    },
+    exception_handler=exceptions.ignore_unique_key_constraint
+)
+
+
+AirportCode = base.BatchSink[records.AlternateName](
     name='airport_code',
     table=tables.AirportCode,
     predicate=lambda r: r.is_airport_code,
-    transform=lambda r: {
-        'id': r.alternate_name_id,
-        'geoname_id': r.geoname_id,
-        'type': r.iso_language,
-        'code': r.alternate_name
+    transform={
+        'id': 'alternate_name_id',
+        'geoname_id': 'geoname_id',
+        'type': 'iso_language',
+        'code': 'alternate_name'
+    },
+    batch_predicate=iso_language_in(*records.AIRPORT_CODES),
+    batch_transform=lambda b: {
+        **alternate_name_columns('code')(b),
+        'type': b.column('iso_language', columns.empty_str_to_none)
     },
     exception_handler=exceptions.ignore_foreign_key_constraint
 )
 
 
-AlternateCountryCode = base.FlattenRecordFieldSink[records.Geoname](
+AlternateCountryCode = base.FlattenBatchSink[records.Geoname](
     name='alternate_country_code',
     table=tables.AlternateCountryCode,
+    variants={compact.COMPACT: compact.AlternateCountryCode},
     field_name='alternate_country_codes_set',
     transform=lambda r, f, _i: {
         'geoname_id': r.geoname_id,
         'country_code_alpha2': f if f != 'UK' else 'GB'
+    },
+    batch_field=alternate_country_codes,
+    batch_transform=lambda b, values, _positions: {
+        'geoname_id': b.column('geoname_id', columns.to_int),
+        'country_code_alpha2': [f if f != 'UK' else 'GB' for f in values]
     }
 )
 
 
-AlternateName = base.RecordSink[records.AlternateName](
+AlternateName = base.BatchSink[records.AlternateName](
     name='alternate_name',
     table=tables.AlternateName,
     predicate=lambda r: not r.iso_language or r.iso_language.lower() == 'en',
-    transform=lambda r: {
-        'id': r.alternate_name_id,
-        'geoname_id': r.geoname_id,
-        'language_code': r.iso_language,
-        'name': r.alternate_name,
-        'preferred': r.preferred,
-        'short': r.short,
-        'colloquial': r.colloquial,
-        'historic': r.historic,
-        'from_period': r.from_period,
-        'to_period': r.to_period
+    transform={
+        'id': 'alternate_name_id',
+        'geoname_id': 'geoname_id',
+        'language_code': 'iso_language',
+        'name': 'alternate_name',
+        'preferred': 'preferred',
+        'short': 'short',
+        'colloquial': 'colloquial',
+        'historic': 'historic',
+        'from_period': 'from_period',
+        'to_period': 'to_period'
+    },
+    batch_predicate=lambda b: np.isin(np.char.lower(b.column('iso_language', columns.to_str)), ('', 'en')),
+    batch_transform=lambda b: {
+        **alternate_name_columns('name')(b),
+        'language_code': b.column('iso_language', columns.empty_str_to_none),
+        'preferred': b.column('preferred', columns.optional_int_to_bool),
+        'short': b.column('short', columns.optional_int_to_bool),
+        'colloquial': b.column('colloquial', columns.optional_int_to_bool),
+        'historic': b.column('historic', columns.optional_int_to_bool),
+        'from_period': b.column('from_period', columns.empty_str_to_none),
+        'to_period': b.column('to_period', columns.empty_str_to_none)
     },
     exception_handler=exceptions.ignore_foreign_key_constraint
 )
 
 
-Boundary = base.RecordSink[records.Shape](
+Boundary = GeometrySink(
     name='boundary',
     table=tables.Boundary,
     transform=lambda r: {
         'id': r.geoname_id,
-        'geojson': r.geojson
+        'geojson': r.geojson,
+        'geometry': None
     }
 )
 
@@ -91,9 +257,10 @@ Boundary = base.RecordSink[records.Shape](
 Continent = base.RecordSink[records.Continent](
     name='continent',
     table=tables.Continent,
-    transform=lambda r: {
-        'id': r.geoname_id,
-        'code': r.code
+    variants={compact.COMPACT: compact.Continent},
+    transform={
+        'id': 'geoname_id',
+        'code': 'code'
     }
 )
 
@@ -101,19 +268,19 @@ Continent = base.RecordSink[records.Continent](
 Country = base.RecordSink[records.CountryInfo](
     name='country',
     table=tables.Country,
-    transform=lambda r: {
-        'id': r.geoname_id,
-        'country_code_alpha2': r.alpha2,
-        'name': r.name,
-        'capital': r.capital,
-        'area': r.area,
-        'population': r.population,
-        'continent_code': r.continent_code,
-        'currency_code': r.currency_code,
-        'tld': r.tld,
-        'phone': r.phone,
-        'postal_code_format': r.postal_code_format,
-        'postal_code_regex': r.postal_code_regex
+    transform={
+        'id': 'geoname_id',
+        'country_code_alpha2': 'alpha2',
+        'name': 'name',
+        'capital': 'capital',
+        'area': 'area',
+        'population': 'population',
+        'continent_code': 'continent_code',
+        'currency_code': 'currency_code',
+        'tld': 'tld',
+        'phone': 'phone',
+        'postal_code_format': 'postal_code_format',
+        'postal_code_regex': 'postal_code_regex'
     }
 )
 
@@ -121,10 +288,10 @@ Country = base.RecordSink[records.CountryInfo](
 CountryCode = base.RecordSink[records.CountryInfo](
     name='country_code',
     table=tables.CountryCode,
-    transform=lambda r: {
-        'alpha2': r.alpha2,
-        'alpha3': r.alpha3,
-        'numeric': r.numeric
+    transform={
+        'alpha2': 'alpha2',
+        'alpha3': 'alpha3',
+        'numeric': 'numeric'
     }
 )
 
@@ -132,6 +299,7 @@ CountryCode = base.RecordSink[records.CountryInfo](
 CountryLanguage = base.FlattenRecordFieldSink[records.CountryInfo](
     name='country_language',
     table=tables.CountryLanguage,
+    variants={compact.COMPACT: compact.CountryLanguage},
     field_name='languages_with_country_code',
     predicate=lambda r: bool(r.languages),
     transform=lambda r, f, _i: {
@@ -145,21 +313,23 @@ CountryLanguage = base.FlattenRecordFieldSink[records.CountryInfo](
 CountryNeighbor = base.FlattenRecordFieldSink[records.CountryInfo](
     name='country_neighbor',
     table=tables.CountryNeighbor,
+    variants={compact.COMPACT: compact.CountryNeighbor},
     field_name='neighbors',
     predicate=lambda r: bool(r.neighbors),
     transform=lambda r, f, _i: {
         'country_id': r.geoname_id,
         'neighbor_country_code_alpha2': f
-    }
+    },
+    exception_handler=exceptions.ignore_foreign_key_constraint
 )
 
 
 Currency = base.RecordSink[records.CountryInfo](
     name='currency',
     table=tables.Currency,
-    transform=lambda r: {
-        'code': r.currency_code,
-        'name': r.currency_name
+    transform={
+        'code': 'currency_code',
+        'name': 'currency_name'
     }
 )
 
@@ -167,10 +337,11 @@ Currency = base.RecordSink[records.CountryInfo](
 FeatureClass = base.RecordSink[records.FeatureClass](
     name='feature_class',
     table=tables.FeatureClass,
-    transform=lambda r: {
-        'id': r.id,
-        'name': r.name,
-        'description': r.description
+    variants={compact.COMPACT: compact.FeatureClass},
+    transform={
+        'id': 'id',
+        'name': 'name',
+        'description': 'description'
     }
 )
 
@@ -178,31 +349,41 @@ FeatureClass = base.RecordSink[records.FeatureClass](
 FeatureCode = base.RecordSink[records.FeatureCode](
     name='feature_code',
     table=tables.FeatureCode,
+    variants={compact.COMPACT: compact.FeatureCode},
     predicate=lambda r: r.class_and_code != 'null',
-    transform=lambda r: {
-        'id': r.class_and_code.split('.')[1],
-        'class': r.class_and_code.split('.')[0],
-        'name': r.name,
-        'description': r.description
+    transform={
+        'id': lambda r: r.class_and_code.split('.')[1],
+        'class': lambda r: r.class_and_code.split('.')[0],
+        'name': 'name',
+        'description': 'description'
     }
 )
 
 
-Geoname = base.RecordSink[records.Geoname](
+Geoname = GeonameSink(
     name='geoname',
     table=tables.Geoname,
-    transform=lambda r: {
-        'id': r.geoname_id,
-        'name': r.name,
-        'latitude': r.latitude,
-        'longitude': r.longitude,
-        'feature_class': r.feature_class,
-        'feature_code': r.feature_code,
-        'country_code': r.country_code,
-        'population': r.population,
-        'elevation': r.elevation,
-        'last_modified': r.last_modified
+    variants={compact.COMPACT: compact.Geoname},
+    unlinked_variants={
+        compact.DEFAULT: tables.GeonameWithoutAdminDivision,
+        compact.COMPACT: compact.GeonameWithoutAdminDivision
     },
+    transform={
+        'id': 'geoname_id',
+        'name': 'name',
+        'ascii_name': lambda r: r.ascii_name if r.ascii_name != r.name else None,
+        'latitude': 'latitude',
+        'longitude': 'longitude',
+        'feature_class': 'feature_class',
+        'feature_code': 'feature_code',
+        'country_code': 'country_code',
+        'admin1_code': 'admin1_code',
+        'admin2_code': 'admin2_code',
+        'population': 'population',
+        'elevation': 'elevation',
+        'last_modified': 'last_modified'
+    },
+    batch_transform=geoname_columns,
     exception_handler=exceptions.ignore_unique_key_constraint
 )
 
@@ -211,9 +392,9 @@ Hierarchy = base.RecordSink[records.Hierarchy](
     name='hierarchy',
     table=tables.Hierarchy,
     predicate=lambda r: r.type and r.type == 'ADM',
-    transform=lambda r: {
-        'id': r.child_id,
-        'parent_id': r.parent_id
+    transform={
+        'id': 'child_id',
+        'parent_id': 'parent_id'
     }
 )
 
@@ -221,47 +402,81 @@ Hierarchy = base.RecordSink[records.Hierarchy](
 LanguageCode = base.RecordSink[records.ISOLanguage](
     name='language_code',
     table=tables.LanguageCode,
-    transform=lambda r: {
-        'code3': r.code3 or r.code2,
-        'code2': r.code2 or r.code3,
-        'code1': r.code1,
-        'name': r.name
+    transform={
+        'code3': lambda r: r.code3 or r.code2,
+        'code2': lambda r: r.code2 or r.code3,
+        'code1': 'code1',
+        'name': 'name'
     },
     exception_handler=exceptions.ignore_unique_key_constraint
 )
 
 
-Location = base.RecordSink[records.Geoname](
+Location = base.BatchSink[records.Geoname](
     name='location',
     table=tables.Location,
-    transform=lambda r: {
-        'id': r.geoname_id,
-        'latitude': r.latitude,
-        'longitude': r.longitude,
+    transform={
+        'id': 'geoname_id',
+        'latitude': 'latitude',
+        'longitude': 'longitude'
+    },
+    batch_transform=lambda b: {
+        'id': b.column('geoname_id', columns.to_int),
+        **coordinate_columns(b)
     },
     exception_handler=exceptions.ignore_unique_key_constraint
 )
 
 
-PostalCode = base.RecordSink[records.AlternateName](
+PostalCode = base.BatchSink[records.AlternateName](
     name='postal_code',
     table=tables.PostalCode,
     predicate=lambda r: r.is_postal_code,
-    transform=lambda r: {
-        'id': r.alternate_name_id,
-        'geoname_id': r.geoname_id,
-        'code': r.alternate_name
+    transform={
+        'id': 'alternate_name_id',
+        'geoname_id': 'geoname_id',
+        'code': 'alternate_name'
     },
+    batch_predicate=iso_language_in('post'),
+    batch_transform=alternate_name_columns('code'),
     exception_handler=exceptions.ignore_foreign_key_constraint
 )
 
 
+PostalCodePlace = base.BatchSink[records.PostalCodePlace](
+    name='postal_code_place',
+    table=tables.PostalCodePlace,
+    transform={
+        'country_code': 'country_code',
+        'code': 'code',
+        'place_name': 'place_name',
+        'admin1_name': 'admin1_name',
+        'admin1_code': 'admin1_code',
+        'admin2_name': 'admin2_name',
+        'admin2_code': 'admin2_code',
+        'admin3_name': 'admin3_name',
+        'admin3_code': 'admin3_code',
+        'latitude': 'latitude',
+        'longitude': 'longitude',
+        'accuracy': 'accuracy'
+    },
+    batch_transform=lambda b: {
+        **{name: b.column(name, columns.empty_str_to_none) for name in (
+            'country_code', 'code', 'place_name',
+            'admin1_name', 'admin1_code', 'admin2_name', 'admin2_code', 'admin3_name', 'admin3_code'
+        )},
+        **coordinate_columns(b),
+        'accuracy': b.column('accuracy', columns.to_optional_int)
+    }
+)
+
+
 PostalCodeSpec = base.RecordSink[records.CountryInfo](
     name='postal_code_spec',
     table=tables.PostalCodeSpec,
-    transform=lambda r: {
-        'format': r.postal_code_format,
-        'regex': r.postal_code_regex
+    transform={
+        'format': 'postal_code_format',
+        'regex': 'postal_code_regex'
     }
 )
 
@@ -269,25 +484,27 @@ PostalCodeSpec = base.RecordSink[records.CountryInfo](
 TimeZone = base.RecordSink[records.TimeZone](
     name='time_zone',
     table=tables.TimeZone,
-    transform=lambda r: {
-        'name': r.name,
-        'country_code_alpha2': r.country_code_alpha2,
-        'gmt_offset': r.gmt_offset,
-        'dst_offset': r.dst_offset,
-        'raw_offset': r.raw_offset
+    transform={
+        'name': 'name',
+        'country_code_alpha2': 'country_code_alpha2',
+        'gmt_offset': 'gmt_offset',
+        'dst_offset': 'dst_offset',
+        'raw_offset': 'raw_offset'
     }
 )
 
 
-UserLink = base.RecordSink[records.AlternateName](
+UserLink = base.BatchSink[records.AlternateName](
     name='user_link',
     table=tables.UserLink,
     predicate=lambda r: r.is_link,
-    transform=lambda r: {
-        'id': r.alternate_name_id,
-        'geoname_id': r.geoname_id,
-        'link': r.alternate_name
+    transform={
+        'id': 'alternate_name_id',
+        'geoname_id': 'geoname_id',
+        'link': 'alternate_name'
     },
+    batch_predicate=iso_language_in('link'),
+    batch_transform=alternate_name_columns('link'),
     exception_handler=exceptions.ignore_foreign_key_constraint
 )
 
@@ -295,22 +512,24 @@ UserLink = base.RecordSink[records.AlternateName](
 UserTag = base.RecordSink[records.UserTag](
     name='user_tag',
     table=tables.UserTag,
-    transform=lambda r: {
-        'geoname_id': r.geoname_id,
-        'tag': r.tag
+    transform={
+        'geoname_id': 'geoname_id',
+        'tag': 'tag'
     },
     exception_handler=exceptions.ignore_foreign_key_constraint
 )
 
 
-Wikidata = base.RecordSink[records.AlternateName](
+Wikidata = base.BatchSink[records.AlternateName](
     name='wikidata',
     table=tables.Wikidata,
     predicate=lambda r: r.is_wikidata_id,
-    transform=lambda r: {
-        'id': r.alternate_name_id,
-        'geoname_id': r.geoname_id,
-        'wikidata_id': r.alternate_name
+    transform={
+        'id': 'alternate_name_id',
+        'geoname_id': 'geoname_id',
+        'wikidata_id': 'alternate_name'
     },
+    batch_predicate=iso_language_in('wkdt'),
+    batch_transform=alternate_name_columns('wikidata_id'),
     exception_handler=exceptions.ignore_foreign_key_constraint
 )
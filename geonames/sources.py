@@ -4,7 +4,33 @@
 
     Contains all sources for geoname gazetteer dump files.
 """
-from . import base, records
+from . import base, filters, records
+
+
+Admin1Code = base.FileSource(
+    name='admin1_code',
+    record_cls=records.AdminDivision,
+    fields=[
+        'code',
+        'name',
+        'ascii_name',
+        'geoname_id'
+    ],
+    row_filter=filters.countries('code')
+)
+
+
+Admin2Code = base.FileSource(
+    name='admin2_code',
+    record_cls=records.AdminDivision,
+    fields=[
+        'code',
+        'name',
+        'ascii_name',
+        'geoname_id'
+    ],
+    row_filter=filters.countries('code')
+)
 
 
 AlternateName = base.FileSource(
@@ -21,7 +47,8 @@ AlternateName = base.FileSource(
         'historic',
         'from_period',
         'to_period'
-    ]
+    ],
+    row_filter=filters.geoname_references('geoname_id')
 )
 
 
@@ -118,7 +145,8 @@ GeonameAllCountries = base.FileSource(
         'elevation',
         'timezone',
         'last_modified'
-    ]
+    ],
+    row_filter=filters.geonames
 )
 
 GeonameNoCountry = base.FileSource(
@@ -144,7 +172,8 @@ GeonameNoCountry = base.FileSource(
         'elevation',
         'timezone',
         'last_modified'
-    ]
+    ],
+    row_filter=filters.geonames
 )
 
 Hierarchy = base.FileSource(
@@ -154,7 +183,8 @@ Hierarchy = base.FileSource(
         'parent_id',
         'child_id',
         'type'
-    ]
+    ],
+    row_filter=filters.geoname_references('parent_id', 'child_id')
 )
 
 
@@ -171,6 +201,27 @@ ISOLanguage = base.FileSource(
 )
 
 
+PostalCodePlace = base.FileSource(
+    name='postal_code_place',
+    record_cls=records.PostalCodePlace,
+    fields=[
+        'country_code',
+        'code',
+        'place_name',
+        'admin1_name',
+        'admin1_code',
+        'admin2_name',
+        'admin2_code',
+        'admin3_name',
+        'admin3_code',
+        'latitude',
+        'longitude',
+        'accuracy'
+    ],
+    row_filter=filters.countries('country_code')
+)
+
+
 Shape = base.FileSource(
     name='shape',
     record_cls=records.Shape,
@@ -179,7 +230,8 @@ Shape = base.FileSource(
         'geojson'
     ],
     skip_header=True,
-    field_size_limit=1000000
+    field_size_limit=1000000,
+    row_filter=filters.geoname_references('geoname_id')
 )
 
 
@@ -203,5 +255,6 @@ UserTag = base.FileSource(
     fields=[
         'geoname_id',
         'tag'
-    ]
+    ],
+    row_filter=filters.geoname_references('geoname_id')
 )
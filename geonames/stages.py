@@ -0,0 +1,133 @@
+"""
+    geonames/stages
+    ~~~~~~~~~~~~~~~
+
+    Contains post-load stages that run once all pipelines have populated the database.
+"""
+from . import base, compact, finalize, geometry, trie
+
+
+NAME_SEARCH = """
+DROP TABLE IF EXISTS name_search;
+
+CREATE VIRTUAL TABLE name_search USING fts5(
+    geoname_id        UNINDEXED,
+    name,
+    alternate_names,
+    tokenize          = 'unicode61 remove_diacritics 2',
+    prefix            = '1 2 3'
+);
+
+-- Rows are inserted best match first so rowid order is rank order and
+-- prefix queries can stop after the first LIMIT matches.
+INSERT INTO name_search (
+    geoname_id,
+    name,
+    alternate_names
+)
+SELECT
+    geoname.id,
+    geoname.name || COALESCE(' ' || geoname.ascii_name, ''),
+    (SELECT group_concat(alternate_name.name, ' ')
+     FROM alternate_name
+     WHERE alternate_name.geoname_id = geoname.id)
+FROM geoname
+WHERE geoname.name IS NOT NULL
+ORDER BY
+    geoname.population DESC,
+    CASE {feature_class} WHEN 'A' THEN 0 WHEN 'P' THEN 1 ELSE 2 END,
+    geoname.id;
+
+INSERT INTO name_search (name_search) VALUES ('optimize');
+"""
+
+
+NameSearch = base.CallableStage(
+    name='name_search',
+    func=lambda db, opts: db.executescript(compact.render(db, NAME_SEARCH))
+)
+
+
+BoundaryIndex = base.CallableStage(
+    name='boundary_index',
+    func=lambda db, opts: geometry.build_index(db)
+)
+
+
+PostalCodeIndex = base.ScriptStage(
+    name='postal_code_index',
+    script="""
+DROP TABLE IF EXISTS postal_code_place_rtree;
+
+CREATE VIRTUAL TABLE postal_code_place_rtree USING rtree(
+    id,
+    min_longitude,
+    max_longitude,
+    min_latitude,
+    max_latitude
+);
+
+-- Points are stored as zero-area boxes keyed by postal_code_place.id.
+INSERT INTO postal_code_place_rtree
+SELECT id, longitude, longitude, latitude, latitude
+FROM postal_code_place;
+"""
+)
+
+
+HierarchyClosure = base.ScriptStage(
+    name='hierarchy_closure',
+    script="""
+DROP TABLE IF EXISTS hierarchy_closure;
+
+CREATE TABLE hierarchy_closure (
+    ancestor_id       INTEGER             NOT NULL,
+    descendant_id     INTEGER             NOT NULL,
+    depth             INTEGER             NOT NULL    CHECK (depth >= 1),
+
+    PRIMARY KEY       (ancestor_id, descendant_id),
+    FOREIGN KEY       (ancestor_id)                   REFERENCES geoname (id),
+    FOREIGN KEY       (descendant_id)                 REFERENCES geoname (id)
+) WITHOUT ROWID;
+
+-- Walk parent_id edges (populated from the ADM rows of hierarchy.txt) upwards from
+-- every geoname. The depth limit guards against cycles in the source data.
+WITH RECURSIVE closure (ancestor_id, descendant_id, depth) AS (
+    SELECT parent_id, id, 1
+    FROM geoname
+    WHERE parent_id IS NOT NULL
+    UNION ALL
+    SELECT geoname.parent_id, closure.descendant_id, closure.depth + 1
+    FROM closure
+    INNER JOIN geoname ON geoname.id = closure.ancestor_id
+    WHERE geoname.parent_id IS NOT NULL AND closure.depth < 32
+)
+INSERT OR IGNORE INTO hierarchy_closure (
+    ancestor_id,
+    descendant_id,
+    depth
+)
+SELECT ancestor_id, descendant_id, depth
+FROM closure
+ORDER BY ancestor_id, descendant_id, depth;
+
+CREATE INDEX IF NOT EXISTS hierarchy_closure_descendant_id_depth_idx ON hierarchy_closure (descendant_id, depth);
+""")
+
+
+PrefixTrie = base.CallableStage(
+    name='prefix_trie',
+    func=lambda db, opts: trie.build(
+        db,
+        path=opts.path,
+        top_n=opts.top_n,
+        max_depth=opts.max_depth,
+        min_population=opts.min_population
+    )
+)
+
+
+Finalize = base.CallableStage(
+    name='finalize',
+    func=lambda db, opts: finalize.run(db, opts)
+)
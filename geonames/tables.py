@@ -76,7 +76,8 @@ CREATE TABLE IF NOT EXISTS airport_code (
 );
 """,
     indices="""
-CREATE INDEX IF NOT EXISTS airport_code_geoname_id_idx ON airport_code (geoname_id);
+CREATE INDEX IF NOT EXISTS airport_code_geoname_id_idx    ON airport_code (geoname_id);
+CREATE INDEX IF NOT EXISTS airport_code_code_idx          ON airport_code (code);
 """,
     modify="""
 INSERT INTO airport_code (
@@ -93,6 +94,54 @@ INSERT INTO airport_code (
 """)
 
 
+AdminDivision = base.Table(
+    name='admin_division',
+    table="""
+CREATE TABLE IF NOT EXISTS admin_division (
+    id                INTEGER PRIMARY KEY NOT NULL,
+    parent_id         INTEGER,
+    country_code_id   INTEGER             NOT NULL,
+    admin1_code       TEXT                NOT NULL    CHECK (admin1_code != ""),
+    admin2_code       TEXT                NOT NULL    DEFAULT "",
+    geoname_id        INTEGER,
+    name              TEXT                NOT NULL    CHECK (name != ""),
+    ascii_name        TEXT,
+
+    FOREIGN KEY       (parent_id)                     REFERENCES admin_division (id),
+    FOREIGN KEY       (country_code_id)               REFERENCES country_code (id)
+);
+""",
+    indices="""
+CREATE UNIQUE INDEX IF NOT EXISTS admin_division_code_uniq_idx  ON admin_division (country_code_id, admin1_code, admin2_code);
+CREATE INDEX IF NOT EXISTS admin_division_parent_id_idx         ON admin_division (parent_id);
+CREATE INDEX IF NOT EXISTS admin_division_geoname_id_idx        ON admin_division (geoname_id);
+""",
+    modify="""
+INSERT INTO admin_division (
+    parent_id,
+    country_code_id,
+    admin1_code,
+    admin2_code,
+    geoname_id,
+    name,
+    ascii_name
+) VALUES (
+    (SELECT id
+     FROM admin_division
+     WHERE country_code_id=(SELECT id FROM country_code WHERE alpha2=:country_code)
+       AND admin1_code=:admin1_code
+       AND admin2_code=''
+       AND :admin2_code != ''),
+    (SELECT id FROM country_code WHERE alpha2=:country_code),
+    :admin1_code,
+    :admin2_code,
+    :geoname_id,
+    :name,
+    :ascii_name
+);
+""")
+
+
 AlternateCountryCode = base.Table(
     name='alternate_country_code',
     table="""
@@ -176,17 +225,22 @@ Boundary = base.Table(
     table="""
 CREATE TABLE IF NOT EXISTS boundary (
     id            INTEGER PRIMARY KEY NOT NULL,
-    geojson       TEXT                NOT NULL    CHECK (geojson != "")
+    geojson       TEXT                            CHECK (geojson != ""),
+    geometry      BLOB,
+
+    CHECK         (geojson IS NOT NULL OR geometry IS NOT NULL)
 );
 """,
     indices=None,
     modify="""
 INSERT INTO boundary (
     id,
-    geojson
+    geojson,
+    geometry
 ) VALUES (
     :id,
-    :geojson
+    :geojson,
+    :geometry
 );
 """)
 
@@ -429,17 +483,31 @@ INSERT INTO feature_code (
 """)
 
 
-Geoname = base.Table(
-    name='geoname',
-    table="""
+#: Foreign key of `geoname.admin_division_id`, only declared when the admin_division sink is enabled.
+ADMIN_DIVISION_FOREIGN_KEY = """,
+    FOREIGN KEY           (admin_division_id)                 REFERENCES admin_division (id)"""
+
+#: Admin division of a geoname, the most specific match of its country and admin1/admin2 codes.
+ADMIN_DIVISION_ID = """(SELECT id
+     FROM admin_division
+     WHERE country_code_id=(SELECT id FROM country_code WHERE alpha2=:country_code)
+       AND admin1_code=:admin1_code
+       AND admin2_code IN (COALESCE(:admin2_code, ''), '')
+     ORDER BY admin2_code DESC
+     LIMIT 1)"""
+
+
+GEONAME_TABLE = """
 CREATE TABLE IF NOT EXISTS geoname (
     id                    INTEGER PRIMARY KEY     NOT NULL,
     name                  TEXT                                CHECK (name != ""),
+    ascii_name            TEXT                                CHECK (ascii_name != ""),
     parent_id             INTEGER,
     location_id           INTEGER                 NOT NULL,
     feature_class_id      TEXT,
     feature_code_id       TEXT,
     country_code_id       INTEGER,
+    admin_division_id     INTEGER,
 
     population            INTEGER,
     elevation             INTEGER,
@@ -450,42 +518,66 @@ CREATE TABLE IF NOT EXISTS geoname (
     FOREIGN KEY           (location_id)                       REFERENCES location (id),
     FOREIGN KEY           (feature_class_id)                  REFERENCES feature_class (id),
     FOREIGN KEY           (feature_code_id)                   REFERENCES feature_code (id),
-    FOREIGN KEY           (country_code_id)                   REFERENCES country_code (id)
+    FOREIGN KEY           (country_code_id)                   REFERENCES country_code (id){admin_division_foreign_key}
 );
-""",
-    indices="""
-CREATE INDEX IF NOT EXISTS geoname_parent_id_idx            ON geoname (parent_id);
-CREATE INDEX IF NOT EXISTS geoname_location_id_idx          ON geoname (location_id);
-CREATE INDEX IF NOT EXISTS geoname_feature_class_id_idx     ON geoname (feature_class_id);
-CREATE INDEX IF NOT EXISTS geoname_feature_code_id_idx      ON geoname (feature_code_id);
-CREATE INDEX IF NOT EXISTS geoname_country_code_id_idx      ON geoname (country_code_id);
-CREATE INDEX IF NOT EXISTS geoname_last_modified_idx        ON geoname (last_modified);
-""",
-    modify="""
+"""
+
+
+GEONAME_MODIFY = """
 INSERT INTO geoname (
     id,
     name,
+    ascii_name,
     parent_id,
     location_id,
     feature_class_id,
     feature_code_id,
     country_code_id,
+    admin_division_id,
     population,
     elevation,
     last_modified
 ) VALUES (
     :id,
     :name,
+    :ascii_name,
     NULL,
     (SELECT id FROM location WHERE latitude=:latitude AND longitude=:longitude),
     (SELECT id FROM feature_class WHERE id=:feature_class),
     (SELECT id FROM feature_code WHERE id=:feature_code),
     (SELECT id FROM country_code WHERE alpha2=:country_code),
+    {admin_division_id},
     :population,
     :elevation,
     :last_modified
 );
-""")
+"""
+
+
+Geoname = base.Table(
+    name='geoname',
+    table=GEONAME_TABLE.format(admin_division_foreign_key=ADMIN_DIVISION_FOREIGN_KEY),
+    indices="""
+CREATE INDEX IF NOT EXISTS geoname_parent_id_idx            ON geoname (parent_id);
+CREATE INDEX IF NOT EXISTS geoname_location_id_idx          ON geoname (location_id);
+CREATE INDEX IF NOT EXISTS geoname_feature_class_id_idx     ON geoname (feature_class_id);
+CREATE INDEX IF NOT EXISTS geoname_feature_code_id_idx      ON geoname (feature_code_id);
+CREATE INDEX IF NOT EXISTS geoname_country_code_id_idx      ON geoname (country_code_id);
+CREATE INDEX IF NOT EXISTS geoname_admin_division_id_idx    ON geoname (admin_division_id);
+CREATE INDEX IF NOT EXISTS geoname_last_modified_idx        ON geoname (last_modified);
+""",
+    modify=GEONAME_MODIFY.format(admin_division_id=ADMIN_DIVISION_ID)
+)
+
+
+# Without the admin_division sink the admin_division table doesn't exist, so the
+# variant below neither references it nor links geonames (admin_division_id stays NULL).
+GeonameWithoutAdminDivision = base.Table(
+    name='geoname',
+    table=GEONAME_TABLE.format(admin_division_foreign_key=''),
+    indices=Geoname.indices,
+    modify=GEONAME_MODIFY.format(admin_division_id='NULL')
+)
 
 
 Hierarchy = base.Table(
@@ -565,7 +657,8 @@ CREATE TABLE IF NOT EXISTS postal_code (
 );
 """,
     indices="""
-CREATE INDEX IF NOT EXISTS postal_code_geoname_id_idx ON postal_code (geoname_id);
+CREATE INDEX IF NOT EXISTS postal_code_geoname_id_idx     ON postal_code (geoname_id);
+CREATE INDEX IF NOT EXISTS postal_code_code_idx           ON postal_code (code);
 """,
     modify="""
 INSERT INTO postal_code (
@@ -580,6 +673,67 @@ INSERT INTO postal_code (
 """)
 
 
+# Postal codes are matched on `code_key`, the code upper-cased with spaces and dashes removed,
+# so prefix searches (e.g. "sw1a" or "SW1A 0") are a range scan of the code key indices.
+PostalCodePlace = base.Table(
+    name='postal_code_place',
+    table="""
+CREATE TABLE IF NOT EXISTS postal_code_place (
+    id                INTEGER PRIMARY KEY NOT NULL,
+    country_code_id   INTEGER,
+    code              TEXT                NOT NULL    CHECK (code != ""),
+    code_key          TEXT                NOT NULL,
+    place_name        TEXT,
+    admin1_name       TEXT,
+    admin1_code       TEXT,
+    admin2_name       TEXT,
+    admin2_code       TEXT,
+    admin3_name       TEXT,
+    admin3_code       TEXT,
+    latitude          REAL                NOT NULL    CHECK (latitude >= -90 AND latitude <= 90),
+    longitude         REAL                NOT NULL    CHECK (longitude >= -180 AND longitude <= 180),
+    accuracy          INTEGER,
+
+    FOREIGN KEY       (country_code_id)               REFERENCES country_code (id)
+);
+""",
+    indices="""
+CREATE INDEX IF NOT EXISTS postal_code_place_code_key_idx                 ON postal_code_place (code_key);
+CREATE INDEX IF NOT EXISTS postal_code_place_country_code_id_code_key_idx ON postal_code_place (country_code_id, code_key);
+""",
+    modify="""
+INSERT INTO postal_code_place (
+    country_code_id,
+    code,
+    code_key,
+    place_name,
+    admin1_name,
+    admin1_code,
+    admin2_name,
+    admin2_code,
+    admin3_name,
+    admin3_code,
+    latitude,
+    longitude,
+    accuracy
+) VALUES (
+    (SELECT id FROM country_code WHERE alpha2=:country_code),
+    :code,
+    upper(replace(replace(:code, ' ', ''), '-', '')),
+    :place_name,
+    :admin1_name,
+    :admin1_code,
+    :admin2_name,
+    :admin2_code,
+    :admin3_name,
+    :admin3_code,
+    :latitude,
+    :longitude,
+    :accuracy
+);
+""")
+
+
 PostalCodeSpec = base.Table(
     name='postal_code_spec',
     table="""
@@ -698,7 +852,8 @@ CREATE TABLE IF NOT EXISTS wikidata (
 );
 """,
     indices="""
-CREATE INDEX IF NOT EXISTS wikidata_name_geoname_id_idx ON wikidata (geoname_id);
+CREATE INDEX IF NOT EXISTS wikidata_name_geoname_id_idx   ON wikidata (geoname_id);
+CREATE INDEX IF NOT EXISTS wikidata_wikidata_id_idx       ON wikidata (wikidata_id);
 """,
     modify="""
 INSERT INTO wikidata (
@@ -0,0 +1,259 @@
+"""
+    geonames/trie
+    ~~~~~~~~~~~~~
+
+    Contains a memory-mappable prefix trie for population ranked autocomplete.
+
+    The trie is keyed by the UTF-8 bytes of normalized names. Every node stores
+    the ids of the `top_n` most populous geonames beneath it, so completing a
+    prefix is a walk of one node per byte followed by a slice read.
+
+    File layout (native byte order)::
+
+        header        magic, byte order, node count, top n, max depth
+        labels        uint8[node_count]            byte label of each node
+        first_child   uint32[node_count]           index of the first child of each node
+        child_count   uint32[node_count]           number of children of each node
+        top           uint32[node_count * top_n]   geoname ids, zero padded
+
+    Children of a node are stored contiguously and sorted by label, and the
+    root is the last node in the file.
+"""
+import array
+import bisect
+import mmap
+import os
+import struct
+import sys
+import unicodedata
+
+from typing import Iterable, List, Optional, Tuple
+
+
+#: Magic bytes that identify a trie file.
+MAGIC = b'GNTRIE01'
+
+#: Header layout: magic, byte order, node count, top n, max depth.
+HEADER = struct.Struct('<8s8sIII4x')
+
+SELECT_NAMES = """
+SELECT key, population, id
+FROM (
+    SELECT trie_key(name) AS key, population, id
+    FROM geoname
+    WHERE population >= :min_population
+    UNION ALL
+    SELECT trie_key(ascii_name), population, id
+    FROM geoname
+    WHERE ascii_name IS NOT NULL AND population >= :min_population
+    UNION ALL
+    SELECT trie_key(alternate_name.name), geoname.population, geoname.id
+    FROM alternate_name
+    INNER JOIN geoname ON geoname.id = alternate_name.geoname_id
+    WHERE geoname.population >= :min_population
+)
+WHERE key != ''
+ORDER BY key;
+"""
+
+
+def normalize(name: Optional[str]) -> str:
+    """
+    Normalize a name for trie lookups by removing diacritics, case and repeated whitespace.
+    """
+    if not name:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', name)
+    stripped = ''.join(c for c in decomposed if not unicodedata.combining(c))
+    return ' '.join(stripped.casefold().split())
+
+
+class _Node:
+    """
+    Node that is still open while the sorted names beneath it are consumed.
+    """
+    __slots__ = ('label', 'children', 'entries')
+
+    def __init__(self, label: int) -> None:
+        self.label = label
+        self.children = []
+        self.entries = []
+
+
+class TrieWriter:
+    """
+    Streaming trie builder that consumes names in sorted key order.
+    """
+    def __init__(self, top_n: int = 10, max_depth: int = 24) -> None:
+        self.top_n = top_n
+        self.max_depth = max_depth
+        self.labels = array.array('B')
+        self.first_child = array.array('I')
+        self.child_count = array.array('I')
+        self.top = array.array('I')
+
+    def build(self, entries: Iterable[Tuple[str, int, int]]) -> None:
+        """
+        Consume (normalized name, population, geoname id) tuples sorted by name.
+        """
+        stack = [_Node(0)]
+        path = b''
+
+        for key, population, geoname_id in entries:
+            key = key.encode('utf-8')[:self.max_depth]
+
+            common = 0
+            for a, b in zip(path, key):
+                if a != b:
+                    break
+                common += 1
+
+            while len(path) > common:
+                node = stack.pop()
+                stack[-1].children.append(self._close(node))
+                path = path[:-1]
+
+            for label in key[common:]:
+                stack.append(_Node(label))
+            path = key
+
+            stack[-1].entries.append((population or 0, geoname_id))
+
+        while len(stack) > 1:
+            node = stack.pop()
+            stack[-1].children.append(self._close(node))
+
+        self._append(*self._close(stack[0]))
+
+    def write(self, path: str) -> None:
+        """
+        Atomically write the trie to the given path.
+        """
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, sys.byteorder.encode('ascii'), len(self.labels), self.top_n, self.max_depth))
+            self.labels.tofile(f)
+            f.write(b'\0' * _padding(len(self.labels)))
+            self.first_child.tofile(f)
+            self.child_count.tofile(f)
+            self.top.tofile(f)
+        os.replace(tmp_path, path)
+
+    def _close(self, node: _Node) -> Tuple[int, int, int, List[Tuple[int, int]]]:
+        """
+        Write the children of a completed node and return its own record.
+        """
+        first_child = len(self.labels)
+        candidates = list(node.entries)
+        for child in node.children:
+            self._append(*child)
+            candidates.extend(child[3])
+
+        return node.label, first_child, len(node.children), self._rank(candidates)
+
+    def _append(self, label: int, first_child: int, child_count: int, top: List[Tuple[int, int]]) -> None:
+        """
+        Append a node record to the output arrays.
+        """
+        self.labels.append(label)
+        self.first_child.append(first_child)
+        self.child_count.append(child_count)
+        self.top.extend(geoname_id for _, geoname_id in top)
+        self.top.extend(0 for _ in range(self.top_n - len(top)))
+
+    def _rank(self, candidates: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        """
+        Select the most populous distinct geonames from the given candidates.
+        """
+        result = []
+        seen = set()
+        for population, geoname_id in sorted(candidates, key=lambda c: (-c[0], c[1])):
+            if geoname_id in seen:
+                continue
+            seen.add(geoname_id)
+            result.append((population, geoname_id))
+            if len(result) == self.top_n:
+                break
+        return result
+
+
+class PrefixTrie:
+    """
+    Read-only view of a trie file that is shared between processes via mmap.
+    """
+    def __init__(self, path: str) -> None:
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, byteorder, node_count, top_n, max_depth = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a prefix trie')
+        if byteorder.rstrip(b'\0').decode('ascii') != sys.byteorder:
+            raise ValueError(f'{path} was written with a different byte order')
+
+        self.node_count = node_count
+        self.top_n = top_n
+        self.max_depth = max_depth
+
+        self._view = view = memoryview(self._mmap)
+        offset = HEADER.size
+        self._labels = view[offset:offset + node_count]
+        offset += node_count + _padding(node_count)
+        self._first_child = view[offset:offset + 4 * node_count].cast('I')
+        offset += 4 * node_count
+        self._child_count = view[offset:offset + 4 * node_count].cast('I')
+        offset += 4 * node_count
+        self._top = view[offset:offset + 4 * node_count * top_n].cast('I')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self) -> None:
+        """
+        Release the memory mapping.
+        """
+        for view in (self._labels, self._first_child, self._child_count, self._top, self._view):
+            view.release()
+        self._mmap.close()
+
+    def complete(self, prefix: str, limit: Optional[int] = None) -> List[int]:
+        """
+        Return the ids of the most populous geonames with a name starting with the given prefix.
+
+        Prefixes longer than the trie `max_depth` are matched on their first `max_depth` bytes.
+        """
+        node = self.node_count - 1
+        for label in normalize(prefix).encode('utf-8')[:self.max_depth]:
+            lo = self._first_child[node]
+            hi = lo + self._child_count[node]
+            i = bisect.bisect_left(self._labels, label, lo, hi)
+            if i == hi or self._labels[i] != label:
+                return []
+            node = i
+
+        start = node * self.top_n
+        ids = [geoname_id for geoname_id in self._top[start:start + self.top_n] if geoname_id]
+        return ids[:limit] if limit else ids
+
+
+def build(db, path: str, top_n: int = 10, max_depth: int = 24, min_population: int = 0) -> None:
+    """
+    Build a trie file from the geoname and alternate names of the given database.
+    """
+    # sqlite3 accepts `deterministic` from Python 3.8.
+    flags = dict(deterministic=True) if sys.version_info >= (3, 8) else {}
+    db.create_function('trie_key', 1, normalize, **flags)
+
+    writer = TrieWriter(top_n, max_depth)
+    writer.build(db.execute(SELECT_NAMES, dict(min_population=min_population)))
+    writer.write(path)
+
+
+def _padding(size: int) -> int:
+    """
+    Return the number of bytes needed to align the given size to four bytes.
+    """
+    return -size % 4
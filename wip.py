@@ -4,21 +4,14 @@
 
     Simply "WIP" entrypoint for testing geonames-sqlite creation.
 """
-import sqlite3
+import sys
 
-from geonames import options, pipelines
+from geonames import builder, options
 
 
 def main():
-    db = sqlite3.connect('geonames-wip.sqlite')
-    db.execute('PRAGMA foreign_keys = ON;')
-    db.execute('PRAGMA synchronous = OFF;')
-    db.execute('PRAGMA journal_mode = MEMORY;')
-    db.execute('PRAGMA page_size = 4096;')
-
-    pipelines.Graph.run(db, options.Graph)
-
-    db.execute('VACUUM;')
+    opts = options.load_profile(sys.argv[1]) if len(sys.argv) > 1 else options.Graph
+    builder.build('geonames-wip.sqlite', opts)
 
 
 if __name__ == '__main__':